@@ -1,4 +1,8 @@
 from .blockchain import Block, Blockchain, Transaction, Header
+from .encoding import sign_transaction
+from .ledger import Ledger
+from .mempool import Mempool
+from .signature_cache import SignatureCache
 from .pow_chain import PoW_Blockchain
 from .dns_chain import DNS_Data, DNS_Transaction, DNSBlockChain
 from .ddos_chain import DDosChain, DDosTransaction, DDosHeader, DDosData
@@ -0,0 +1,206 @@
+""" Scheduler of the block downloads of a new chain.
+
+Every missing block is requested from exactly one peer
+(peers that sent headers of the new chain) instead of all peers.
+A peer has at most DOWNLOAD_WINDOW requests in flight,
+faster peers (lower measured latency) are asked first.
+Requests without answer are reassigned to another peer after
+DOWNLOAD_TIMEOUT seconds.
+Received blocks are handed over in the order of the chain.
+"""
+
+import time
+from collections import OrderedDict
+from queue import Queue
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from utils import print_debug_info
+
+# Maximum number of requests in flight per peer
+DOWNLOAD_WINDOW = 16
+
+# Seconds until a request is reassigned
+DOWNLOAD_TIMEOUT = 5.0
+
+# Latency assumed for peers without answers (seconds)
+INITIAL_LATENCY = 1.0
+
+# Weight of a new measurement in the latency average
+LATENCY_WEIGHT = 0.25
+
+# Pseudo peer used if no peer with the new chain is known
+BROADCAST = 'broadcast'
+
+
+class BlockDownloader(object):
+    """ Schedules the get_block requests of the missing blocks.
+
+    Args:
+        send_queue: Queue for messages to other nodes.
+        window: Maximum number of requests in flight per peer.
+        timeout: Seconds until a request is reassigned.
+        clock: Source of the current time.
+    """
+
+    def __init__(self,
+                 send_queue: Queue,
+                 window: int = DOWNLOAD_WINDOW,
+                 timeout: float = DOWNLOAD_TIMEOUT,
+                 clock: Callable[[], float] = time.monotonic) -> None:
+        self.send_queue = send_queue
+        self.window = window
+        self.timeout = timeout
+        self.clock = clock
+        # Peers (-> average latency)
+        self.peers: Dict[Any, float] = OrderedDict()
+        # Headers of the download (in chain order) and next handed over
+        self.headers: List[Any] = []
+        self.wanted: Set[Any] = set()
+        self.position = 0
+        # Headers not requested yet (-> None, in chain order)
+        self.pending: Dict[Any, None] = OrderedDict()
+        # Requested headers (-> (peer, time of the request))
+        self.in_flight: Dict[Any, Tuple[Any, float]] = OrderedDict()
+        # Peers that didn't deliver a block (header -> peers)
+        self.failed: Dict[Any, Set[Any]] = {}
+        # Received blocks waiting for their predecessors
+        self.received: Dict[Any, Any] = {}
+        self.requests = 0
+        self.timeouts = 0
+
+    @property
+    def active(self) -> bool:
+        """ Check whether blocks are still missing.
+        """
+        return self.position < len(self.headers)
+
+    def add_peer(self, peer: Any):
+        """ Add a peer that can send blocks of the new chain.
+
+        Args:
+            peer: Address of the peer.
+        """
+        if peer is not None and peer not in self.peers:
+            self.peers[peer] = INITIAL_LATENCY
+
+    def start(self, headers: List[Any]):
+        """ Start the download of blocks (replaces a running download).
+
+        Args:
+            headers: Headers of the missing blocks (in chain order).
+        """
+        self.headers = list(headers)
+        self.wanted = set(self.headers)
+        self.position = 0
+        self.pending = OrderedDict((h, None) for h in self.headers)
+        self.in_flight.clear()
+        self.failed.clear()
+        self.received.clear()
+        self.schedule()
+
+    def clear(self):
+        """ Stop the download.
+        """
+        self.start([])
+
+    def receive(self, block: Any) -> Optional[List[Any]]:
+        """ Take a received block.
+
+        Args:
+            block: The block.
+
+        Returns:
+            The blocks that can be handed over (in chain order),
+            None if the block is not part of the download.
+        """
+        header = block.header
+        if header not in self.pending and header not in self.in_flight:
+            if header in self.wanted:
+                # Duplicate
+                return []
+            return None
+
+        request = self.in_flight.pop(header, None)
+        if request is not None:
+            peer, sent = request
+            if peer in self.peers:
+                self.peers[peer] += LATENCY_WEIGHT * \
+                    (self.clock() - sent - self.peers[peer])
+        self.pending.pop(header, None)
+        self.received[header] = block
+
+        ready = []
+        while self.active and self.headers[self.position] in self.received:
+            ready.append(self.received.pop(self.headers[self.position]))
+            self.position += 1
+        self.tick()
+        self.schedule()
+        return ready
+
+    def unavailable(self, header: Any, peer: Any):
+        """ Reassign a block the peer can't send (e.g. pruned).
+
+        Args:
+            header: Header of the block.
+            peer: Address of the peer.
+        """
+        request = self.in_flight.get(header)
+        if request is None or request[0] != peer:
+            return
+        self.retry(header, peer)
+        self.schedule()
+
+    def tick(self):
+        """ Reassign the requests that timed out.
+        """
+        now = self.clock()
+        expired = [(header, peer)
+                   for header, (peer, sent) in self.in_flight.items()
+                   if now - sent >= self.timeout]
+        for header, peer in expired:
+            print_debug_info(f'Block {header.index} timed out at {peer}')
+            self.timeouts += 1
+            if peer in self.peers:
+                # Slow peers are asked last
+                self.peers[peer] = max(self.peers[peer] * 2, self.timeout)
+            self.retry(header, peer)
+        if expired:
+            self.schedule()
+
+    def retry(self, header: Any, peer: Any):
+        """ Put a request back to the headers that are not requested.
+        """
+        del self.in_flight[header]
+        self.failed.setdefault(header, set()).add(peer)
+        self.pending[header] = None
+        # Missing blocks are requested first
+        self.pending.move_to_end(header, last=False)
+
+    def schedule(self):
+        """ Request pending blocks from the peers with free windows.
+        """
+        peers = sorted(self.peers, key=self.peers.__getitem__) or \
+            [BROADCAST]
+        load: Dict[Any, int] = dict((peer, 0) for peer in peers)
+        for peer, _ in self.in_flight.values():
+            if peer in load:
+                load[peer] += 1
+
+        assigned = []
+        for header in self.pending:
+            failed = self.failed.get(header, set())
+            candidates = [p for p in peers
+                          if load[p] < self.window and p not in failed]
+            if not candidates:
+                # All peers failed => try them again
+                candidates = [p for p in peers if load[p] < self.window]
+            if not candidates:
+                break
+            load[candidates[0]] += 1
+            assigned.append((header, candidates[0]))
+
+        for header, peer in assigned:
+            del self.pending[header]
+            self.in_flight[header] = (peer, self.clock())
+            self.requests += 1
+            self.send_queue.put(('get_block', header, peer))
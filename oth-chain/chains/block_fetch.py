@@ -0,0 +1,133 @@
+""" Fetching of announced blocks from the announcing peers.
+
+A new block is announced with its header (new_header),
+the block is requested with get_block from the first peer
+that announced it, so every hop transfers one copy of the block.
+A header is only requested once at a time, further announcers
+are remembered and asked if the request times out.
+Announcements from unknown addresses (e.g. local) are broadcast.
+Blocks are requested as compact blocks (see compact_block),
+requests that time out are repeated as full blocks (new_block).
+"""
+
+import time
+from collections import OrderedDict
+from queue import Queue
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from utils import print_debug_info
+
+# Seconds until another announcer is asked for a block
+FETCH_TIMEOUT = 2.0
+
+# Maximum number of announcers kept per block
+MAX_ANNOUNCERS = 8
+
+BROADCAST = 'broadcast'
+
+
+class BlockFetcher(object):
+    """ Requests announced blocks from the announcers.
+
+    Args:
+        send_queue: Queue for messages to other nodes.
+        timeout: Seconds until another announcer is asked.
+        clock: Source of the current time.
+        compact: Request compact blocks from announcers?
+    """
+
+    def __init__(self,
+                 send_queue: Queue,
+                 timeout: float = FETCH_TIMEOUT,
+                 clock: Callable[[], float] = time.monotonic,
+                 compact: bool = True) -> None:
+        self.send_queue = send_queue
+        self.timeout = timeout
+        self.clock = clock
+        self.compact = compact
+        # Requested headers (-> (peer, time of the request, compact?))
+        self.in_flight: Dict[Any, Tuple[Any, float, bool]] = OrderedDict()
+        # Announcers that were not asked yet (header -> peers)
+        self.announcers: Dict[Any, List[Any]] = {}
+        self.requests = 0
+
+    def __contains__(self, header: Any) -> bool:
+        return header in self.in_flight
+
+    def announce(self, header: Any, peer: Optional[Any]) -> bool:
+        """ Take the announcement of a block.
+
+        Args:
+            header: Header of the block.
+            peer: Address of the announcer.
+
+        Returns:
+            True if the block was requested.
+        """
+        if not peer or peer == 'local':
+            peer = BROADCAST
+        if header in self.in_flight:
+            waiting = self.announcers.setdefault(header, [])
+            if peer != self.in_flight[header][0] and \
+                    peer not in waiting and len(waiting) < MAX_ANNOUNCERS:
+                waiting.append(peer)
+            return False
+        self.request(header, peer, self.compact and peer != BROADCAST)
+        return True
+
+    def request(self, header: Any, peer: Any, compact: bool = False):
+        """ Send the request of a block to a peer.
+
+        Args:
+            header: Header of the block.
+            peer: Address of the peer.
+            compact: Request a compact block?
+        """
+        self.in_flight[header] = (peer, self.clock(), compact)
+        self.requests += 1
+        msg_type = 'get_compact_block' if compact else 'get_block'
+        self.send_queue.put((msg_type, header, peer))
+
+    def receive(self, header: Any):
+        """ Stop tracking a received block.
+
+        Args:
+            header: Header of the block.
+        """
+        self.in_flight.pop(header, None)
+        self.announcers.pop(header, None)
+
+    def tick(self):
+        """ Ask the next announcer for the blocks that timed out.
+        """
+        now = self.clock()
+        expired = [(header, peer, compact)
+                   for header, (peer, sent, compact) in self.in_flight.items()
+                   if now - sent >= self.timeout]
+        for header, peer, compact in expired:
+            waiting = self.announcers.get(header)
+            if waiting:
+                # Full block, the peer might not know compact blocks
+                self.request(header, waiting.pop(0))
+            elif compact:
+                self.request(header, peer)
+            else:
+                # Requested again on the next announcement
+                print_debug_info(f'Block {header.index} timed out at {peer}')
+                self.receive(header)
+
+    def fallback(self, header: Any, peer: Any):
+        """ Request a full block from a peer
+            whose compact block could not be rebuilt.
+
+        Args:
+            header: Header of the block.
+            peer: Address of the peer.
+        """
+        self.request(header, peer)
+
+    def clear(self):
+        """ Stop tracking all blocks.
+        """
+        self.in_flight.clear()
+        self.announcers.clear()
@@ -0,0 +1,419 @@
+""" Append-only storage of the blocks of a chain.
+
+The blocks are appended to segment files (blk00000.dat, blk00001.dat, ...)
+as records of [length | crc32 | serialized transactions].
+The index file (index.dat) contains one record per block with the
+position of the block and its serialized header,
+so the headers can be read without reading the transactions.
+
+Appended records are flushed to the operating system immediately,
+fsync is called once for a group of blocks (group commit).
+Records that were cut off by a crash are truncated when the store
+is opened, blocks that fail the checksum are truncated on load.
+
+Pruning removes the segment files that only contain old blocks,
+their headers stay in the index.
+
+A store is used by one process at a time (exclusive lock on LOCK_FILE_NAME).
+"""
+
+import os
+import struct
+import zlib
+from collections import OrderedDict, namedtuple
+from time import time
+from typing import Any, BinaryIO, Dict, List, Optional, Tuple
+
+import serializer
+from utils import print_debug_info
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# Maximum size of a segment file (in bytes)
+SEGMENT_SIZE = 16 * 1024 * 1024
+
+# Number of appended blocks that triggers a fsync
+GROUP_COMMIT_BLOCKS = 32
+
+# Seconds after which appended blocks are synced
+GROUP_COMMIT_INTERVAL = 1.0
+
+INDEX_FILE_NAME = 'index.dat'
+
+LOCK_FILE_NAME = 'LOCK'
+
+# length and crc32 of a record
+RECORD_HEADER = struct.Struct('>II')
+
+# segment, offset and length of a block
+POSITION = struct.Struct('>IQI')
+
+IndexEntry = namedtuple('IndexEntry',
+                        ['header',
+                         'segment',
+                         'offset',
+                         'length'])
+
+
+def pack_record(payload: bytes) -> bytes:
+    """ Create a record out of a payload.
+
+    Args:
+        payload: Data of the record.
+
+    Returns:
+        The record (length and checksum followed by the payload).
+    """
+    return RECORD_HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+def unpack_record(data: bytes, offset: int) -> Optional[bytes]:
+    """ Read a record.
+
+    Args:
+        data: Content of a file.
+        offset: Position of the record.
+
+    Returns:
+        The payload, None if the record is incomplete or corrupted.
+    """
+    end = offset + RECORD_HEADER.size
+    if end > len(data):
+        return None
+    length, checksum = RECORD_HEADER.unpack_from(data, offset)
+    payload = data[end:end + length]
+    if len(payload) != length or zlib.crc32(payload) != checksum:
+        return None
+    return payload
+
+
+def lock_file(lock: BinaryIO) -> bool:
+    """ Take an exclusive lock on a file (without waiting).
+
+    Args:
+        lock: The opened file.
+
+    Returns:
+        False if another process holds the lock.
+    """
+    try:
+        if fcntl is not None:
+            fcntl.flock(lock.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            lock.seek(0)
+            msvcrt.locking(lock.fileno(), msvcrt.LK_NBLCK, 1)
+    except OSError:
+        return False
+    return True
+
+
+def segment_file_name(segment: int) -> str:
+    """ Name of a segment file.
+    """
+    return f'blk{segment:05d}.dat'
+
+
+class BlockStore(object):
+    """ Append-only block storage in a directory.
+
+    Args:
+        directory: Directory of the segment and index files.
+        segment_size: Maximum size of a segment file.
+        sync_blocks: Number of appended blocks that triggers a fsync.
+        sync_interval: Seconds after which appended blocks are synced.
+    """
+
+    def __init__(self,
+                 directory: str,
+                 segment_size: int = SEGMENT_SIZE,
+                 sync_blocks: int = GROUP_COMMIT_BLOCKS,
+                 sync_interval: float = GROUP_COMMIT_INTERVAL) -> None:
+        self.directory = directory
+        self.segment_size = segment_size
+        self.sync_blocks = sync_blocks
+        self.sync_interval = sync_interval
+        self.entries: List[IndexEntry] = []
+        # Number of blocks (from the genesis block) that were pruned
+        self.pruned = 0
+        self._index_offsets: List[int] = []
+        self._readers: Dict[int, BinaryIO] = {}
+        self._unsynced = 0
+        self._last_sync = time()
+        os.makedirs(directory, exist_ok=True)
+        self._lock = open(os.path.join(directory, LOCK_FILE_NAME), 'a+b')
+        if not lock_file(self._lock):
+            self._lock.close()
+            raise RuntimeError(
+                f'Block store {directory} is used by another process')
+        self._recover()
+        self._open_writers()
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def headers(self) -> List[Any]:
+        """ Headers of the stored blocks.
+        """
+        return [entry.header for entry in self.entries]
+
+    def append(self, header: Any, transactions: List[Any]):
+        """ Append a block.
+
+        Args:
+            header: Header of the block.
+            transactions: Transactions of the block.
+        """
+        payload = serializer.serialize(transactions).encode()
+        record = pack_record(payload)
+        if self._segment_end and \
+                self._segment_end + len(record) > self.segment_size:
+            self._next_segment()
+
+        entry = IndexEntry(header, self._segment,
+                           self._segment_end, len(record))
+        self._segment_file.write(record)
+        self._segment_file.flush()
+        self._segment_end += len(record)
+
+        self._index_offsets.append(self._index_end)
+        index_record = pack_record(
+            POSITION.pack(entry.segment, entry.offset, entry.length) +
+            serializer.serialize(header).encode())
+        self._index_file.write(index_record)
+        self._index_file.flush()
+        self._index_end += len(index_record)
+        self.entries.append(entry)
+
+        self._unsynced += 1
+        if self._unsynced >= self.sync_blocks or \
+                time() - self._last_sync >= self.sync_interval:
+            self.sync()
+
+    def read(self, height: int) -> Optional[Tuple[Any, List[Any]]]:
+        """ Read a stored block.
+
+        Args:
+            height: Position of the block in the chain.
+
+        Returns:
+            Tuple of (header, transactions),
+            None if the record is corrupted or was pruned.
+        """
+        if height < self.pruned:
+            return None
+        entry = self.entries[height]
+        reader = self._reader(entry.segment)
+        reader.seek(entry.offset)
+        payload = unpack_record(reader.read(entry.length), 0)
+        if payload is None:
+            return None
+        return entry.header, serializer.deserialize(payload.decode())
+
+    def load(self) -> OrderedDict:
+        """ Read all stored blocks.
+
+        Blocks starting at the first corrupted block are truncated.
+
+        Returns:
+            The chain (header -> transactions) without the pruned blocks.
+        """
+        chain: OrderedDict = OrderedDict()
+        segment = None
+        data = b''
+        for height, entry in enumerate(self.entries):
+            if height < self.pruned:
+                continue
+            if entry.segment != segment:
+                segment = entry.segment
+                with open(self._segment_path(segment), 'rb') as f:
+                    data = f.read()
+            payload = unpack_record(data, entry.offset)
+            if payload is None:
+                print_debug_info(
+                    f'Corrupted block {height} in store, truncating')
+                self.truncate(height)
+                break
+            chain[entry.header] = serializer.deserialize(payload.decode())
+        return chain
+
+    def truncate(self, height: int):
+        """ Remove the blocks starting at a height.
+
+        Args:
+            height: Number of blocks to keep.
+        """
+        if height >= len(self.entries):
+            return
+        if height < self.pruned:
+            raise ValueError('Pruned blocks can not be truncated')
+        entry = self.entries[height]
+        self._close_files()
+        for segment in self._segments():
+            if segment > entry.segment:
+                os.remove(self._segment_path(segment))
+        with open(self._segment_path(entry.segment), 'r+b') as f:
+            f.truncate(entry.offset)
+            os.fsync(f.fileno())
+        with open(self._index_path(), 'r+b') as f:
+            f.truncate(self._index_offsets[height])
+            os.fsync(f.fileno())
+        del self.entries[height:]
+        del self._index_offsets[height:]
+        self._open_writers()
+
+    def prune(self, height: int):
+        """ Remove the segment files of the blocks before a height.
+
+        Only segments without blocks at or after the height are removed.
+
+        Args:
+            height: Height of the first block to keep.
+        """
+        segment = self.entries[min(height, len(self.entries) - 1)].segment
+        for other in self._segments():
+            if other < segment:
+                reader = self._readers.pop(other, None)
+                if reader is not None:
+                    reader.close()
+                os.remove(self._segment_path(other))
+        while self.pruned < len(self.entries) and \
+                self.entries[self.pruned].segment < segment:
+            self.pruned += 1
+
+    def sync(self):
+        """ Write the appended blocks to the disk.
+
+        The segment is synced before the index, so indexed blocks
+        are always on the disk.
+        """
+        os.fsync(self._segment_file.fileno())
+        os.fsync(self._index_file.fileno())
+        self._unsynced = 0
+        self._last_sync = time()
+
+    def close(self):
+        """ Sync and close the files of the store.
+        """
+        self.sync()
+        self._close_files()
+        # Closing releases the lock
+        self._lock.close()
+
+    def import_chain(self, chain: Dict[Any, List[Any]]):
+        """ Append the blocks of a chain (e.g. migrated from a file).
+
+        Args:
+            chain: Chain (header -> transactions) to append.
+        """
+        for header, transactions in chain.items():
+            self.append(header, transactions)
+        self.sync()
+
+    def _recover(self):
+        """ Read the index and truncate incomplete records.
+        """
+        index_path = self._index_path()
+        data = b''
+        if os.path.exists(index_path):
+            with open(index_path, 'rb') as f:
+                data = f.read()
+
+        segments = self._segments()
+        first_segment = segments[0] if segments else 0
+        segment_sizes: Dict[int, int] = {}
+        offset = 0
+        while True:
+            payload = unpack_record(data, offset)
+            if payload is None:
+                break
+            segment, position, length = POSITION.unpack_from(payload)
+            if segment < first_segment:
+                # Block was pruned
+                self.pruned += 1
+            else:
+                if segment not in segment_sizes:
+                    path = self._segment_path(segment)
+                    segment_sizes[segment] = os.path.getsize(path) \
+                        if os.path.exists(path) else 0
+                if position + length > segment_sizes[segment]:
+                    # Block was not written completely
+                    break
+            header = serializer.deserialize(
+                payload[POSITION.size:].decode())
+            self.entries.append(IndexEntry(header, segment,
+                                           position, length))
+            self._index_offsets.append(offset)
+            offset += RECORD_HEADER.size + len(payload)
+
+        if offset < len(data):
+            print_debug_info('Truncating incomplete block index')
+        with open(index_path, 'ab') as f:
+            f.truncate(offset)
+
+        # Remove blocks that were written without index
+        if self.entries:
+            last = self.entries[-1]
+            segment, end = last.segment, last.offset + last.length
+        else:
+            segment, end = 0, 0
+        for other in self._segments():
+            if other > segment:
+                os.remove(self._segment_path(other))
+        with open(self._segment_path(segment), 'ab') as f:
+            f.truncate(end)
+
+    def _segments(self) -> List[int]:
+        """ Numbers of the existing segment files.
+        """
+        segments = []
+        for name in os.listdir(self.directory):
+            if name.startswith('blk') and name.endswith('.dat'):
+                try:
+                    segments.append(int(name[3:-4]))
+                except ValueError:
+                    pass
+        return sorted(segments)
+
+    def _open_writers(self):
+        """ Open the last segment and the index for appending.
+        """
+        self._segment = self.entries[-1].segment if self.entries else 0
+        self._segment_file = open(self._segment_path(self._segment), 'ab')
+        self._segment_end = self._segment_file.tell()
+        self._index_file = open(self._index_path(), 'ab')
+        self._index_end = self._index_file.tell()
+
+    def _next_segment(self):
+        """ Continue appending in a new segment file.
+        """
+        os.fsync(self._segment_file.fileno())
+        self._segment_file.close()
+        self._segment += 1
+        self._segment_file = open(self._segment_path(self._segment), 'ab')
+        self._segment_end = 0
+
+    def _reader(self, segment: int) -> BinaryIO:
+        """ File used to read blocks of a segment.
+        """
+        if segment not in self._readers:
+            self._readers[segment] = open(self._segment_path(segment), 'rb')
+        return self._readers[segment]
+
+    def _close_files(self):
+        """ Close all open files.
+        """
+        self._segment_file.close()
+        self._index_file.close()
+        for reader in self._readers.values():
+            reader.close()
+        self._readers.clear()
+
+    def _segment_path(self, segment: int) -> str:
+        return os.path.join(self.directory, segment_file_name(segment))
+
+    def _index_path(self) -> str:
+        return os.path.join(self.directory, INDEX_FILE_NAME)
@@ -0,0 +1,152 @@
+""" Selection of the transactions of a new block.
+
+Transactions are picked from the pool by fee per encoded byte
+(then by fee) until the block is full.
+Transactions that depend on others are only picked together with them:
+    - the sender balance has to be covered by the chain and by the
+      transactions already picked for the block
+    - transactions sharing a conflict key (e.g. the domain of
+      DNS transactions) are picked in the order of their timestamps
+All other transactions stay in the pool.
+"""
+
+from collections import defaultdict
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional
+
+MAX_BLOCK_SIZE = 100000
+MAX_BLOCK_TRANSACTIONS = 500
+
+
+class TemplateBuilder(object):
+    """ Picks the pool transactions of a new block.
+
+    Args:
+        max_size: Maximum size of the encoded transactions of a block.
+        max_transactions: Maximum number of transactions of a block
+            (the mining reward is not counted).
+    """
+
+    def __init__(self,
+                 max_size: int = MAX_BLOCK_SIZE,
+                 max_transactions: int = MAX_BLOCK_TRANSACTIONS) -> None:
+        self.max_size = max_size
+        self.max_transactions = max_transactions
+
+    def select(self,
+               transactions: Iterable[Any],
+               balance: Optional[Callable[[Any], int]] = None,
+               conflict_key: Optional[Callable[[Any], Hashable]] = None,
+               reserved: Iterable[Any] = ()) -> List[Any]:
+        """ Select the transactions of a new block.
+
+        Args:
+            transactions: Pending transactions (in pool order).
+            balance: Confirmed balance of a key
+                (None => no balance dependencies).
+            conflict_key: Key of conflicting transactions (or None).
+            reserved: Transactions that are part of the block anyway
+                (e.g. auction resolutions), count towards the limits.
+
+        Returns:
+            The selected transactions (in pool order).
+        """
+        transactions = list(transactions)
+        reserved = list(reserved)
+        size = sum(self.size(t) for t in reserved)
+        count = len(reserved)
+
+        conflicts: Dict[Hashable, List[Any]] = defaultdict(list)
+        if conflict_key is not None:
+            for transaction in sorted(transactions,
+                                      key=lambda t: t.timestamp):
+                key = conflict_key(transaction)
+                if key is not None:
+                    conflicts[key].append(transaction)
+
+        selected: Dict[bytes, Any] = {}
+        involved: Dict[Any, List[Any]] = defaultdict(list)
+
+        def conflicts_resolved(transaction: Any) -> bool:
+            if conflict_key is None:
+                return True
+            key = conflict_key(transaction)
+            if key is None:
+                return True
+            return all(t.digest in selected for t in conflicts[key]
+                       if t.timestamp < transaction.timestamp)
+
+        def available(key: Any, timestamp: float) -> int:
+            amount = balance(key)
+            for t in involved[key]:
+                if t.timestamp < timestamp:
+                    amount += self.delta(t, key)
+            return amount
+
+        def covered(transaction: Any) -> bool:
+            if balance is None or \
+                    getattr(transaction, 'amount', None) is None:
+                return True
+            sender = transaction.sender
+            cost = transaction.amount + transaction.fee
+            if available(sender, transaction.timestamp) < cost:
+                return False
+            # Later transactions of the sender have to stay covered
+            return all(available(sender, t.timestamp) - cost >=
+                       t.amount + t.fee
+                       for t in involved[sender]
+                       if t.sender == sender and
+                       t.timestamp > transaction.timestamp)
+
+        candidates = sorted(transactions, key=self.priority)
+        progress = True
+        while progress and count < self.max_transactions:
+            progress = False
+            remaining = []
+            for transaction in candidates:
+                if count >= self.max_transactions:
+                    break
+                transaction_size = self.size(transaction)
+                if size + transaction_size > self.max_size:
+                    continue
+                if not conflicts_resolved(transaction) or \
+                        not covered(transaction):
+                    remaining.append(transaction)
+                    continue
+                selected[transaction.digest] = transaction
+                if balance is not None and \
+                        getattr(transaction, 'amount', None) is not None:
+                    involved[transaction.sender].append(transaction)
+                    if transaction.recipient != transaction.sender:
+                        involved[transaction.recipient].append(transaction)
+                size += transaction_size
+                count += 1
+                progress = True
+            candidates = remaining
+
+        return [t for t in transactions if t.digest in selected]
+
+    @staticmethod
+    def size(transaction: Any) -> int:
+        """ Size of the encoded transaction.
+        """
+        return len(transaction.encoded())
+
+    @classmethod
+    def priority(cls, transaction: Any) -> tuple:
+        """ Sort key of the transactions, best transactions first.
+
+        Transactions are ordered by fee per byte, fee and age.
+        """
+        fee = getattr(transaction, 'fee', 0)
+        return (-fee / cls.size(transaction), -fee, transaction.timestamp)
+
+    @staticmethod
+    def delta(transaction: Any, key: Any) -> int:
+        """ Change of the balance of a key by a transaction.
+        """
+        delta = 0
+        if transaction.sender == key:
+            delta -= transaction.amount + transaction.fee
+        if transaction.recipient == key:
+            delta += transaction.amount
+        return delta
@@ -1,39 +1,66 @@
 """ Abstract implementation of a blockchain
 """
 import hashlib
-import math
 import os
 from collections import OrderedDict, namedtuple
 from pathlib import Path
 from pprint import pprint
 from queue import Queue
 from time import time
-from typing import Any, Callable, List, Optional, Tuple
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Tuple
 
 from utils import print_debug_info
 from networking import Address
 
 import serializer
 
-Transaction = namedtuple('Transaction',
-                         ['sender',
-                          'recipient',
-                          'amount',
-                          'fee',
-                          'timestamp',
-                          'signature'])
+from . import encoding
+from .block_download import BlockDownloader
+from .block_fetch import BlockFetcher
+from .block_store import BlockStore
+from .compact_block import (CompactBlock, PartialBlocks, create_compact_block,
+                            rebuild_transactions, valid_compact_block)
+from .block_template import TemplateBuilder
+from .encoding import Encodable, SignedEncodable
+from .header_sync import HEADERS_PAGE_SIZE, header_locator, headers_after
+from .lazy_chain import MIN_PRUNE_DEPTH, PRUNE_INTERVAL, LazyChain
+from .ledger import Ledger
+from .mempool import Mempool
+from .merkle import MerkleCache, MerkleTree, merkle_root
+from .orphan_pool import OrphanPool
+from .signature_cache import SignatureCache
+from .snapshot import SNAPSHOT_INTERVAL, SnapshotStore
+from .undo import UndoLog
+from .validation import ValidationPipeline, check_signature
+
+
+class Transaction(namedtuple('Transaction',
+                             ['sender',
+                              'recipient',
+                              'amount',
+                              'fee',
+                              'timestamp',
+                              'signature']),
+                  SignedEncodable):
+    """ Transfer of coins between two users.
+    """
+
 
 Block = namedtuple('Block',
                    ['header',
                     'transactions'])
 
-Header = namedtuple('Header',
-                    ['version',
-                     'index',
-                     'timestamp',
-                     'previous_hash',
-                     'root_hash',
-                     'proof'])
+
+class Header(namedtuple('Header',
+                        ['version',
+                         'index',
+                         'timestamp',
+                         'previous_hash',
+                         'root_hash',
+                         'proof']),
+             Encodable):
+    """ Header of a block.
+    """
 
 
 class Blockchain(object):
@@ -41,27 +68,61 @@ class Blockchain(object):
 
     Args:
         send_queue: Queue for messages to other nodes
+        validation_workers: Number of processes verifying signatures
+            in parallel (0 => verify on the chain thread)
+        store_directory: Directory of the block store and the
+            state snapshots (None => load/save the chain as a whole file)
+        prune_depth: Number of latest blocks whose transactions are held
+            (None => hold all blocks, requires a block store)
     """
 
+    # File of the whole chain (used without block store / for migration)
+    chain_file = 'bc_file.txt'
+
     def __init__(self,
                  version: float,
                  send_queue: Queue,
-                 gui_queue: Queue) -> None:
+                 gui_queue: Queue,
+                 validation_workers: int = 0,
+                 store_directory: Optional[str] = None,
+                 prune_depth: Optional[int] = None) -> None:
         self.chain: OrderedDict[Header, List[Transaction]] = OrderedDict()
         self.new_chain: OrderedDict[Header, List[Transaction]] = OrderedDict()
-        self.transaction_pool: List[Transaction] = []
-        self.intermediate_transactions: List[Transaction] = []
+        self.transaction_pool = Mempool()
         self.send_queue = send_queue
         self.gui_ready = False
         self.gui_queue = gui_queue
+        self.ledger = Ledger()
+        self.merkle_trees = MerkleCache()
+        self.signature_cache = SignatureCache()
+        self.validation = ValidationPipeline(validation_workers)
+        self.template_builder = TemplateBuilder()
+        self.store = BlockStore(store_directory) \
+            if store_directory is not None else None
+        self.snapshots = SnapshotStore(store_directory) \
+            if store_directory is not None else None
+        self.prune_depth = max(prune_depth, MIN_PRUNE_DEPTH) \
+            if prune_depth is not None and self.store is not None else None
+        # Peers that answered requests with pruned blocks (-> index)
+        self.pruned_peers: Dict[Address, int] = {}
+        self.downloader = BlockDownloader(send_queue)
+        self.fetcher = BlockFetcher(send_queue)
+        self.partial_blocks = PartialBlocks()
+        self.orphans = OrphanPool()
+        self.undo_log = UndoLog()
         self.load_chain()
         self.version = version
+        self.template_tree = MerkleTree(
+            encoding.uses_binary_encoding(version))
+        self.load_state()
+        self.check_pruning()
 
     def check_balance(self, key: bytes, timestamp: float) -> int:
         """ Checks the amount of coins a certain user (identified by key) has.
 
-            Calculates balance by iterating through the chain and checking the
-            amounts of money the user sent or received before the timestamp.
+            Looks up the balance in the ledger, which contains all
+            transactions of the chain and the transactions of the
+            transaction pool before the timestamp.
 
         Args:
             key: Key that identifies the user.
@@ -70,43 +131,264 @@ class Blockchain(object):
         Returns:
             The balance of the user at the given timestamp.
         """
-        balance = 0
-        for block_transactions in self.chain.values():
-            for transaction in block_transactions:
-                if transaction.sender == key:
-                    balance -= transaction.amount + transaction.fee
-                if transaction.recipient == key:
-                    balance += transaction.amount
-        for transaction in self.transaction_pool:
-            if transaction.sender == key and transaction.timestamp < timestamp:
-                balance -= transaction.amount + transaction.fee
-            if transaction.recipient == key and \
-                    transaction.timestamp < timestamp:
-                balance += transaction.amount
-        return balance
+        return self.ledger.balance(key, timestamp)
+
+    def rebuild_state(self):
+        """ Rebuild the state derived from the chain (e.g. balances).
+        """
+        self.reset_state()
+        self.replay_state(0)
+
+    def load_state(self, end: Optional[int] = None):
+        """ Load the derived state on startup.
+
+            Restores the latest snapshot of a block of the chain
+            and replays the blocks after it,
+            without snapshot the state is rebuilt from the genesis block.
+
+        Args:
+            end: Number of blocks of the state (None => whole chain).
+        """
+        snapshot = None
+        pruned_height = getattr(self.chain, 'pruned_height', 0)
+        headers = list(self.chain.keys())[:end]
+        if self.snapshots is not None:
+            # The blocks after the snapshot have to be held
+            snapshot = self.snapshots.latest(
+                lambda height, header:
+                pruned_height <= height + 1 and
+                height < len(headers) and headers[height] == header)
+        if snapshot is None:
+            if pruned_height:
+                raise RuntimeError('No state snapshot for the pruned chain')
+            self.reset_state()
+            self.replay_state(0, end)
+            return
+
+        height, _, state = snapshot
+        print_debug_info(f'Loading state snapshot of block {height}')
+        self.reset_state()
+        self.restore_state(state)
+        self.replay_state(height + 1, end)
+
+    def reset_state(self):
+        """ Reset the derived state to the state before the genesis block.
+        """
+        self.ledger.balances.clear()
+        self.undo_log.clear()
+
+    def replay_state(self, start: int, end: Optional[int] = None):
+        """ Apply the blocks of the chain starting at a height to the state.
+
+        Args:
+            start: Height of the first block to apply.
+            end: Height after the last block to apply (None => whole chain).
+        """
+        for header in list(self.chain.keys())[start:end]:
+            self.undo_log.add(
+                header, self.apply_state(Block(header, self.chain[header])))
+        self.ledger.reset_pending(self.transaction_pool)
+
+    def apply_state(self, block: Block) -> Dict[str, Any]:
+        """ Update the derived state with a block of the chain.
+
+        Args:
+            block: The block.
+
+        Returns:
+            The undo record of the block.
+        """
+        return {'balances': self.ledger.apply_transactions(
+            block.transactions)}
+
+    def revert_state(self, record: Dict[str, Any]):
+        """ Revert the changes of a block to the derived state.
+
+        Args:
+            record: The undo record returned by apply_state.
+        """
+        self.ledger.revert_deltas(record['balances'])
+
+    def snapshot_state(self) -> Dict[str, Any]:
+        """ Get the derived state for a snapshot.
+
+        Returns:
+            The state (serializable by the serializer).
+        """
+        return {'balances': list(self.ledger.balances.items())}
+
+    def restore_state(self, state: Dict[str, Any]):
+        """ Restore the derived state from a snapshot.
+
+        Args:
+            state: The state returned by snapshot_state.
+        """
+        self.ledger.balances.update(state['balances'])
+
+    def write_snapshot(self):
+        """ Write a snapshot of the state after the latest block.
+        """
+        if self.snapshots is None:
+            return
+        # Blocks of the snapshot have to be on the disk
+        self.store.sync()
+        self.snapshots.write(len(self.chain) - 1, self.latest_header(),
+                             self.snapshot_state())
+
+    def check_snapshot(self):
+        """ Write a snapshot every SNAPSHOT_INTERVAL blocks.
+        """
+        if self.snapshots is not None and \
+                (len(self.chain) - 1) % SNAPSHOT_INTERVAL == 0:
+            self.write_snapshot()
+
+    def check_pruning(self):
+        """ Drop the transactions of old blocks every PRUNE_INTERVAL blocks.
+
+            A snapshot of the latest block is written first,
+            so the state can be restored from the held blocks.
+        """
+        if self.prune_depth is None:
+            return
+        height = len(self.chain) - self.prune_depth
+        if height - self.chain.pruned_height < PRUNE_INTERVAL:
+            return
+        self.write_snapshot()
+        self.chain.prune(height)
+
+    def has_block(self, header: Header) -> bool:
+        """ Check whether the transactions of a block are held.
+
+        Args:
+            header: Header of the block.
+
+        Returns:
+            False if the block is not part of the chain or was pruned.
+        """
+        if isinstance(self.chain, LazyChain):
+            return self.chain.holds(header)
+        return header in self.chain
+
+    def rollback_state(self, fork: int) -> bool:
+        """ Revert the derived state to the state after the common ancestor.
+
+        Reverts the undo records of the blocks after the fork point,
+        without records the state is replayed from a snapshot.
+
+        Args:
+            fork: Position of the first block after the common ancestor.
+
+        Returns:
+            False if the state can't be restored (pruned chain).
+        """
+        headers = list(self.chain.keys())[fork:]
+        if self.undo_log.covers(headers):
+            for header in reversed(headers):
+                self.revert_state(self.undo_log.pop(header))
+            return True
+        try:
+            self.load_state(fork)
+        except RuntimeError:
+            return False
+        return True
+
+    def fork_point(self, other_chain: Dict[Header, Any]) -> int:
+        """ Get the number of blocks shared by the current and another chain.
+
+        Args:
+            other_chain: The other chain.
+
+        Returns:
+            Position of the first block after the common ancestor.
+        """
+        fork = 0
+        for other_header, header in zip(other_chain.keys(),
+                                        self.chain.keys()):
+            if other_header != header:
+                break
+            fork += 1
+        return fork
+
+    def process_block(self, block: Block):
+        """ Update the derived state with a block appended to the chain.
+
+        Args:
+            block: The appended block.
+        """
+        # remove transactions in new block from own transaction pool
+        for block_transaction in block.transactions:
+            if block_transaction in self.transaction_pool:
+                self.transaction_pool.remove(block_transaction)
+                self.ledger.remove_pending(block_transaction)
+        self.undo_log.add(block.header, self.apply_state(block))
+
+    def genesis_block(self) -> Block:
+        """ Get the first block of the chain.
+        """
+        return Block(Header(0, 0, 768894480, 0, 0, 0), [])
 
     def load_chain(self):
         """ Loads Blockchain from the hard drive.
+
+            Without block store the chain is read from the chain file.
+            An empty block store is filled with the chain file
+            (migration) or the genesis block.
+            With block store only the headers are loaded,
+            the transactions are read when accessed.
         """
-        if os.path.exists('bc_file.txt') and \
-                os.stat('bc_file.txt').st_size != 0 and \
-                Path('bc_file.txt').is_file():
+        if self.store is None:
+            self.chain = self.load_chain_file() or \
+                OrderedDict([self.genesis_block()])
+            return
+
+        if not len(self.store):
+            chain = self.load_chain_file()
+            if chain:
+                print_debug_info(
+                    f'Migrating {self.chain_file} to the block store')
+            self.store.import_chain(chain or
+                                    OrderedDict([self.genesis_block()]))
+        self.chain = LazyChain(self.store)
+
+    def load_chain_file(self) -> Optional[Dict[Header, List[Any]]]:
+        """ Read the chain from the chain file.
+
+        Returns:
+            The chain, None if the file doesn't exist / is empty.
+        """
+        if os.path.exists(self.chain_file) and \
+                os.stat(self.chain_file).st_size != 0 and \
+                Path(self.chain_file).is_file():
             print_debug_info(
                 'Load existing blockchain from file')
-            with open('bc_file.txt', 'r') as bc_file:
-                self.chain = serializer.deserialize(bc_file.read())
-        else:
-            # If file doesn't exist / is empty:
-            # Create genesis block
-
-            self.chain[Header(0, 0, 768894480, 0, 0, 0)] = []
+            with open(self.chain_file, 'r') as bc_file:
+                chain = serializer.deserialize(bc_file.read())
+            if isinstance(chain, list):
+                # List of blocks (headers can't be JSON keys)
+                chain = OrderedDict(chain)
+            return chain
+        return None
 
     def save_chain(self):
         """ Save the current chain to the hard drive.
+
+            The block store only has to sync the appended blocks.
         """
-        pprint('saving to file named bc_file.txt')
-        with open('bc_file.txt', 'w') as output:
-            output.write(serializer.serialize(self.chain))
+        if self.store is not None:
+            pprint(f'syncing block store in {self.store.directory}')
+            self.write_snapshot()
+            return
+        pprint(f'saving to file named {self.chain_file}')
+        with open(self.chain_file, 'w') as output:
+            output.write(serializer.serialize(self.get_block_chain()))
+
+    def close(self):
+        """ Close the block store (syncs the appended blocks)
+            and write a snapshot of the state.
+        """
+        if self.store is not None:
+            self.write_snapshot()
+            self.store.close()
 
     def new_transaction(self, transaction: Transaction):
         """ Add a new transaction to the blockchain.
@@ -115,16 +397,20 @@ class Blockchain(object):
             transaction: Transaction that should be added.
         """
         # Make sure, only one mining reward is granted per block
-        for pool_transaction in self.transaction_pool:
-            if pool_transaction.sender == '0' and \
-                    pool_transaction.signature == '0':
+        for pool_transaction in self.transaction_pool.by_sender('0'):
+            if pool_transaction.signature == '0':
                 print_debug_info(
                     'This block already granted a mining transaction!')
                 return
         if transaction in self.latest_block().transactions:
             return
         if self.validate_transaction(transaction, False):
-            self.transaction_pool.append(transaction)
+            for evicted in self.transaction_pool.add(transaction):
+                self.ledger.remove_pending(evicted)
+            if transaction not in self.transaction_pool:
+                print_debug_info('Transaction pool is full')
+                return
+            self.ledger.add_pending(transaction)
             self.send_queue.put(('new_transaction', transaction, 'broadcast'))
             if self.gui_ready:
                 self.gui_queue.put(('new_transaction', transaction, 'local'))
@@ -142,93 +428,195 @@ class Blockchain(object):
             block: The block to be added to the chain.
         """
 
-        # Check current chain
+        self.fetcher.receive(block.header)
 
+        # Check current chain
+        connected = False
         if block.header.index == self.latest_block().header.index + 1:
             if self.validate_block(block, self.latest_block(), False):
-                # remove transactions in new block from own transaction pool
-                for block_transaction in block.transactions:
-                    if block_transaction in self.transaction_pool:
-                        self.transaction_pool.remove(block_transaction)
+                self.process_block(block)
                 self.send_queue.put(('new_header', block.header, 'broadcast'))
                 self.chain[block.header] = block.transactions
+                self.check_snapshot()
+                self.check_pruning()
                 if self.gui_ready:
                     self.gui_queue.put(('new_block', block, 'local'))
+                connected = True
             else:
                 print_debug_info('Block not for current chain')
+        elif block.header.index > self.latest_block().header.index + 1:
+            self.add_orphan(block)
+
+        self.download_block(block)
+        if connected:
+            self.connect_orphans(block.header)
+
+    def add_orphan(self, block: Block):
+        """ Keep a block that arrived before its parent.
 
-        self.check_new_chain(block)
+        Blocks of the new chain are kept by the download instead.
+
+        Args:
+            block: The block.
+        """
+        if block.header in self.new_chain:
+            return
+        if self.orphans.add(block):
+            print_debug_info(f'Orphan block {block.header.index}')
+
+    def connect_orphans(self, header: Header):
+        """ Connect the kept children of a connected block.
+
+        Args:
+            header: Header of the connected block.
+        """
+        for block in self.orphans.pop_children(header.root_hash):
+            self.new_block(block)
+
+    def download_block(self, block: Block):
+        """ Pass a block to the download of the new chain.
+
+        Blocks of the download are handed to check_new_chain
+        in the order of the new chain.
+
+        Args:
+            block: The received block.
+        """
+        if block.header not in self.new_chain:
+            return
+        if block.header.root_hash != self.block_merkle_root(block):
+            # Reassigned after the timeout
+            print_debug_info('Block not for new chain')
+            return
+        ready = self.downloader.receive(block)
+        for ready_block in ([block] if ready is None else ready):
+            self.check_new_chain(ready_block)
 
     def check_new_chain(self, block):
         if block.header in self.new_chain:
-            if block.header.root_hash ==\
-                    self.create_merkle_root(block.transactions):
+            if block.header.root_hash == self.block_merkle_root(block):
                 # Validate transactions<->header
                 self.new_chain[block.header] = block.transactions
 
-                for t in block.transactions:
-                    try:
-                        # Remove processed transactions
-                        self.intermediate_transactions.remove(t)
-                    except ValueError:
-                        pass
-
                 # Check if new chain is finished
-                if not any(t is None for t in self.new_chain.values()):
-                    # Validate transactions
-                    old_data = next(iter(self.new_chain.items()))
-                    for h, t in self.new_chain.items():
-                        if h == old_data[0]:
-                            continue
-                        if self.validate_block(
-                                Block(h, t), Block(old_data[0], old_data[1]),
-                                True):
-                            old_data = (h, t)
-                        else:
-                            print_debug_info(
-                                'Invalid transaction in new chain')
-                            self.new_chain.clear()
-                            self.intermediate_transactions.clear()
-                            return
-
-                    self.send_queue.put(
-                        ('new_header', self.nc_latest_header(), 'broadcast'))
-                    self.chain = OrderedDict(self.new_chain)
+                if len(self.new_chain) > len(self.chain) and \
+                        not any(t is None for t in self.new_chain.values()):
+                    reorganized = self.reorganize()
+                    if reorganized:
+                        self.send_queue.put(
+                            ('new_header', self.latest_header(), 'broadcast'))
                     self.new_chain.clear()
-                    # Remove mining transactions
-                    not_processed_transactions = [
-                        t for t in self.intermediate_transactions
-                        if t.sender != '0']
-                    self.transaction_pool = list(not_processed_transactions)
-                    self.intermediate_transactions.clear()
-
-                    # DNS specific
-                    try:
-                        self._sync_auctions()  # type: ignore
-                    except AttributeError:
-                        pass
+                    self.downloader.clear()
+                    if reorganized:
+                        self.connect_orphans(self.latest_header())
 
             else:
                 print_debug_info('Block not for new chain')
 
-    def new_header(self, header: Header):
+    def reorganize(self) -> bool:
+        """ Switch to the completed new chain.
+
+        Rolls the derived state back to the common ancestor,
+        then validates and applies only the blocks of the new branch.
+        The transactions of the replaced blocks that are not part of
+        the new branch are returned to the transaction pool,
+        the pending balances are rebuilt from the pool afterwards.
+        An invalid new branch restores the old chain.
+
+        Returns:
+            True if the chain was switched.
+        """
+        fork = self.fork_point(self.new_chain)
+        old_blocks = [Block(h, self.chain[h])
+                      for h in list(self.chain.keys())[fork:]]
+        new_blocks = [Block(h, t)
+                      for h, t in list(self.new_chain.items())[fork:]]
+
+        # Verify all signatures of the new blocks at once
+        self.verify_signatures(
+            t for block in new_blocks for t in block.transactions)
+
+        if not self.rollback_state(fork):
+            print_debug_info('Conflict resolved (old chain), fork is pruned')
+            return False
+        self.truncate_chain(fork)
+        # Validate the new branch against the confirmed balances only,
+        # pooled transactions of the branch would be counted twice
+        self.ledger.reset_pending([])
+
+        for block in new_blocks:
+            if not self.validate_block(block, self.latest_block(), True):
+                print_debug_info('Invalid transaction in new chain')
+                self.rollback_state(fork)
+                self.truncate_chain(fork)
+                for old_block in old_blocks:
+                    self.connect_block(old_block)
+                self.ledger.reset_pending(self.transaction_pool)
+                return False
+            self.connect_block(block)
+
+        # Return orphaned transactions (except mining rewards) to the pool
+        confirmed = set(t for block in new_blocks
+                        for t in block.transactions)
+        for t in confirmed:
+            self.transaction_pool.discard(t)
+        for block in old_blocks:
+            for t in block.transactions:
+                if t not in confirmed and t.sender != '0' and \
+                        t not in self.transaction_pool:
+                    self.transaction_pool.add(t)
+        self.ledger.reset_pending(self.transaction_pool)
+
+        if self.store is not None:
+            self.store.sync()
+        print_debug_info(
+            f'Reorganized {len(old_blocks)} blocks at height {fork}')
+        return True
+
+    def connect_block(self, block: Block):
+        """ Apply a block to the derived state and append it to the chain.
+
+        Args:
+            block: The block.
+        """
+        self.undo_log.add(block.header, self.apply_state(block))
+        self.chain[block.header] = block.transactions
+
+    def truncate_chain(self, height: int):
+        """ Remove the blocks of the chain starting at a height.
+
+        Args:
+            height: Number of blocks to keep.
+        """
+        if isinstance(self.chain, LazyChain):
+            self.chain.truncate(height)
+            return
+        for header in list(self.chain.keys())[height:]:
+            del self.chain[header]
+
+    def new_header(self, header: Header, address: Optional[Address] = None):
         """ Check if new header is valid and ask for the corresponding block
 
+        The block is requested from the announcing node (see block_fetch).
+
         Args:
             header: New block-header
+            address: Node that announced the header.
         """
 
         if header.index > self.latest_header().index + 1:
             # block higher then current chain:
             # resolve conflict between chains
-            self.send_queue.put(('get_chain', '', 'broadcast'))
+            self.send_queue.put(
+                ('get_headers', (self.header_locator(), HEADERS_PAGE_SIZE),
+                 'broadcast'))
             print_debug_info('Chain out-of-date.')
             print_debug_info('Updating...')
             return
 
         if self.validate_header(header, self.latest_header()):
-            self.send_queue.put(('get_block', header, 'broadcast'))
-            print_debug_info('Valid header, asked for full block')
+            if self.fetcher.announce(header, address):
+                print_debug_info('Valid header, asked for full block')
         else:
             print_debug_info('Invalid header')
 
@@ -279,10 +667,12 @@ class Blockchain(object):
             return False
 
         # Check if hash is valid
-        if not self.create_merkle_root(block.transactions) ==\
-                block.header.root_hash:
+        if not self.block_merkle_root(block) == block.header.root_hash:
             return False
 
+        # Stateless stage, the transactions are validated by the subclass
+        self.verify_signatures(block.transactions)
+
         return True
 
     def validate_transaction(self,
@@ -298,29 +688,66 @@ class Blockchain(object):
         """
         raise NotImplementedError
 
-    def create_block(self, proof: Any) -> Block:
+    def create_block(self, proof: Any,
+                     reserved: Optional[List[Any]] = None) -> Block:
         """ Create a new block.
 
         Args:
             proof: Proof for the new block.
+            reserved: Transactions that have to be part of the block
+                (appended after the pool transactions).
 
         Returns:
             The created block.
         """
+        reserved = reserved or []
+        transactions = self.select_transactions(reserved) + reserved
         header = Header(
             self.version,
             len(self.chain),
             time(),
             self.latest_block().header.root_hash,
-            self.create_merkle_root(self.transaction_pool),
+            self.template_merkle_root(transactions),
             proof
         )
 
         block = Block(header,
-                      list(self.transaction_pool)
+                      transactions
                       )
         return block
 
+    def select_transactions(self, reserved: Iterable[Any] = ()) -> List[Any]:
+        """ Pick the pool transactions of a new block.
+
+        Picks by fee up to the limits of the template builder,
+        the other transactions stay in the pool.
+
+        Args:
+            reserved: Transactions that are part of the block anyway.
+
+        Returns:
+            The picked transactions (in pool order).
+        """
+        return self.template_builder.select(
+            self.transaction_pool,
+            lambda key: self.ledger.balances.get(key, 0),
+            self.conflict_key,
+            reserved)
+
+    @staticmethod
+    def conflict_key(transaction: Any) -> Optional[Hashable]:
+        """ Key of transactions that have to be mined in order.
+
+        Override this function if needed.
+
+        Args:
+            transaction: Pending transaction.
+
+        Returns:
+            The key, None if the transaction has no conflicts.
+        """
+        return None
+
     def create_proof(self, miner_key: bytes) -> Any:
         """ Create a proof for a new block.
 
@@ -334,63 +761,136 @@ class Blockchain(object):
         """
         raise NotImplementedError
 
-    def resolve_conflict(self, new_chain: List[Header]):
+    def resolve_conflict(self, new_chain: List[Header],
+                         address: Optional[Address] = None):
         """ Resolves any conflicts that occur with different/outdated chains.
 
         Conflicts are resolved by accepting the longest valid chain.
+        The headers are received page by page (see header_sync),
+        every page is appended to the new chain after the header
+        it links to. Full pages are continued by asking the sender
+        for the next page, the missing blocks are requested
+        once the tip of the sender is reached.
 
         Args:
-            new_chain: The chain to be validated,
-                received from other nodes in the network.
+            new_chain: The headers to be validated (a page or the
+                whole chain), received from other nodes in the network.
+            address: Sender of a page (None => last page).
         """
         print_debug_info('Resolving conflict')
-        if len(self.chain) < len(new_chain):
-            if len(self.new_chain) < len(new_chain):
-                # Validate new_chain
-                old_header = new_chain[0]
-                for header in new_chain[1:]:
-                    if self.validate_header(header, old_header):
-                        old_header = header
-                    else:
-                        print_debug_info('Conflict resolved (old chain)')
-                        return
-
-                # Clear intermediate transactions
-                self.intermediate_transactions.clear()
-
-                # Create blockchain from new_chain
-                new_bchain: OrderedDict[Header, List[Transaction]] = \
-                    OrderedDict([(h, None) for h in new_chain])
-
-                # Add known blocks
-                for h, t in self.chain.items():
-                    if h in new_bchain:
-                        new_bchain[h] = t
-                    else:
-                        # Update intermediate transactions
-                        self.intermediate_transactions += t
-
-                for h, t in self.new_chain.items():
-                    if h in new_bchain:
-                        new_bchain[h] = t
-                        if t:
-                            for i_t in t:
-                                try:
-                                    # Remove processed transactions
-                                    self.intermediate_transactions.remove(i_t)
-                                except ValueError:
-                                    pass
-
-                self.new_chain = new_bchain
-                print_debug_info('Conflict (Header) resolved (new chain)')
-
-                # Ask for missing blocks
-                for h, t in self.new_chain.items():
-                    if t is None:
-                        self.send_queue.put(('get_block', h, 'broadcast'))
+        self.downloader.add_peer(address)
+        headers = list(new_chain)
+        last_page = address is None or len(headers) < HEADERS_PAGE_SIZE
+
+        # Skip known headers
+        link = None
+        while headers and (headers[0] in self.chain or
+                           headers[0] in self.new_chain):
+            link = headers.pop(0)
+        if not headers:
+            if last_page and self.new_chain and \
+                    (link is None or link in self.new_chain):
+                # Tip of the sender reached
+                self.request_new_blocks()
+            else:
+                print_debug_info('Conflict resolved (old chain)')
+            return
+        if link is None:
+            link = self.find_header(headers[0].previous_hash)
+            if link is None:
+                print_debug_info('Conflict resolved (old chain), no fork point')
+                return
 
+        # Validate the page
+        old_header = link
+        for header in headers:
+            if self.validate_header(header, old_header):
+                old_header = header
+            else:
+                print_debug_info('Conflict resolved (old chain)')
+                return
+
+        if link in self.new_chain:
+            # Continue the new chain
+            known = list(self.new_chain.items())
+            base = known[:list(self.new_chain.keys()).index(link) + 1]
         else:
+            if link.index + 1 < getattr(self.chain, 'pruned_height', 0):
+                print_debug_info(
+                    'Conflict resolved (old chain), fork is pruned')
+                return
+            # Blocks of the current chain are not validated again
+            base = [(h, []) for h in list(self.chain.keys())[
+                :link.index + 1]]
+        new_bchain: OrderedDict[Header, List[Transaction]] = \
+            OrderedDict(base)
+        for h in headers:
+            # Keep downloaded blocks
+            new_bchain[h] = self.new_chain.get(h)
+
+        if self.new_chain and link != self.nc_latest_header() and \
+                len(new_bchain) <= len(self.new_chain):
+            print_debug_info('Conflict resolved (current new chain)')
+            return
+        self.new_chain = new_bchain
+
+        if not last_page:
+            self.send_queue.put(
+                ('get_headers', ([self.nc_latest_header().root_hash],
+                                 HEADERS_PAGE_SIZE), address))
+            return
+        self.request_new_blocks()
+
+    def request_new_blocks(self):
+        """ Ask for the missing blocks of the new chain
+            once all headers were received.
+        """
+        if len(self.new_chain) <= len(self.chain):
             print_debug_info('Conflict resolved (old chain)')
+            self.new_chain.clear()
+            self.downloader.clear()
+            return
+        print_debug_info('Conflict (Header) resolved (new chain)')
+
+        # Ask for missing blocks (each from one peer, see block_download)
+        self.downloader.start(
+            [h for h, t in self.new_chain.items() if t is None])
+
+    def find_header(self, root_hash: Any) -> Optional[Header]:
+        """ Find the header with a root hash
+            in the new chain or the current chain (from the tip).
+
+        Args:
+            root_hash: Root hash of the header.
+
+        Returns:
+            The header, None if it is unknown.
+        """
+        for chain in (self.new_chain, self.chain):
+            for header in reversed(chain):
+                if header.root_hash == root_hash:
+                    return header
+        return None
+
+    def header_locator(self) -> List[Any]:
+        """ Get the locator of the current chain.
+
+        Returns:
+            Root hashes of some headers (see header_sync).
+        """
+        return header_locator(self.chain)
+
+    def get_headers(self, locator: List[Any], limit: int) -> List[Header]:
+        """ Get the headers after the latest header of a locator.
+
+        Args:
+            locator: Root hashes of the headers known by the requester.
+            limit: Maximum number of headers.
+
+        Returns:
+            The headers (in order).
+        """
+        return headers_after(self.chain, locator, limit)
 
     def process_message(self, message: Tuple[str, Any, Address]):
         """ Create processor for incoming blockchain messages.
@@ -410,15 +910,28 @@ class Blockchain(object):
         elif msg_type == 'resolve_conflict':
             assert isinstance(msg_data, list)
             # assert all(isinstance(header, Header) for header in msg_data)
+            self.downloader.add_peer(msg_address)
             self.resolve_conflict(msg_data)
+        elif msg_type == 'get_headers':
+            locator, limit = msg_data
+            self.send_queue.put(
+                ('headers', self.get_headers(locator, limit), msg_address))
+        elif msg_type == 'headers':
+            assert isinstance(msg_data, list)
+            self.resolve_conflict(msg_data, msg_address)
         elif msg_type == 'save':
             if msg_address != 'local':
                 return
             self.save_chain()
         elif msg_type == 'dump':
             if msg_address == 'gui':
+                # Blocks with pruned transactions are sent empty
+                chain = OrderedDict(
+                    (h, self.chain[h] if self.has_block(h) else [])
+                    for h in self.chain)
                 self.gui_queue.put(
-                    ('dump', (self.chain, self.transaction_pool), 'local'))
+                    ('dump', (chain, list(self.transaction_pool)),
+                     'local'))
                 self.gui_ready = True
                 return
             if msg_address != 'local':
@@ -427,9 +940,33 @@ class Blockchain(object):
         elif msg_type == 'get_block':
             # assert isinstance(msg_data, Header)
             self.send_block(msg_data, msg_address)
+        elif msg_type == 'get_compact_block':
+            self.send_compact_block(msg_data, msg_address)
+        elif msg_type == 'compact_block':
+            self.new_compact_block(msg_data, msg_address)
+        elif msg_type == 'get_block_transactions':
+            if isinstance(msg_data, (list, tuple)) and len(msg_data) == 2:
+                header, indexes = msg_data
+                self.send_block_transactions(header, indexes, msg_address)
+        elif msg_type == 'block_transactions':
+            if isinstance(msg_data, (list, tuple)) and len(msg_data) == 2:
+                header, transactions = msg_data
+                self.new_block_transactions(header, transactions,
+                                            msg_address)
+        elif msg_type == 'pruned_block':
+            print_debug_info(
+                f'{msg_address} pruned block {msg_data.index}')
+            self.pruned_peers[msg_address] = max(
+                msg_data.index, self.pruned_peers.get(msg_address, -1))
+            self.downloader.unavailable(msg_data, msg_address)
+        elif msg_type == 'download_tick':
+            if msg_address != 'local':
+                return
+            self.downloader.tick()
+            self.fetcher.tick()
         elif msg_type == 'new_header':
             # assert isinstance(msg_data, Header)
-            self.new_header(msg_data)
+            self.new_header(msg_data, msg_address)
 
     def latest_block(self) -> Block:
         """ Get the latest block.
@@ -497,59 +1034,225 @@ class Blockchain(object):
     def send_block(self, header: Header, address: Address):
         """ Send block corresponding to the header to the address
 
+            Blocks whose transactions were pruned are answered
+            with a 'pruned_block' message.
+
         Args:
             header: Header of the block
             address: Address of the receiver
         """
+        if header in self.chain and not self.has_block(header):
+            # Tell the peer to ask archival nodes
+            self.send_queue.put(('pruned_block', header, address))
+            return
         s_block = self.get_block(header)
         if s_block and s_block.transactions:
             self.send_queue.put(('new_block', s_block, address))
 
+    def send_compact_block(self, header: Header, address: Address):
+        """ Send the compact block corresponding to the header
+            to the address (see compact_block).
+
+        Args:
+            header: Header of the block
+            address: Address of the receiver
+        """
+        if header in self.chain and not self.has_block(header):
+            self.send_queue.put(('pruned_block', header, address))
+            return
+        s_block = self.get_block(header)
+        if s_block and s_block.transactions:
+            self.send_queue.put(
+                ('compact_block', create_compact_block(s_block), address))
+
+    def new_compact_block(self, compact_block: CompactBlock,
+                          address: Address):
+        """ Rebuild a compact block from the transaction pool.
+
+        Missing transactions are requested from the sender.
+
+        Args:
+            compact_block: The compact block.
+            address: Sender of the compact block.
+        """
+        if not valid_compact_block(compact_block):
+            print_debug_info(f'Invalid compact block from {address}')
+            return
+        header = compact_block[0]
+        if header in self.chain or header in self.partial_blocks:
+            return
+        transactions = rebuild_transactions(
+            compact_block, self.transaction_pool)
+        missing = [i for i, t in enumerate(transactions) if t is None]
+        if not missing:
+            self.rebuilt_block(header, transactions, address)
+            return
+        print_debug_info(
+            f'Compact block {header.index}: {len(missing)} missing')
+        self.partial_blocks.add(header, transactions, address)
+        self.send_queue.put(
+            ('get_block_transactions', (header, missing), address))
+
+    def send_block_transactions(self, header: Header, indexes: List[int],
+                                address: Address):
+        """ Send transactions of a block to the address.
+
+        Args:
+            header: Header of the block
+            indexes: Positions of the transactions in the block.
+            address: Address of the receiver
+        """
+        s_block = self.get_block(header)
+        if not s_block or not self.has_block(header) or \
+                not isinstance(indexes, (list, tuple)) or \
+                not all(type(i) is int and 0 <= i < len(s_block.transactions)
+                        for i in indexes):
+            return
+        self.send_queue.put(
+            ('block_transactions',
+             (header, [s_block.transactions[i] for i in indexes]), address))
+
+    def new_block_transactions(self, header: Header,
+                               transactions: List[Any],
+                               address: Address):
+        """ Complete a compact block with its missing transactions.
+
+        Args:
+            header: Header of the block.
+            transactions: The missing transactions (in order).
+            address: Sender of the transactions.
+        """
+        transactions = self.partial_blocks.complete(
+            header, address, transactions)
+        if transactions is not None:
+            self.rebuilt_block(header, transactions, address)
+
+    def rebuilt_block(self, header: Header, transactions: List[Any],
+                      address: Address):
+        """ Process a block rebuilt from a compact block.
+
+        Blocks with a wrong merkle root (colliding short ids)
+        are requested in full.
+
+        Args:
+            header: Header of the block.
+            transactions: Transactions of the block.
+            address: Sender of the compact block.
+        """
+        block = Block(header, transactions)
+        if self.block_merkle_root(block) != header.root_hash:
+            print_debug_info(f'Compact block {header.index} not rebuilt')
+            self.fetcher.fallback(header, address)
+            return
+        self.new_block(block)
+
     @staticmethod
-    def create_merkle_root(transactions: List[Transaction]) -> str:
+    def create_merkle_root(transactions: List[Transaction],
+                           version: float = 0) -> str:
         """ Calculate the Merkle root of the transactions.
 
+        Blocks with a version of at least BINARY_ENCODING_VERSION
+        hash the transaction digests, older blocks hash str(transaction).
 
         Args:
             transactions: List of transactions
+            version: Version of the block (default: 0 => legacy hashing)
 
         Returns:
             Merkle root of transactions.
         """
+        return merkle_root(transactions, version)
+
+    def block_merkle_root(self, block: Block) -> str:
+        """ Get the Merkle root of the transactions of a block.
+
+        The tree is cached per header, so it is only built once
+        for every known block.
+
+        Args:
+            block: Block whose root should be calculated.
+
+        Returns:
+            Merkle root of the block transactions.
+        """
+        return self.merkle_trees.root(block.header, block.transactions)
 
-        # Hash empty transaction list
-        # Should only exist in Genesis Block
-        if not transactions:
-            return Blockchain.hash(transactions)
+    def template_merkle_root(self, transactions: List[Any]) -> str:
+        """ Calculate the Merkle root for a new block of this node.
 
-        # Create leaf-hash
+        Uses an incremental tree, so only transactions that changed
+        since the last template (e.g. new pool transactions
+        or the mining reward) are hashed.
+
+        Args:
+            transactions: Transactions of the new block.
 
-        hash_list = [Blockchain.hash(t) for t in sorted(
-            transactions, key=lambda i_t: i_t.timestamp)]
+        Returns:
+            Merkle root of the transactions.
+        """
+        return self.template_tree.update(transactions)
 
-        # Make perfect full binary tree
+    def store_template_tree(self, header: Header):
+        """ Cache the tree of the last template for its finished block.
 
-        for h in range(len(hash_list)):  # Artificial max length
-            if h < math.log2(len(hash_list)):
-                continue
-            while h != math.log2(len(hash_list)):
-                hash_list.append(hash_list[-1])
-            break
+        Args:
+            header: Header of the block created from the template.
+        """
+        self.merkle_trees.store(header, self.template_tree.copy())
 
-        # Create Merkle-tree
+    def verify_signature(self, transaction: Any) -> bool:
+        """ Verify the signature of a transaction.
 
-        t_hash: List[Any] = []
+        Signatures either sign the message of the byte encoding
+        or the legacy hash of the transaction.
+        Results are cached by transaction id,
+        so a signature is only verified once.
 
-        while len(hash_list) != 1:
-            t_hash.clear()
-            for i in range(0, len(hash_list), 2):
-                t_hash.append(Blockchain.hash(
-                    hash_list[i] +
-                    hash_list[i+1]
-                ))
-            hash_list = list(t_hash)
+        Args:
+            transaction: Transaction that should be verified.
 
-        return hash_list[0]
+        Returns:
+            The validity (True/False) of the signature.
+        """
+        transaction_id = transaction.digest
+        valid = self.signature_cache.get(transaction_id)
+        if valid is None:
+            valid = self._verify_signature(transaction)
+            self.signature_cache.put(transaction_id, valid)
+        return valid
+
+    def _verify_signature(self, transaction: Any) -> bool:
+        """ Verify the signature of a transaction (uncached).
+        """
+        return check_signature(
+            transaction, self.legacy_hash,
+            self.signature_cache.verify_key(transaction.sender))
+
+    def verify_signatures(self, transactions: Iterable[Any]):
+        """ Verify the signatures of transactions in parallel.
+
+        Stateless stage of the validation, the results are cached
+        and used by verify_signature.
+
+        Args:
+            transactions: Transactions that should be verified.
+        """
+        self.validation.verify_signatures(
+            transactions, type(self).legacy_hash, self.signature_cache)
+
+    @staticmethod
+    def legacy_hash(transaction: Any) -> str:
+        """ Create the hash signed by legacy transactions.
+
+        Abstract function!
+
+        Args:
+            transaction: Transaction of the hash.
+
+        Returns:
+            Hex digest signed by the sender.
+        """
+        raise NotImplementedError
 
     @staticmethod
     def hash(data: Any) -> str:
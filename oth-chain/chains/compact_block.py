@@ -0,0 +1,196 @@
+""" Compact blocks, blocks relayed with short transaction ids.
+
+The transactions of a new block are usually in the transaction pool
+of the receiving node already, so a compact block only contains
+the header, a short id per transaction and the transactions the
+receiver can't have (the mining rewards).
+The receiver rebuilds the block from its pool and requests only
+the missing transactions from the sender.
+
+Short ids are the first SHORT_ID_BYTES bytes of the sha256 digest
+of the root hash of the block and the transaction id.
+They are salted with the block, so a collision in one block
+does not repeat in other blocks.
+Colliding short ids result in a block with the wrong merkle root,
+which is requested as a full block (new_block).
+Malformed compact blocks (see valid_compact_block) are dropped.
+"""
+
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from .encoding import sha256
+
+# Length of a short transaction id (in bytes)
+SHORT_ID_BYTES = 6
+
+# Maximum number of partially rebuilt blocks waiting for transactions
+MAX_PARTIAL_BLOCKS = 16
+
+# Header, short ids (hex, concatenated), [(index, transaction), ...]
+CompactBlock = Tuple[Any, str, List[Tuple[int, Any]]]
+
+
+def short_id(header: Any, transaction: Any) -> str:
+    """ Create the short id of a transaction in a block.
+
+    Args:
+        header: Header of the block.
+        transaction: The transaction.
+
+    Returns:
+        Hex of the short id.
+    """
+    salt = str(header.root_hash).encode()
+    return sha256(salt + transaction.digest)[:SHORT_ID_BYTES].hex()
+
+
+def create_compact_block(block: Any) -> CompactBlock:
+    """ Create the compact block of a block.
+
+    Mining rewards are sent in full (prefilled).
+
+    Args:
+        block: The block.
+
+    Returns:
+        Tuple of (header, short ids, prefilled transactions)
+    """
+    short_ids = []
+    prefilled = []
+    for index, transaction in enumerate(block.transactions):
+        if transaction.sender == '0':
+            prefilled.append((index, transaction))
+        else:
+            short_ids.append(short_id(block.header, transaction))
+    return block.header, ''.join(short_ids), prefilled
+
+
+def valid_compact_block(compact_block: Any) -> bool:
+    """ Check the structure of a received compact block.
+
+    The short ids have to be complete and the positions of the
+    prefilled transactions unique and inside of the block.
+
+    Args:
+        compact_block: The received compact block.
+
+    Returns:
+        The validity (True/False) of the compact block.
+    """
+    if not isinstance(compact_block, (list, tuple)) or \
+            len(compact_block) != 3:
+        return False
+    header, short_ids, prefilled = compact_block
+    if not hasattr(header, 'root_hash') or \
+            not isinstance(short_ids, str) or \
+            len(short_ids) % (2 * SHORT_ID_BYTES) or \
+            not isinstance(prefilled, (list, tuple)):
+        return False
+    count = len(short_ids) // (2 * SHORT_ID_BYTES) + len(prefilled)
+    indexes = set()
+    for item in prefilled:
+        if not isinstance(item, (list, tuple)) or len(item) != 2:
+            return False
+        index, transaction = item
+        if type(index) is not int or not 0 <= index < count or \
+                index in indexes or transaction is None:
+            return False
+        indexes.add(index)
+    return True
+
+
+def rebuild_transactions(compact_block: CompactBlock,
+                         pool: Iterable[Any]
+                         ) -> Optional[List[Optional[Any]]]:
+    """ Rebuild the transactions of a compact block.
+
+    Args:
+        compact_block: The compact block.
+        pool: Transactions known by the receiver.
+
+    Returns:
+        The transactions of the block (in order),
+        None for transactions that are not known.
+        None if the compact block is malformed.
+    """
+    if not valid_compact_block(compact_block):
+        return None
+    header, short_ids, prefilled = compact_block
+    width = 2 * SHORT_ID_BYTES
+    count = len(short_ids) // width + len(prefilled)
+    transactions: List[Optional[Any]] = [None] * count
+    for index, transaction in prefilled:
+        transactions[index] = transaction
+
+    wanted: Dict[str, List[int]] = {}
+    positions = (i for i, t in enumerate(transactions) if t is None)
+    for offset, index in zip(range(0, len(short_ids), width), positions):
+        wanted.setdefault(short_ids[offset:offset + width], []).append(index)
+
+    for transaction in pool:
+        indexes = wanted.get(short_id(header, transaction))
+        if indexes is not None:
+            for index in indexes:
+                transactions[index] = transaction
+    return transactions
+
+
+class PartialBlocks(object):
+    """ Rebuilt blocks waiting for their missing transactions.
+
+    Args:
+        max_size: Maximum number of kept blocks (the oldest is dropped).
+    """
+
+    def __init__(self, max_size: int = MAX_PARTIAL_BLOCKS) -> None:
+        self.max_size = max_size
+        # Header -> (transactions, address of the sender)
+        self._blocks: Dict[Any, Tuple[List[Optional[Any]], Any]] = \
+            OrderedDict()
+
+    def __contains__(self, header: Any) -> bool:
+        return header in self._blocks
+
+    def __len__(self) -> int:
+        return len(self._blocks)
+
+    def add(self, header: Any, transactions: List[Optional[Any]],
+            address: Any):
+        """ Keep a partially rebuilt block.
+
+        Args:
+            header: Header of the block.
+            transactions: Transactions of the block, None if missing.
+            address: Sender of the compact block.
+        """
+        self._blocks[header] = (transactions, address)
+        while len(self._blocks) > self.max_size:
+            self._blocks.popitem(last=False)
+
+    def complete(self, header: Any, address: Any,
+                 missing: List[Any]) -> Optional[List[Any]]:
+        """ Add the missing transactions to a kept block.
+
+        Args:
+            header: Header of the block.
+            address: Sender of the transactions.
+            missing: The missing transactions (in order).
+
+        Returns:
+            The transactions of the block, None if the block is not kept
+            or transactions are missing (or malformed).
+        """
+        transactions, sender = self._blocks.get(header, (None, None))
+        if transactions is None or sender != address:
+            return None
+        del self._blocks[header]
+        if not isinstance(missing, (list, tuple)) or \
+                any(t is None for t in missing):
+            return None
+        indexes = [i for i, t in enumerate(transactions) if t is None]
+        if len(indexes) != len(missing):
+            return None
+        for index, transaction in zip(indexes, missing):
+            transactions[index] = transaction
+        return transactions
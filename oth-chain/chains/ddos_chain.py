@@ -1,32 +1,36 @@
-import os
 from collections import OrderedDict, namedtuple
-from pathlib import Path
 from pprint import pprint
 from queue import Queue
 from time import time
-from typing import Any, Callable, Dict, List, Tuple
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
-import nacl.encoding
-import nacl.signing
-from nacl.exceptions import BadSignatureError
-
-import serializer
 from utils import Node, print_debug_info
 
+from .block_template import TemplateBuilder
 from .blockchain import Address, Block, Blockchain
+from .encoding import Encodable, SignedEncodable
+
+
+class DDosHeader(namedtuple('DDosHeader',
+                            ['version',
+                             'index',
+                             'timestamp',
+                             'previous_hash',
+                             'root_hash']),
+                 Encodable):
+    """ Header of a block of the DDoS chain.
+    """
+
 
-DDosHeader = namedtuple('DDosHeader',
-                        ['version',
-                         'index',
-                         'timestamp',
-                         'previous_hash',
-                         'root_hash'])
+class DDosTransaction(namedtuple('DDosTransaction',
+                                 ['sender',
+                                  'timestamp',
+                                  'data',
+                                  'signature']),
+                      SignedEncodable):
+    """ Operation on the blocked IPs or the invited users.
+    """
 
-DDosTransaction = namedtuple('DDosTransaction',
-                             ['sender',
-                              'timestamp',
-                              'data',
-                              'signature'])
 
 DDosData = namedtuple('DDosData',
                       ['type',
@@ -34,18 +38,26 @@ DDosData = namedtuple('DDosData',
 
 IP_LIST_FILE_NAME = 'Blacklist.txt'
 
+# Number of operations of a block
+BLOCK_TRANSACTIONS = 5
+
 
 class DDosChain(Blockchain):
 
+    chain_file = 'ddos_bc_file.txt'
+
     def __init__(self,
                  version: float,
                  send_queue: Queue,
-                 gui_queue: Queue) -> None:
-        super(DDosChain, self).__init__(version, send_queue, gui_queue)
-        self.tree = Node('Root')
-        self.tree.add_child(Node(str(
-            "ab2a248087095ef9e84a900337fac41cf2d588e9017b345f1c90a4bb0844ed28".encode('utf-8'))))
-        self.blocked_ips: Dict[str, Node] = {}
+                 gui_queue: Queue,
+                 validation_workers: int = 0,
+                 store_directory: Optional[str] = None,
+                 prune_depth: Optional[int] = None) -> None:
+        super(DDosChain, self).__init__(version, send_queue, gui_queue,
+                                        validation_workers, store_directory,
+                                        prune_depth)
+        self.template_builder = TemplateBuilder(
+            max_transactions=BLOCK_TRANSACTIONS)
 
     def get_ips(self):
         return list(self.blocked_ips.keys())
@@ -54,39 +66,88 @@ class DDosChain(Blockchain):
         with open(IP_LIST_FILE_NAME, 'w') as f:
             f.writelines(self.blocked_ips.keys())
 
-    def load_chain(self):
-        if os.path.exists('ddos_bc_file.txt') and \
-                os.stat('ddos_bc_file.txt').st_size != 0 and \
-                Path('ddos_bc_file.txt').is_file():
-            print_debug_info(
-                'Load existing blockchain from file')
-            with open('ddos_bc_file.txt', 'r') as bc_file:
-                self.chain = serializer.deserialize(bc_file.read())
-        else:
-            self.chain[DDosHeader(0, 0, 768894480, 0, 0)] = []
+    def genesis_block(self) -> Block:
+        """ Get the first block of the DDoS chain.
+        """
+        return Block(DDosHeader(0, 0, 768894480, 0, 0), [])
 
-    def save_chain(self):
-        """ Save the current chain to the hard drive.
+    def reset_state(self):
+        """ Reset the tree of invited users and the blocked IPs.
         """
-        pprint('saving to file named bc_file.txt')
-        with open('ddos_bc_file.txt', 'w') as output:
-            output.write(serializer.serialize(self.chain))
+        self.tree = Node('Root')
+        self.tree.add_child(Node(str(
+            "ab2a248087095ef9e84a900337fac41cf2d588e9017b345f1c90a4bb0844ed28".encode('utf-8'))))
+        self.blocked_ips: Dict[str, Node] = {}
+
+    def apply_state(self, block: Block) -> Dict[str, Any]:
+        """ Apply the operations of a block to the tree and the blocked IPs.
+        """
+        return {'operations': [self.process_transaction(transaction)
+                               for transaction in block.transactions]}
 
-    def process_transaction(self, transaction: DDosTransaction):
+    def revert_state(self, record: Dict[str, Any]):
+        """ Revert the operations of a block (in reverse order).
+        """
+        for operation in reversed(record['operations']):
+            self.revert_operation(operation)
+
+    def snapshot_state(self) -> Dict[str, Any]:
+        """ Get the tree (as list of (content, parent content))
+            and the blocked IPs (as list of (ip, blocker content)).
+        """
+        nodes = []
+        stack = [self.tree]
+        while stack:
+            node = stack.pop()
+            parent = node.parent.content if node.parent else None
+            nodes.append((node.content, parent))
+            stack.extend(reversed(node.children))
+        blocked_ips = [(ip, node.content)
+                       for ip, node in self.blocked_ips.items()]
+        return {'tree': nodes, 'blocked_ips': blocked_ips}
+
+    def restore_state(self, state: Dict[str, Any]):
+        """ Restore the tree and the blocked IPs.
+        """
+        nodes: Dict[str, Node] = {}
+        for content, parent in state['tree']:
+            node = Node(content)
+            if parent is None:
+                self.tree = node
+            else:
+                nodes[parent].add_child(node)
+            nodes[content] = node
+        self.blocked_ips = dict((ip, nodes[content])
+                                for ip, content in state['blocked_ips'])
+
+    def process_transaction(self, transaction: DDosTransaction
+                            ) -> Tuple[str, Any]:
+        """ Apply an operation to the tree and the blocked IPs.
+
+        Args:
+            transaction: The operation.
+
+        Returns:
+            Edit that reverts the operation (used by revert_operation).
+        """
+        undo: Tuple[str, Any] = ('', None)
         # INVITE
         if transaction.data.type == 'i':
             new_node = Node(str(transaction.data.data))
             parent = self.tree.get_node_by_content(str(transaction.sender))
             parent.add_child(new_node)
+            undo = ('i', new_node)
 
         # UNINVITE
         elif transaction.data.type == 'ui':
             node_to_remove = self.tree.get_node_by_content(
                 str(transaction.data.data))
-            self.tree.remove_node(node_to_remove, False)
+            undo = ('ui', self.remove_node(node_to_remove))
 
         # BLOCK IP
         elif transaction.data.type == 'b':
+            undo = ('b', (transaction.data.data,
+                          self.blocked_ips.get(transaction.data.data)))
             if transaction.data.data in self.blocked_ips:
                 ancestors = self.blocked_ips[transaction.data.data].\
                     get_ancestors()
@@ -103,12 +164,14 @@ class DDosChain(Blockchain):
 
         # UNBLOCK IP
         elif transaction.data.type == 'ub':
+            undo = ('ub', (transaction.data.data,
+                           self.blocked_ips[transaction.data.data]))
             del(self.blocked_ips[transaction.data.data])
         # PURGE
         elif transaction.data.type == 'p':
             node_to_remove = self.tree.get_node_by_content(
                 str(transaction.data.data))
-            self.tree.remove_node(node_to_remove, False)
+            removal = self.remove_node(node_to_remove)
             index_list = []
             # Remove all ips blocked from this client
             for i, t in self.blocked_ips.items():
@@ -117,8 +180,62 @@ class DDosChain(Blockchain):
                     index_list.append(i)
             for index in index_list:
                 del(self.blocked_ips[index])
+            undo = ('p', (removal, index_list))
         if self.gui_ready:
             self.gui_queue.put(('operation', transaction, 'local'))
+        return undo
+
+    def remove_node(self, node: Node) -> Tuple[Node, Node, int, List[Node]]:
+        """ Remove a node from the tree, its children move to its parent.
+
+        Returns:
+            The removal as (node, parent, position in the children
+            of the parent, children of the node).
+        """
+        parent = node.get_parent()
+        position = parent.children.index(node)
+        children = list(node.children)
+        self.tree.remove_node(node, False)
+        return node, parent, position, children
+
+    def revert_operation(self, undo: Tuple[str, Any]):
+        """ Revert an operation applied by process_transaction.
+
+        Args:
+            undo: The edit returned by process_transaction.
+        """
+        operation, data = undo
+        if operation == 'i':
+            data.parent.children.remove(data)
+            data.parent = None
+        elif operation in ('b', 'ub'):
+            ip, blocker = data
+            if blocker is None:
+                del self.blocked_ips[ip]
+            else:
+                self.blocked_ips[ip] = blocker
+        elif operation == 'ui':
+            self.restore_node(data)
+        elif operation == 'p':
+            removal, index_list = data
+            self.restore_node(removal)
+            for ip in index_list:
+                self.blocked_ips[ip] = removal[0]
+
+    @staticmethod
+    def restore_node(removal: Tuple[Node, Node, int, List[Node]]):
+        """ Insert a node removed by remove_node at its old position.
+
+        Args:
+            removal: The removal returned by remove_node.
+        """
+        node, parent, position, children = removal
+        for child in children:
+            parent.children.remove(child)
+            child.parent = node
+        node.children = children
+        parent.children.insert(position, node)
+        node.parent = parent
 
     def valid_operation(self, transaction: DDosTransaction):
         # Invite
@@ -169,42 +286,51 @@ class DDosChain(Blockchain):
             print_debug_info('Invalid transaction')
             return
 
-        for pool_transaction in self.transaction_pool:
-            if transaction == pool_transaction:
-                print_debug_info('Transaction already in pool')
-                return
-            if transaction.data == pool_transaction.data:
-                print_debug_info('This operation is already in the pool')
-                return
+        if transaction in self.transaction_pool:
+            print_debug_info('Transaction already in pool')
+            return
+        if self.transaction_pool.by_data(transaction.data):
+            print_debug_info('This operation is already in the pool')
+            return
 
-        self.transaction_pool.append(transaction)
+        self.transaction_pool.add(transaction)
+        if transaction not in self.transaction_pool:
+            print_debug_info('Transaction pool is full')
+            return
         self.send_queue.put(('new_transaction', transaction, 'broadcast'))
         if self.gui_ready:
             self.gui_queue.put(('new_transaction', transaction, 'local'))
-        if len(self.transaction_pool) >= 5:
+        if len(self.transaction_pool) >= BLOCK_TRANSACTIONS:
             self.create_m_blocks()
 
     def process_block(self, block: Block):
+        self.undo_log.add(block.header, self.apply_state(block))
         for transaction in block.transactions:
-            self.process_transaction(transaction)
             # Remove from pool
-            try:
-                self.transaction_pool.remove(transaction)
-            except ValueError:
-                pass
+            self.transaction_pool.discard(transaction)
 
     def new_block(self, block: Block):
+        self.fetcher.receive(block.header)
+
         # Main chain
+        connected = False
         if self.validate_block(block, self.latest_block()):
             self.process_block(block)
             self.chain[block.header] = block.transactions
+            self.check_snapshot()
+            self.check_pruning()
             self.send_queue.put(('new_block', block, 'broadcast'))
             if self.gui_ready:
                 self.gui_queue.put(('new_block', block, 'local'))
+            connected = True
         else:
             print_debug_info('Block not for main chain')
+            if block.header.index > self.latest_block().header.index + 1:
+                self.add_orphan(block)
 
-        self.check_new_chain(block)
+        self.download_block(block)
+        if connected:
+            self.connect_orphans(block.header)
 
     def validate_block(self, block: Block, last_block: Block,
                        new_chain: bool = False) -> bool:
@@ -221,55 +347,62 @@ class DDosChain(Blockchain):
         if not self.valid_operation(transaction):
             return False
 
-        try:
-            verify_key = nacl.signing.VerifyKey(
-                transaction.sender, encoder=nacl.encoding.HexEncoder)
-            transaction_hash = verify_key.verify(
-                transaction.signature).decode()
-            hash_str = (str(transaction.sender) +
-                        str(transaction.data) +
-                        str(transaction.timestamp))
-            validate_hash = self.hash(hash_str)
-
-            if validate_hash == transaction_hash:
-                print_debug_info('Signature OK')
-                return True
-            print_debug_info('Wrong Hash')
-            return False
+        return self.verify_signature(transaction)
 
-        except BadSignatureError:
-            print_debug_info('Bad Signature, Validation Failed')
-            return False
+    @staticmethod
+    def legacy_hash(transaction: DDosTransaction) -> str:
+        """ Create the hash signed by legacy transactions.
+
+        Args:
+            transaction: Transaction of the hash.
+
+        Returns:
+            Hex digest signed by the sender.
+        """
+        hash_str = (str(transaction.sender) +
+                    str(transaction.data) +
+                    str(transaction.timestamp))
+        return DDosChain.hash(hash_str)
 
     def create_m_blocks(self):
-        t_amount = len(self.transaction_pool)
-        for i in range(0, t_amount, 5):
-            if i+5 > t_amount:
+        """ Create blocks of BLOCK_TRANSACTIONS pool operations.
+
+        The operations are picked by the template builder,
+        so operations on the same ip/client stay in order.
+        """
+        while len(self.transaction_pool) >= BLOCK_TRANSACTIONS:
+            pool_size = len(self.transaction_pool)
+            block = self.create_block(None)
+            if len(block.transactions) < BLOCK_TRANSACTIONS:
                 break
-            header = DDosHeader(self.version,
-                                len(self.chain),
-                                time(),
-                                self.latest_block().header.root_hash,
-                                self.create_merkle_root(
-                                    self.transaction_pool[i:i+5]
-                                ))
-            block = Block(header,
-                          list(self.transaction_pool[i:i+5]))
+            self.store_template_tree(block.header)
             self.new_block(block)
+            if len(self.transaction_pool) >= pool_size:
+                break
 
-    def create_block(self, proof: Any) -> Block:
+    def create_block(self, proof: Any,
+                     reserved: Optional[List[DDosTransaction]] = None
+                     ) -> Block:
+        transactions = self.select_transactions(reserved or []) + \
+            (reserved or [])
         header = DDosHeader(self.version,
                             len(self.chain),
                             time(),
                             self.latest_block().header.root_hash,
-                            self.create_merkle_root(self.transaction_pool)
+                            self.template_merkle_root(transactions)
                             )
 
         block = Block(header,
-                      list(self.transaction_pool))
+                      transactions)
 
         return block
 
+    @staticmethod
+    def conflict_key(transaction: DDosTransaction) -> Any:
+        """ Operations on the same ip/client have to be mined in order.
+        """
+        return transaction.data.data
+
     def create_proof(self, miner_key: bytes) -> Any:
         return 0
 
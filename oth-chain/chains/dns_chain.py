@@ -1,31 +1,31 @@
 import hashlib
 from queue import Queue
 
-from nacl.exceptions import BadSignatureError
-
 from .pow_chain import PoW_Blockchain
 from .blockchain import Block, Transaction, Header
-from typing import Any, Dict, Callable, Tuple, List
+from .encoding import SignedEncodable
+from typing import Any, Dict, Callable, Optional, Tuple, List
 from networking import Address
-from utils import print_debug_info
 from pprint import pprint
 
-from collections import namedtuple, OrderedDict
+from collections import defaultdict, namedtuple, OrderedDict
 
-import nacl.encoding
-import nacl.signing
 import math
 import time
 
 
-DNS_Transaction = namedtuple('DNS_Transaction',
-                             ['sender',
-                              'recipient',
-                              'amount',
-                              'fee',
-                              'timestamp',
-                              'data',
-                              'signature'])
+class DNS_Transaction(namedtuple('DNS_Transaction',
+                                 ['sender',
+                                  'recipient',
+                                  'amount',
+                                  'fee',
+                                  'timestamp',
+                                  'data',
+                                  'signature']),
+                      SignedEncodable):
+    """ Transaction with an optional domain operation.
+    """
+
 
 DNS_Data = namedtuple('DNS_Data',
                       ['type',
@@ -48,15 +48,138 @@ class DNSBlockChain(PoW_Blockchain):
     def __init__(self,
                  version: float,
                  send_queue: Queue,
-                 gui_queue: Queue) -> None:
-        super(DNSBlockChain, self).__init__(version, send_queue, gui_queue)
-        self.chain: OrderedDict[Header, List[DNS_Transaction]] = OrderedDict()
-        self.new_chain: OrderedDict[Header,
-                                    List[DNS_Transaction]] = OrderedDict()
-        self.transaction_pool: List[DNS_Transaction] = []
-        self.load_chain()  # overwrite?
+                 gui_queue: Queue,
+                 validation_workers: int = 0,
+                 mining_threads: int = 1,
+                 store_directory: Optional[str] = None,
+                 prune_depth: Optional[int] = None) -> None:
+        # Updated by the blocks applied while loading the chain
         self.auctions: OrderedDict[int,
                                    List[Tuple[DNS_Transaction, DNS_Transaction]]] = OrderedDict()
+        super(DNSBlockChain, self).__init__(version, send_queue, gui_queue,
+                                            validation_workers,
+                                            mining_threads,
+                                            store_directory,
+                                            prune_depth)
+
+    def reset_state(self):
+        """ Reset the balances, the domain operations and the auctions.
+        """
+        super(DNSBlockChain, self).reset_state()
+        self.auctions.clear()
+        # Operations on a domain as (block index, cutoff, transaction),
+        # the cutoff is the latest timestamp of the transactions
+        # from the operation to the end of its block
+        self.domains: Dict[str, List[Tuple[int, float, DNS_Transaction]]] = \
+            defaultdict(list)
+
+    def apply_state(self, block: Block) -> Dict[str, Any]:
+        """ Update the balances, the domain operations
+            and the auctions with a block.
+        """
+        record = super(DNSBlockChain, self).apply_state(block)
+        record['domains'] = self._index_domains(block.header,
+                                                block.transactions)
+        record['auctions'] = self._register_auctions(block.header,
+                                                     block.transactions)
+        return record
+
+    def revert_state(self, record: Dict[str, Any]):
+        """ Revert the changes of a block to the balances,
+            the domain operations and the auctions.
+        """
+        super(DNSBlockChain, self).revert_state(record)
+        for name in reversed(record['domains']):
+            operations = self.domains[name]
+            operations.pop()
+            if not operations:
+                del self.domains[name]
+        for key, auction_list in reversed(record['auctions']):
+            if auction_list is None:
+                self.auctions.pop(key, None)
+            else:
+                self.auctions[key] = auction_list
+
+    def snapshot_state(self) -> Dict[str, Any]:
+        """ Get the balances, the domain operations and the open auctions.
+        """
+        state = super(DNSBlockChain, self).snapshot_state()
+        state['domains'] = dict(self.domains)
+        # List of (closing index, auctions), JSON keys are strings
+        state['auctions'] = list(self.auctions.items())
+        return state
+
+    def restore_state(self, state: Dict[str, Any]):
+        """ Restore the balances, the domain operations
+            and the open auctions.
+        """
+        super(DNSBlockChain, self).restore_state(state)
+        self.domains.update(state['domains'])
+        for key, auction_list in state['auctions']:
+            self.auctions[key] = [tuple(auction) for auction in auction_list]
+
+    def _index_domains(self, header: Header,
+                       transactions: List[DNS_Transaction]) -> List[str]:
+        """ Add the domain operations of a block.
+
+        Returns:
+            The domain names of the added operations (in order).
+        """
+        operations = []
+        cutoff = -math.inf
+        for transaction in reversed(transactions):
+            cutoff = max(cutoff, transaction.timestamp)
+            if transaction.data.domain_name:
+                operations.append((cutoff, transaction))
+        names = []
+        for cutoff, transaction in reversed(operations):
+            self.domains[transaction.data.domain_name].append(
+                (header.index, cutoff, transaction))
+            names.append(transaction.data.domain_name)
+        return names
+
+    def _register_auctions(self, header: Header,
+                           transactions: List[DNS_Transaction]
+                           ) -> List[Tuple[int, Optional[List[Any]]]]:
+        """ Update the auctions with a block.
+
+        The auctions ending with the block are closed,
+        auctions and bids of the block are added
+        (unless they are known from the transaction pool).
+
+        Returns:
+            The replaced auction lists as (key, list before the block).
+        """
+        changes: List[Tuple[int, Optional[List[Any]]]] = []
+
+        def change(key: int):
+            changes.append((key, list(self.auctions[key])
+                            if key in self.auctions else None))
+
+        if header.index in self.auctions:
+            change(header.index)
+            del self.auctions[header.index]
+
+        for transaction in transactions:
+            if transaction.recipient != '0':
+                continue
+            if transaction.data.type == 't':
+                if any(auction[0] == transaction
+                       for auction_list in self.auctions.values()
+                       for auction in auction_list):
+                    continue
+                # Pooled auctions are registered before the block
+                change(header.index - 1 + MAX_AUCTION_TIME)
+                self._auction(transaction, index=header.index - 1)
+            elif transaction.data.type == 'b':
+                for key, auction_list in self.auctions.items():
+                    for i, auction in enumerate(auction_list):
+                        if auction[0].data.domain_name == \
+                                transaction.data.domain_name and \
+                                transaction.amount > auction[1].amount:
+                            change(key)
+                            auction_list[i] = (auction[0], transaction)
+        return changes
 
     def check_auction(self, transaction: DNS_Transaction):
         if transaction.recipient == '0' and transaction.data.type == 't':
@@ -88,46 +211,44 @@ class DNSBlockChain(PoW_Blockchain):
                 return False
         if not normal_transaction:
             valid_domain_operation = self._is_valid_domain_transaction(
-                transaction, new_chain)
+                transaction)
             if not valid_domain_operation:
                 return False
 
         if not mining:
+            if transaction in self.transaction_pool:
+                return False
             found = False
-            for t in self.transaction_pool:
-                if t == transaction:
+            domain_transactions = [] if normal_transaction else \
+                self.transaction_pool.by_domain(transaction.data.domain_name)
+            for t in domain_transactions:
+                found = True
+                if transaction.data.type == 'r':
+                    return False
+                if transaction.data.type == 'u' and t.sender != transaction.sender:
                     return False
-                if normal_transaction:
-                    continue
-                if t.data.domain_name == transaction.data.domain_name:
-                    found = True
-                    if transaction.data.type == 'r':
-                        return False
-                    if transaction.data.type == 'u' and t.sender != transaction.sender:
-                        return False
             if not found and transaction.data.type == 'u' and not valid_domain_operation:
                 return False
 
-        try:
-            verify_key = nacl.signing.VerifyKey(
-                transaction.sender, encoder=nacl.encoding.HexEncoder)
-            transaction_hash = verify_key.verify(
-                transaction.signature).decode()
-            validate_hash = hashlib.sha256(
-                (str(transaction.sender) + str(transaction.recipient) +
-                 str(transaction.amount) + str(transaction.fee) +
-                 str(transaction.timestamp) + str(transaction.data)).encode()
-            ).hexdigest()
-
-            if validate_hash == transaction_hash:
-                print_debug_info('Signature OK')
-                return self.validate_balance(transaction)
-            print_debug_info('Wrong Hash')
-            return False
+        if self.verify_signature(transaction):
+            return self.validate_balance(transaction)
+        return False
 
-        except BadSignatureError:
-            print_debug_info('Bad Signature, Validation Failed')
-            return False
+    @staticmethod
+    def legacy_hash(transaction: DNS_Transaction) -> str:
+        """ Create the hash signed by legacy transactions.
+
+        Args:
+            transaction: Transaction of the hash.
+
+        Returns:
+            Hex digest signed by the sender.
+        """
+        return hashlib.sha256(
+            (str(transaction.sender) + str(transaction.recipient) +
+             str(transaction.amount) + str(transaction.fee) +
+             str(transaction.timestamp) + str(transaction.data)).encode()
+        ).hexdigest()
 
     def process_message(self, message: Tuple[str, Any, Address]):
         """ Create processor for incoming blockchain messages.
@@ -159,8 +280,8 @@ class DNSBlockChain(PoW_Blockchain):
         elif msg_type == 'owned_domains':
             if msg_address == 'gui':
                 domains = set()
-                for block_transaction in list(self.chain.values())[::-1]:
-                    for transaction in block_transaction[::-1]:
+                for operations in self.domains.values():
+                    for _, _, transaction in operations:
                         if transaction.data.type == 't' and transaction.recipient == msg_data:
                             domains.add(transaction.data.domain_name)
                         elif transaction.data.type == 'r' or transaction.data.type == 'u' \
@@ -171,42 +292,42 @@ class DNSBlockChain(PoW_Blockchain):
         else:
             super(DNSBlockChain, self).process_message(message)
 
-    def mine(self, msg_data: Any, msg_address: Address):
-        """ Mines a new block.
+    def create_template(self, miner_key: Any) -> Block:
+        """ Create a block without proof from the transaction pool.
+
+        Includes the resolutions of the auctions ending with the block.
+
             Args:
-                msg_data: key for the sender.
-                msg_address: -
+                miner_key: key for the sender.
         """
-        if msg_address != 'local':
-            return
-        proof = self.create_proof(msg_data)
-        block = self.create_block(proof)
-        fee_sum = 0
         # Resolve possible auctions:
-        try:
-            auction_list = self.auctions[block.header.index]
-            for auction in auction_list:
-                block.transactions.extend(self._resolve_auction(auction))
-            self.auctions.pop(block.header.index)
-        except KeyError:
-            pass
+        resolutions: List[DNS_Transaction] = []
+        for auction in self.auctions.get(len(self.chain), []):
+            resolutions.extend(self._resolve_auction(auction))
+        block = self.create_block(None, resolutions)
+        fee_sum = 0
         for transaction in block.transactions:
             fee_sum += transaction.fee
         reward_multiplier = math.floor(block.header.index / 10) - 1
         mining_reward = 50 >> 2 ** reward_multiplier \
             if reward_multiplier >= 0 else 50
         block.transactions.append(
-            DNS_Transaction(sender='0', recipient=msg_data,
+            DNS_Transaction(sender='0', recipient=miner_key,
                             amount=mining_reward + fee_sum, fee=0,
                             data=DNS_Data('', '', ''),
                             timestamp=time.time(), signature='0'))
 
-        self.new_block(self.prepare_new_block(block))
+        return self.prepare_new_block(block)
+
+    @staticmethod
+    def conflict_key(transaction: DNS_Transaction) -> Optional[str]:
+        """ Operations on the same domain have to be mined in order.
+        """
+        return transaction.data.domain_name or None
 
     def _resolve_domain_name(self,
                              name: str,
-                             timestamp: int,
-                             new_chain: bool = False) -> Tuple[Any, Any]:
+                             timestamp: int) -> Tuple[Any, Any]:
         """ Resolves a given domain name to its' corresponding ip_address as
             well as its' owner.
 
@@ -216,33 +337,26 @@ class DNSBlockChain(PoW_Blockchain):
             Args:
                 name: The domain_name
                 timestamp: Timestamp to stop at
-                new_chain: Validate transaction for new chain (default= False)
         """
-        if new_chain:
-            chain = list(self.new_chain.values())
-        else:
-            chain = list(self.chain.values())
-
-        for block_transaction in chain[::-1]:
-            for transaction in block_transaction[::-1]:
-                if transaction.timestamp > timestamp:
-                    break
-                if transaction.data.domain_name == name:
-                    if transaction.data.type == 't':
-                        return 'N/A', transaction.recipient
-                    return transaction.data.ip_address, transaction.sender
+        # Operations of the current chain (a new chain is validated
+        # after the state was rolled back to the common ancestor)
+        # (transactions after the timestamp end the search in their block)
+        for _, cutoff, transaction in self.domains.get(name, [])[::-1]:
+            if cutoff > timestamp:
+                continue
+            if transaction.data.type == 't':
+                return 'N/A', transaction.recipient
+            return transaction.data.ip_address, transaction.sender
 
         return '', ''
 
     def _is_valid_domain_transaction(self,
-                                     transaction: DNS_Transaction,
-                                     new_chain: bool) -> bool:
+                                     transaction: DNS_Transaction) -> bool:
         """ Checks if a transaction is valid to perform considering already
             registered domain names
 
             Args:
                 transaction: The transaction to be validated
-                new_chain: Validate transaction for new chain
         """
         if transaction.data.type == 'b':
             for auction_list in self.auctions.values():
@@ -258,8 +372,7 @@ class DNSBlockChain(PoW_Blockchain):
 
         ip, owner = self._resolve_domain_name(
             transaction.data.domain_name,
-            transaction.timestamp,
-            new_chain)
+            transaction.timestamp)
 
         if transaction.data.type == 'r' and ip:
             return False
@@ -268,19 +381,21 @@ class DNSBlockChain(PoW_Blockchain):
                 return False
         return True
 
-    def _auction(self, transaction: DNS_Transaction, index: int = 0):
+    def _auction(self, transaction: DNS_Transaction,
+                 index: Optional[int] = None):
         """ Places a transaction with recipient '0' and domain operation type 'transfer'
             into the auctions dict along with an initial 'bid', which returns the service fee
             as well as the domain back to the owner.
             Args:
                 transaction: The transaction initiating the auction
+                index: Index of the latest block (Default: latest header)
         """
         # If no one bids on the transaction, the owner of the domain gets the fee and domain back
         bid_transaction = DNS_Transaction(
             '0', transaction.sender, transaction.fee, 1, time.time(), DNS_Data('', '', ''), '1'
         )
         # auctions are closed after MAX_AUCTION_TIME blocks are mined
-        i = self.latest_header().index if index == 0 else index
+        i = self.latest_header().index if index is None else index
         try:
             self.auctions[i + MAX_AUCTION_TIME]
         except KeyError:
@@ -354,15 +469,3 @@ class DNSBlockChain(PoW_Blockchain):
                 '1'
             )
             self.new_transaction(t)
-
-    def _sync_auctions(self):
-        """Synchronizes the auctions dict after conflicts are resolved
-
-        """
-        for header, transaction_list in list(self.chain.items())[-MAX_AUCTION_TIME:]:
-            print(header.index, transaction_list)
-            for transaction in transaction_list:
-                if transaction.recipient == '0' and transaction.data.type == 't':
-                    self._auction(transaction, index=header.index)
-                if transaction.recipient == '0' and transaction.data.type == 'b':
-                    self._bid(transaction)
@@ -0,0 +1,172 @@
+""" Canonical binary encoding of the blockchain data.
+
+Transactions and headers are encoded into a versioned byte string,
+which is used to calculate their digests (e.g. the transaction id).
+Digests are calculated once per object and cached.
+
+Blocks with a version lower than BINARY_ENCODING_VERSION
+still use the legacy str()-based hashing.
+"""
+
+import hashlib
+import struct
+from typing import Any, Iterable, Tuple
+
+import nacl.signing
+
+# Version of the byte encoding (first byte of every encoding)
+ENCODING_VERSION = 1
+
+# First blockchain version that uses the byte encoding
+BINARY_ENCODING_VERSION = 0.8
+
+
+def _encode_length(length: int) -> bytes:
+    return struct.pack('>I', length)
+
+
+def encode_value(value: Any) -> bytes:
+    """ Encode a single value.
+
+    Every value is prefixed by a type tag, variable sized values
+    additionally by their length.
+
+    Args:
+        value: Value to encode.
+
+    Returns:
+        The encoded value.
+
+    Raises:
+        TypeError: If the type of the value can not be encoded.
+    """
+    if value is None:
+        return b'n'
+    if isinstance(value, bool):
+        return b'?' + (b'\x01' if value else b'\x00')
+    if isinstance(value, int):
+        raw = value.to_bytes((value.bit_length() + 8) // 8,
+                             'big', signed=True)
+        return b'i' + _encode_length(len(raw)) + raw
+    if isinstance(value, float):
+        return b'f' + struct.pack('>d', value)
+    if isinstance(value, str):
+        raw = value.encode('utf-8')
+        return b's' + _encode_length(len(raw)) + raw
+    if isinstance(value, bytes):
+        return b'b' + _encode_length(len(value)) + bytes(value)
+    if isinstance(value, tuple) and hasattr(value, '_fields'):
+        return b't' + encode_fields(type(value).__name__, value)
+    if isinstance(value, (tuple, list)):
+        return b'l' + _encode_length(len(value)) + \
+            b''.join(encode_value(v) for v in value)
+    raise TypeError(f'Can not encode value of type {type(value).__name__}')
+
+
+def encode_fields(name: str, values: Iterable[Any]) -> bytes:
+    """ Encode a named sequence of values.
+
+    Args:
+        name: Name of the type.
+        values: Values of the fields (in order).
+
+    Returns:
+        The encoded values.
+    """
+    values = list(values)
+    return encode_value(name) + _encode_length(len(values)) + \
+        b''.join(encode_value(v) for v in values)
+
+
+def sha256(data: bytes) -> bytes:
+    """ Create a sha256 digest of bytes.
+    """
+    return hashlib.sha256(data).digest()
+
+
+class Encodable(object):
+    """ Mixin for namedtuples with a canonical byte encoding.
+
+    The encoding and the digest are cached on the object.
+    """
+
+    def encoded(self) -> bytes:
+        """ Get the canonical byte encoding.
+        """
+        try:
+            return self.__dict__['_encoded']
+        except KeyError:
+            encoded = bytes([ENCODING_VERSION]) + \
+                encode_fields(type(self).__name__, self)
+            self.__dict__['_encoded'] = encoded
+            return encoded
+
+    @property
+    def digest(self) -> bytes:
+        """ sha256 digest of the encoding (the id of a transaction).
+        """
+        try:
+            return self.__dict__['_digest']
+        except KeyError:
+            digest = sha256(self.encoded())
+            self.__dict__['_digest'] = digest
+            return digest
+
+
+class SignedEncodable(Encodable):
+    """ Mixin for namedtuples with a signature field.
+
+    The signature signs the message digest,
+    which is the digest of all other fields.
+    """
+
+    @property
+    def message_digest(self) -> bytes:
+        """ sha256 digest of the encoding without the signature.
+        """
+        try:
+            return self.__dict__['_message_digest']
+        except KeyError:
+            values = [v for f, v in zip(self._fields, self)
+                      if f != 'signature']
+            digest = sha256(bytes([ENCODING_VERSION]) +
+                            encode_fields(type(self).__name__, values))
+            self.__dict__['_message_digest'] = digest
+            return digest
+
+    def signing_message(self) -> bytes:
+        """ Get the message that is signed by the sender.
+        """
+        return bytes([ENCODING_VERSION]) + self.message_digest
+
+
+def is_binary_message(message: bytes) -> bool:
+    """ Check whether a signed message uses the byte encoding.
+
+    Legacy messages are hex digests (64 bytes).
+
+    Args:
+        message: The verified message of a signature.
+    """
+    return len(message) == 33 and message[0] == ENCODING_VERSION
+
+
+def sign_transaction(transaction: Tuple,
+                     signing_key: nacl.signing.SigningKey) -> Tuple:
+    """ Sign a transaction.
+
+    Args:
+        transaction: Transaction with an empty signature.
+        signing_key: Key of the sender.
+
+    Returns:
+        The signed transaction.
+    """
+    return transaction._replace(
+        signature=signing_key.sign(transaction.signing_message()))
+
+
+def uses_binary_encoding(version: float) -> bool:
+    """ Check whether blocks of a version use the byte encoding.
+    """
+    return version >= BINARY_ENCODING_VERSION
@@ -0,0 +1,81 @@
+""" Paginated header synchronization with block locators.
+
+A node that is behind sends a locator, a sparse list of the hashes
+of its headers (dense near the tip, exponentially spaced towards
+the genesis block, which is always included).
+The peer answers with the headers after the latest header it shares
+with the locator, at most one page at a time.
+The node continues with the last received header as locator
+until a page is not full (the tip of the peer is reached).
+Headers are identified by their root hash, which is the hash
+referenced by the previous_hash of the next header.
+"""
+
+from collections import deque
+from typing import Any, Iterable, List, Reversible
+
+# Number of headers requested per page
+HEADERS_PAGE_SIZE = 100
+
+# Maximum number of headers sent per page
+MAX_HEADERS_PAGE_SIZE = 500
+
+# Number of latest headers included in every locator
+DENSE_LOCATOR_HEADERS = 10
+
+
+def header_locator(headers: Reversible[Any]) -> List[Any]:
+    """ Create the locator of a chain.
+
+    Args:
+        headers: Headers of the chain (in order).
+
+    Returns:
+        Hashes of the tip, the 10 headers before it, then every 2nd,
+        4th, 8th... header and the genesis block.
+    """
+    locator = []
+    step = 1
+    next_offset = 0
+    header = None
+    for offset, header in enumerate(reversed(headers)):
+        if offset == next_offset:
+            locator.append(header.root_hash)
+            if len(locator) >= DENSE_LOCATOR_HEADERS:
+                step *= 2
+            next_offset += step
+    if header is not None and next_offset - step != offset:
+        # Genesis block
+        locator.append(header.root_hash)
+    return locator
+
+
+def headers_after(headers: Reversible[Any],
+                  locator: Iterable[Any],
+                  limit: int) -> List[Any]:
+    """ Get a page of headers after the latest header of a locator.
+
+    Args:
+        headers: Headers of the chain (in order).
+        locator: Hashes of the headers known by the requester.
+        limit: Maximum number of returned headers.
+
+    Returns:
+        Headers after the latest known header (in order),
+        from the genesis block if no header is known.
+    """
+    known = set(locator)
+    limit = max(0, min(limit, MAX_HEADERS_PAGE_SIZE))
+    # Latest headers after the known header
+    page: deque = deque(maxlen=limit)
+    for header in reversed(headers):
+        if header.root_hash in known:
+            return list(reversed(page))
+        if limit:
+            page.append(header)
+    page.clear()
+    for header in headers:
+        if len(page) >= limit:
+            break
+        page.append(header)
+    return list(page)
@@ -0,0 +1,136 @@
+""" Chain backed by the block store.
+
+Only the headers of the chain are kept in memory,
+the transactions of a block are read from the store when accessed.
+Recently used blocks are kept in an LRU cache.
+The chain behaves like the OrderedDict (header -> transactions)
+used without block store.
+A pruned chain only holds the transactions of the latest blocks.
+"""
+
+from collections import OrderedDict
+from collections.abc import MutableMapping
+from typing import Any, Dict, Iterator, List
+
+from utils import print_debug_info
+
+from .block_store import BlockStore
+
+# Number of decoded blocks kept in memory
+BLOCK_CACHE_SIZE = 256
+
+# Minimum number of blocks whose transactions are held by a pruned chain
+MIN_PRUNE_DEPTH = 10
+
+# Number of blocks between two prunings
+PRUNE_INTERVAL = 100
+
+
+class LazyChain(MutableMapping):
+    """ Mapping of headers to transactions read on demand.
+
+    Added blocks are appended to the store.
+
+    Args:
+        store: The block store containing the chain.
+        cache_size: Number of decoded blocks kept in memory.
+    """
+
+    def __init__(self,
+                 store: BlockStore,
+                 cache_size: int = BLOCK_CACHE_SIZE) -> None:
+        self.store = store
+        self.cache_size = cache_size
+        self._headers: List[Any] = store.headers()
+        self._heights: Dict[Any, int] = dict(
+            (header, height) for height, header in enumerate(self._headers))
+        self._blocks: OrderedDict = OrderedDict()
+        # Height of the first block whose transactions are held
+        self.pruned_height = store.pruned
+
+    def __len__(self) -> int:
+        return len(self._headers)
+
+    def __iter__(self) -> Iterator[Any]:
+        return iter(self._headers)
+
+    def __reversed__(self) -> Iterator[Any]:
+        return reversed(self._headers)
+
+    def __contains__(self, header: Any) -> bool:
+        return header in self._heights
+
+    def __getitem__(self, header: Any) -> List[Any]:
+        height = self._heights[header]
+        if height < self.pruned_height:
+            raise KeyError(header)
+        if header in self._blocks:
+            self._blocks.move_to_end(header)
+            return self._blocks[header]
+        block = self.store.read(height)
+        if block is None:
+            print_debug_info(f'Corrupted block {height} in store')
+            raise KeyError(header)
+        self._cache(header, block[1])
+        return block[1]
+
+    def __setitem__(self, header: Any, transactions: List[Any]):
+        if header in self._heights:
+            # Replace the block, keep the order of the chain
+            height = self._heights[header]
+            later = [(h, self[h]) for h in self._headers[height + 1:]]
+            self.truncate(height)
+            self[header] = transactions
+            for h, t in later:
+                self[h] = t
+            return
+        self.store.append(header, transactions)
+        self._heights[header] = len(self._headers)
+        self._headers.append(header)
+        self._cache(header, transactions)
+
+    def __delitem__(self, header: Any):
+        height = self._heights[header]
+        later = [(h, self[h]) for h in self._headers[height + 1:]]
+        self.truncate(height)
+        for h, t in later:
+            self[h] = t
+
+    def holds(self, header: Any) -> bool:
+        """ Check whether the transactions of a block are held.
+        """
+        height = self._heights.get(header)
+        return height is not None and height >= self.pruned_height
+
+    def prune(self, height: int):
+        """ Drop the transactions of the blocks before a height.
+
+        Args:
+            height: Height of the first block to hold.
+        """
+        if height <= self.pruned_height:
+            return
+        for header in self._headers[self.pruned_height:height]:
+            self._blocks.pop(header, None)
+        self.pruned_height = height
+        self.store.prune(height)
+
+    def truncate(self, height: int):
+        """ Remove the blocks starting at a height.
+
+        Args:
+            height: Number of blocks to keep.
+        """
+        self.store.truncate(height)
+        for header in self._headers[height:]:
+            del self._heights[header]
+            self._blocks.pop(header, None)
+        del self._headers[height:]
+
+    def _cache(self, header: Any, transactions: List[Any]):
+        """ Keep a decoded block in memory.
+        """
+        self._blocks[header] = transactions
+        self._blocks.move_to_end(header)
+        while len(self._blocks) > self.cache_size:
+            self._blocks.popitem(last=False)
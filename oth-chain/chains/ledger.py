@@ -0,0 +1,153 @@
+""" Balance ledger for the coin-based blockchains.
+
+Keeps the balance of every account up to date while blocks are
+appended to (or removed from) the chain, so that balance checks
+do not have to walk the whole chain.
+"""
+
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List
+
+
+class Ledger(object):
+    """ Per-key balance map of a blockchain.
+
+    Confirmed balances are derived from the blocks of the chain,
+    the pending overlay is derived from the transaction pool.
+    The pending changes are summed up per key, so balances after
+    all pending transactions are looked up in constant time.
+    Transactions need the fields sender, recipient, amount, fee
+    and timestamp.
+    """
+
+    def __init__(self) -> None:
+        self.balances: Dict[Any, int] = defaultdict(int)
+        self.pending: Dict[Any, Dict[Any, int]] = defaultdict(dict)
+        # Sum of the pending changes and latest pending timestamp per key
+        self.pending_deltas: Dict[Any, int] = defaultdict(int)
+        self.pending_timestamps: Dict[Any, float] = {}
+
+    def balance(self, key: Any, timestamp: float) -> int:
+        """ Get the balance of a key.
+
+        Args:
+            key: Key that identifies the user.
+            timestamp: Only pending transactions before the timestamp
+                are taken into account.
+
+        Returns:
+            The balance of the user at the given timestamp.
+        """
+        balance = self.balances.get(key, 0) + self.pending_deltas.get(key, 0)
+        latest = self.pending_timestamps.get(key)
+        if latest is not None and latest >= timestamp:
+            # Remove the pending transactions after the timestamp
+            for transaction, delta in self.pending[key].items():
+                if transaction.timestamp >= timestamp:
+                    balance -= delta
+        return balance
+
+    def apply_transactions(self,
+                           transactions: Iterable[Any]) -> Dict[Any, int]:
+        """ Apply the transactions of a block appended to the chain.
+
+        Args:
+            transactions: Transactions of the block.
+
+        Returns:
+            The balance changes of the block (key -> delta).
+        """
+        deltas: Dict[Any, int] = defaultdict(int)
+        for transaction in transactions:
+            deltas[transaction.sender] -= transaction.amount + transaction.fee
+            deltas[transaction.recipient] += transaction.amount
+        for key, delta in deltas.items():
+            self.balances[key] += delta
+        return dict(deltas)
+
+    def revert_deltas(self, deltas: Dict[Any, int]):
+        """ Revert the balance changes of a block removed from the chain.
+
+        Args:
+            deltas: The changes returned by apply_transactions.
+        """
+        for key, delta in deltas.items():
+            self.balances[key] -= delta
+
+    def revert_transactions(self, transactions: Iterable[Any]):
+        """ Revert the transactions of a block removed from the chain.
+
+        Args:
+            transactions: Transactions of the block.
+        """
+        for transaction in transactions:
+            self.balances[transaction.sender] += \
+                transaction.amount + transaction.fee
+            self.balances[transaction.recipient] -= transaction.amount
+
+    def rebuild(self, blocks: Iterable[List[Any]]):
+        """ Rebuild the confirmed balances from scratch.
+
+        Args:
+            blocks: Transaction lists of all blocks of the chain.
+        """
+        self.balances.clear()
+        for transactions in blocks:
+            self.apply_transactions(transactions)
+
+    def add_pending(self, transaction: Any):
+        """ Add a transaction of the transaction pool to the overlay.
+
+        Args:
+            transaction: Transaction added to the pool.
+        """
+        self._set_pending(transaction.sender, transaction,
+                          - (transaction.amount + transaction.fee))
+        recipient = self.pending[transaction.recipient]
+        self._set_pending(transaction.recipient, transaction,
+                          recipient.get(transaction, 0) + transaction.amount)
+
+    def remove_pending(self, transaction: Any):
+        """ Remove a transaction of the transaction pool from the overlay.
+
+        Args:
+            transaction: Transaction removed from the pool.
+        """
+        for key in (transaction.sender, transaction.recipient):
+            key_pending = self.pending.get(key)
+            if key_pending is None:
+                continue
+            delta = key_pending.pop(transaction, None)
+            if delta is not None:
+                self.pending_deltas[key] -= delta
+            if not key_pending:
+                del self.pending[key]
+                self.pending_deltas.pop(key, None)
+                self.pending_timestamps.pop(key, None)
+
+    def reset_pending(self, transactions: Iterable[Any]):
+        """ Replace the overlay with the given transaction pool.
+
+        Args:
+            transactions: Transactions of the pool.
+        """
+        self.pending.clear()
+        self.pending_deltas.clear()
+        self.pending_timestamps.clear()
+        for transaction in transactions:
+            self.add_pending(transaction)
+
+    def _set_pending(self, key: Any, transaction: Any, delta: int):
+        """ Set the pending change of a key by a transaction.
+
+        Args:
+            key: Key that identifies the user.
+            transaction: Transaction of the pool.
+            delta: Change of the balance of the key.
+        """
+        key_pending = self.pending[key]
+        self.pending_deltas[key] += delta - key_pending.get(transaction, 0)
+        key_pending[transaction] = delta
+        latest = self.pending_timestamps.get(key)
+        if latest is None or transaction.timestamp > latest:
+            self.pending_timestamps[key] = transaction.timestamp
@@ -0,0 +1,221 @@
+""" Transaction pool of the blockchains.
+
+Replaces the plain list of pending transactions with indexed lookups,
+so that adding, finding and removing a transaction does not require
+a linear search through the pool.
+"""
+
+from bisect import bisect_left, insort
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+# Eviction policies used when the pool is full
+EVICT_LOWEST_FEE = 'lowest_fee'
+EVICT_OLDEST = 'oldest'
+REJECT_NEW = 'reject'
+
+MAX_POOL_SIZE = 10000
+
+
+class Mempool(object):
+    """ Indexed pool of pending transactions.
+
+    Iterates over the transactions in the order they were added.
+    Transactions are identified by their transaction id (digest),
+    indexed by sender, by domain (DNS transactions)
+    and by data (DNS/DDoS transactions), and ordered by fee.
+
+    Args:
+        max_size: Maximum number of transactions in the pool.
+        eviction: Policy used when the pool is full
+            (EVICT_LOWEST_FEE, EVICT_OLDEST or REJECT_NEW).
+    """
+
+    def __init__(self,
+                 max_size: int = MAX_POOL_SIZE,
+                 eviction: str = EVICT_LOWEST_FEE) -> None:
+        if eviction not in (EVICT_LOWEST_FEE, EVICT_OLDEST, REJECT_NEW):
+            raise ValueError(f'Unknown eviction policy: {eviction}')
+        self.max_size = max_size
+        self.eviction = eviction
+        self._transactions: Dict[bytes, Any] = OrderedDict()
+        self._sequence: Dict[bytes, int] = {}
+        self._senders: Dict[Any, Dict[bytes, None]] = {}
+        self._domains: Dict[str, Dict[bytes, None]] = {}
+        self._data: Dict[Any, Dict[bytes, None]] = {}
+        self._fee_order: List[Tuple[int, int, bytes]] = []
+        self._counter = 0
+
+    def __contains__(self, transaction: Any) -> bool:
+        return transaction.digest in self._transactions
+
+    def __iter__(self) -> Iterator[Any]:
+        return iter(list(self._transactions.values()))
+
+    def __len__(self) -> int:
+        return len(self._transactions)
+
+    def __repr__(self) -> str:
+        return repr(list(self._transactions.values()))
+
+    def get(self, transaction_id: bytes) -> Optional[Any]:
+        """ Get a transaction by its id.
+
+        Args:
+            transaction_id: Digest of the transaction.
+
+        Returns:
+            The transaction, None if it is not in the pool.
+        """
+        return self._transactions.get(transaction_id)
+
+    def add(self, transaction: Any) -> List[Any]:
+        """ Add a transaction to the pool.
+
+        If the pool is full, transactions are evicted depending on
+        the eviction policy. This can be the new transaction itself.
+
+        Args:
+            transaction: Transaction that should be added.
+
+        Returns:
+            The evicted transactions.
+        """
+        transaction_id = transaction.digest
+        if transaction_id in self._transactions:
+            return []
+
+        evicted: List[Any] = []
+        if len(self._transactions) >= self.max_size:
+            if self.eviction == REJECT_NEW:
+                return [transaction]
+            if self.eviction == EVICT_OLDEST:
+                victim = next(iter(self._transactions.values()))
+            else:
+                victim = self._transactions[self._fee_order[-1][2]]
+                if self.fee(victim) >= self.fee(transaction):
+                    return [transaction]
+            self.remove(victim)
+            evicted.append(victim)
+
+        self._counter += 1
+        self._transactions[transaction_id] = transaction
+        self._sequence[transaction_id] = self._counter
+        self._index(self._senders, transaction.sender, transaction_id)
+        data = getattr(transaction, 'data', None)
+        if data is not None:
+            self._index(self._data, data, transaction_id)
+            domain_name = getattr(data, 'domain_name', None)
+            if domain_name is not None:
+                self._index(self._domains, domain_name, transaction_id)
+        insort(self._fee_order,
+               (-self.fee(transaction), self._counter, transaction_id))
+        return evicted
+
+    def remove(self, transaction: Any):
+        """ Remove a transaction from the pool.
+
+        Args:
+            transaction: Transaction that should be removed.
+
+        Raises:
+            KeyError: If the transaction is not in the pool.
+        """
+        transaction_id = transaction.digest
+        del self._transactions[transaction_id]
+        counter = self._sequence.pop(transaction_id)
+        self._unindex(self._senders, transaction.sender, transaction_id)
+        data = getattr(transaction, 'data', None)
+        if data is not None:
+            self._unindex(self._data, data, transaction_id)
+            domain_name = getattr(data, 'domain_name', None)
+            if domain_name is not None:
+                self._unindex(self._domains, domain_name, transaction_id)
+        position = bisect_left(self._fee_order,
+                               (-self.fee(transaction), counter))
+        del self._fee_order[position]
+
+    def discard(self, transaction: Any):
+        """ Remove a transaction from the pool if it is present.
+
+        Args:
+            transaction: Transaction that should be removed.
+        """
+        if transaction.digest in self._transactions:
+            self.remove(transaction)
+
+    def clear(self):
+        """ Remove all transactions from the pool.
+        """
+        self._transactions.clear()
+        self._sequence.clear()
+        self._senders.clear()
+        self._domains.clear()
+        self._data.clear()
+        self._fee_order.clear()
+
+    def reset(self, transactions: List[Any]) -> List[Any]:
+        """ Replace the content of the pool.
+
+        Args:
+            transactions: The new transactions (in order).
+
+        Returns:
+            The evicted transactions.
+        """
+        self.clear()
+        evicted: List[Any] = []
+        for transaction in transactions:
+            evicted += self.add(transaction)
+        return evicted
+
+    def by_sender(self, sender: Any) -> List[Any]:
+        """ Get the pending transactions of a sender (in order).
+        """
+        return self._lookup(self._senders.get(sender, ()))
+
+    def by_domain(self, domain_name: str) -> List[Any]:
+        """ Get the pending DNS transactions for a domain (in order).
+        """
+        return self._lookup(self._domains.get(domain_name, ()))
+
+    def by_data(self, data: Any) -> List[Any]:
+        """ Get the pending transactions with the given data (in order).
+        """
+        return self._lookup(self._data.get(data, ()))
+
+    def by_fee(self) -> List[Any]:
+        """ Get the pending transactions ordered by fee.
+
+        Transactions with the highest fee come first,
+        transactions with the same fee are ordered by age.
+        """
+        return self._lookup(entry[2] for entry in self._fee_order)
+
+    @staticmethod
+    def fee(transaction: Any) -> int:
+        """ Get the fee of a transaction (0 if it has no fee).
+        """
+        return getattr(transaction, 'fee', 0)
+
+    def _lookup(self, transaction_ids: Iterable[bytes]) -> List[Any]:
+        """ Get the transactions of the ids.
+        """
+        return [self._transactions[t_id] for t_id in transaction_ids]
+
+    @staticmethod
+    def _index(index: Dict[Any, Dict[bytes, None]],
+               key: Any, transaction_id: bytes):
+        """ Add a transaction to an index.
+        """
+        index.setdefault(key, OrderedDict())[transaction_id] = None
+
+    @staticmethod
+    def _unindex(index: Dict[Any, Dict[bytes, None]],
+                 key: Any, transaction_id: bytes):
+        """ Remove a transaction from an index.
+        """
+        entries = index[key]
+        del entries[transaction_id]
+        if not entries:
+            del index[key]
@@ -0,0 +1,207 @@
+""" Merkle trees of the transactions of a block.
+
+Trees are built over the transactions sorted by their timestamp
+and padded to a perfect binary tree by repeating the last leaf.
+
+Binary trees hash the raw transaction digests,
+legacy trees hash str(transaction) and concatenated hex digests
+(compatible to the roots of blocks before BINARY_ENCODING_VERSION).
+"""
+
+import hashlib
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from .encoding import sha256, uses_binary_encoding
+
+MAX_CACHED_TREES = 1024
+
+
+class MerkleTree(object):
+    """ Incremental Merkle tree.
+
+    Only the nodes of complete subtrees are stored, the nodes on the
+    right edge (which depend on the padding) are calculated for the root.
+    Updating the tree with a list of transactions keeps the common
+    prefix of the leaves and only hashes the new part.
+
+    Args:
+        binary: Use the binary (True) or the legacy (False) hashing.
+    """
+
+    def __init__(self, binary: bool = True) -> None:
+        self.binary = binary
+        self.transactions: List[Any] = []
+        self._levels: List[List[Any]] = [[]]
+        self._root: Optional[str] = None
+
+    def update(self, transactions: List[Any]) -> str:
+        """ Update the tree to contain the given transactions.
+
+        Args:
+            transactions: Transactions of the tree (in any order).
+
+        Returns:
+            The Merkle root.
+        """
+        ordered = sorted(transactions, key=lambda t: t.timestamp)
+
+        common = 0
+        for old, new in zip(self.transactions, ordered):
+            if old is not new and old != new:
+                break
+            common += 1
+
+        if common != len(self.transactions):
+            self._truncate(common)
+        for transaction in ordered[common:]:
+            self._append(transaction)
+        return self.root
+
+    def matches(self, transactions: List[Any]) -> bool:
+        """ Check if the tree was built from the given transactions.
+        """
+        return len(transactions) == len(self.transactions) and \
+            sorted(transactions, key=lambda t: t.timestamp) == \
+            self.transactions
+
+    def copy(self) -> 'MerkleTree':
+        """ Create a copy of the tree (without rehashing).
+        """
+        tree = MerkleTree(self.binary)
+        tree.transactions = list(self.transactions)
+        tree._levels = [list(level) for level in self._levels]
+        tree._root = self._root
+        return tree
+
+    @property
+    def root(self) -> str:
+        """ Hex digest of the Merkle root.
+        """
+        if self._root is None:
+            self._root = self._calculate_root()
+        return self._root
+
+    def _leaf(self, transaction: Any) -> Any:
+        if self.binary:
+            return transaction.digest
+        return hashlib.sha256(str(transaction).encode()).hexdigest()
+
+    def _combine(self, left: Any, right: Any) -> Any:
+        if self.binary:
+            return sha256(left + right)
+        return hashlib.sha256((left + right).encode()).hexdigest()
+
+    def _append(self, transaction: Any):
+        """ Append a leaf and complete the subtrees it finishes.
+        """
+        self.transactions.append(transaction)
+        self._levels[0].append(self._leaf(transaction))
+        level = 0
+        while len(self._levels[level]) % 2 == 0:
+            if len(self._levels) == level + 1:
+                self._levels.append([])
+            nodes = self._levels[level]
+            self._levels[level + 1].append(
+                self._combine(nodes[-2], nodes[-1]))
+            level += 1
+        self._root = None
+
+    def _truncate(self, length: int):
+        """ Keep only the first leaves of the tree.
+        """
+        del self.transactions[length:]
+        for level, nodes in enumerate(self._levels):
+            del nodes[length >> level:]
+        self._root = None
+
+    def _calculate_root(self) -> str:
+        """ Calculate the root from the stored nodes and the padding.
+        """
+        length = len(self._levels[0])
+        if length == 0:
+            if self.binary:
+                return sha256(b'').hex()
+            return hashlib.sha256(str([]).encode()).hexdigest()
+
+        depth = 0
+        while (1 << depth) < length:
+            depth += 1
+
+        # Nodes consisting only of padding
+        padding = [self._levels[0][-1]]
+        for _ in range(depth):
+            padding.append(self._combine(padding[-1], padding[-1]))
+
+        def node(level: int, index: int) -> Any:
+            start = index << level
+            if start + (1 << level) <= length:
+                return self._levels[level][index]
+            if start >= length:
+                return padding[level]
+            return self._combine(node(level - 1, 2 * index),
+                                 node(level - 1, 2 * index + 1))
+
+        root = node(depth, 0)
+        return root.hex() if self.binary else root
+
+
+def merkle_root(transactions: List[Any], version: float = 0) -> str:
+    """ Calculate the Merkle root of the transactions.
+
+    Args:
+        transactions: List of transactions.
+        version: Version of the block (default: 0 => legacy hashing)
+
+    Returns:
+        Hex digest of the Merkle root.
+    """
+    return MerkleTree(uses_binary_encoding(version)).update(transactions)
+
+
+class MerkleCache(object):
+    """ LRU cache of the Merkle trees of known blocks.
+
+    Args:
+        max_size: Maximum number of cached trees.
+    """
+
+    def __init__(self, max_size: int = MAX_CACHED_TREES) -> None:
+        self.max_size = max_size
+        self._trees: Dict[Any, MerkleTree] = OrderedDict()
+
+    def root(self, header: Any, transactions: List[Any]) -> str:
+        """ Get the Merkle root of the transactions of a block.
+
+        The tree is only built if the block is not known yet.
+
+        Args:
+            header: Header of the block.
+            transactions: Transactions of the block.
+
+        Returns:
+            Hex digest of the Merkle root.
+        """
+        tree = self._trees.get(header)
+        if tree is not None and tree.matches(transactions):
+            self._trees.move_to_end(header)
+            return tree.root
+        tree = MerkleTree(uses_binary_encoding(header.version))
+        tree.update(transactions)
+        self.store(header, tree)
+        return tree.root
+
+    def store(self, header: Any, tree: MerkleTree):
+        """ Store the tree of a block.
+
+        Args:
+            header: Header of the block.
+            tree: Merkle tree of the transactions of the block.
+        """
+        self._trees[header] = tree
+        self._trees.move_to_end(header)
+        while len(self._trees) > self.max_size:
+            self._trees.popitem(last=False)
+
+    def __contains__(self, header: Any) -> bool:
+        return header in self._trees
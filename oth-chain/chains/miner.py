@@ -0,0 +1,239 @@
+""" Proof-of-work mining engine.
+
+A proof is valid if the hash of last_proof, proof and miner_key
+(see PoW_Blockchain.validate_proof) has (difficulty) leading hex zeros,
+which is the case if the digest is lower than 16 ** (64 - difficulty).
+
+The nonce space is split across worker processes.
+Every worker feeds the constant prefix into a sha256 state once
+and copies it for each nonce, the digests are compared as bytes.
+"""
+
+import hashlib
+import threading
+import time
+from multiprocessing import get_context
+from queue import Empty
+from typing import Callable, List, Optional, Tuple
+
+# Number of hashes between two checks for cancellation
+CHECK_INTERVAL = 4096
+
+# Job id of the workers if no job is running
+NO_JOB = 0
+
+# Seconds between two checks for cancellation while waiting for workers
+POLL_INTERVAL = 0.1
+
+
+def proof_target(difficulty: int) -> bytes:
+    """ Get the (exclusive) upper bound of digests for a difficulty.
+
+    Args:
+        difficulty: Number of leading hex zeros.
+
+    Returns:
+        The target as big-endian sha256 digest.
+    """
+    if difficulty <= 0:
+        # Greater than every digest
+        return b'\xff' * 33
+    return (1 << (256 - 4 * difficulty)).to_bytes(32, 'big')
+
+
+def proof_message(last_proof: int, miner_key: bytes) -> Tuple[bytes, bytes]:
+    """ Get the bytes hashed before and after the proof.
+
+    validate_proof hashes str() of the encoded f-string,
+    the proof (only digits) is never escaped.
+
+    Args:
+        last_proof: Proof of the last block.
+        miner_key: The (public) key of the miner.
+
+    Returns:
+        Tuple of (prefix, suffix)
+    """
+    message = str(f'{last_proof}\x00{miner_key}'.encode())
+    prefix, suffix = message.split('\\x00', 1)
+    return prefix.encode(), suffix.encode()
+
+
+def search_proof(prefix: bytes,
+                 suffix: bytes,
+                 target: bytes,
+                 start: int,
+                 step: int,
+                 stopped: Callable[[], bool]) -> Tuple[Optional[int], int]:
+    """ Search a proof in the nonces start, start + step, ...
+
+    Args:
+        prefix: Bytes hashed before the nonce.
+        suffix: Bytes hashed after the nonce.
+        target: Digests have to be lower than the target.
+        start: First nonce.
+        step: Distance between two nonces.
+        stopped: Returns True if the search should be cancelled.
+
+    Returns:
+        Tuple of (found proof or None if stopped, number of hashes)
+    """
+    prefix_state = hashlib.sha256(prefix)
+    nonce = start
+    hashes = 0
+    while True:
+        for _ in range(CHECK_INTERVAL):
+            state = prefix_state.copy()
+            state.update(b'%d' % nonce + suffix)
+            if state.digest() < target:
+                return nonce, hashes + 1
+            nonce += step
+            hashes += 1
+        if stopped():
+            return None, hashes
+
+
+def _worker(tasks, results, current_job):
+    """ Worker process searching proofs for the tasks of the miner.
+    """
+    while True:
+        task = tasks.get()
+        if task is None:
+            return
+        job, prefix, suffix, target, start, step = task
+        proof, hashes = search_proof(
+            prefix, suffix, target, start, step,
+            lambda: current_job.value != job)
+        results.put((job, proof, hashes))
+
+
+class Miner(object):
+    """ Proof-of-work miner using multiple processes.
+
+    Args:
+        threads: Number of mining processes
+            (1 => mine in the calling thread).
+    """
+
+    def __init__(self, threads: int = 1) -> None:
+        self.threads = max(threads, 1)
+        self.hashes_per_second = 0.0
+        self._job = NO_JOB
+        self._cancelled = False
+        self._lock = threading.Lock()
+        self._context = get_context('spawn')
+        self._current_job = None
+        self._workers: List = []
+
+    def search(self,
+               last_proof: int,
+               miner_key: bytes,
+               difficulty: int,
+               stopped: Optional[Callable[[], bool]] = None
+               ) -> Optional[int]:
+        """ Search a proof for a block.
+
+        Args:
+            last_proof: Proof of the last block.
+            miner_key: The (public) key of the miner.
+            difficulty: Number of leading hex zeros of the hash.
+            stopped: Returns True if the search should be cancelled
+                (in addition to cancel()).
+
+        Returns:
+            The proof, None if the search was cancelled.
+        """
+        prefix, suffix = proof_message(last_proof, miner_key)
+        target = proof_target(difficulty)
+        self._cancelled = False
+
+        def cancelled() -> bool:
+            return self._cancelled or (stopped is not None and stopped())
+
+        start_time = time.perf_counter()
+        if self.threads == 1:
+            proof, hashes = search_proof(prefix, suffix, target, 0, 1,
+                                         cancelled)
+        else:
+            proof, hashes = self._search_parallel(prefix, suffix, target,
+                                                  cancelled)
+        elapsed = time.perf_counter() - start_time
+        if elapsed > 0:
+            self.hashes_per_second = hashes / elapsed
+        return proof
+
+    def cancel(self):
+        """ Cancel the running search (can be called from any thread).
+        """
+        self._cancelled = True
+        with self._lock:
+            if self._current_job is not None:
+                self._current_job.value = NO_JOB
+
+    def shutdown(self):
+        """ Stop the mining processes.
+        """
+        self.cancel()
+        for _ in self._workers:
+            self._tasks.put(None)
+        for worker in self._workers:
+            worker.join()
+        self._workers.clear()
+
+    def _search_parallel(self, prefix: bytes, suffix: bytes, target: bytes,
+                         cancelled: Callable[[], bool]
+                         ) -> Tuple[Optional[int], int]:
+        """ Split the nonce space across the mining processes.
+        """
+        self._start_workers()
+        with self._lock:
+            self._job += 1
+            job = self._job
+            if cancelled():
+                return None, 0
+            self._current_job.value = job
+        for start in range(self.threads):
+            self._tasks.put((job, prefix, suffix, target,
+                             start, self.threads))
+
+        proof = None
+        hashes = 0
+        remaining = self.threads
+        while remaining:
+            try:
+                result_job, result, result_hashes = self._results.get(
+                    timeout=POLL_INTERVAL)
+            except Empty:
+                if cancelled():
+                    self._stop_workers()
+                continue
+            if result_job != job:
+                continue
+            remaining -= 1
+            hashes += result_hashes
+            if result is not None and proof is None:
+                proof = result
+                self._stop_workers()
+        return proof, hashes
+
+    def _stop_workers(self):
+        """ Stop the search of the mining processes.
+        """
+        with self._lock:
+            self._current_job.value = NO_JOB
+
+    def _start_workers(self):
+        """ Start the mining processes (on first use).
+        """
+        if self._workers:
+            return
+        self._tasks = self._context.Queue()
+        self._results = self._context.Queue()
+        self._current_job = self._context.Value('i', NO_JOB, lock=False)
+        for _ in range(self.threads):
+            worker = self._context.Process(
+                target=_worker,
+                args=(self._tasks, self._results, self._current_job),
+                daemon=True)
+            worker.start()
+            self._workers.append(worker)
@@ -0,0 +1,100 @@
+""" Background mining of a block.
+
+The blockchain thread hands a block template (a block without proof)
+to the job, the proof is searched in a separate thread.
+The template can be refreshed while mining (e.g. for new transactions),
+as the proof only depends on the last block and the miner key.
+Found proofs are handed back with the latest template,
+which is then submitted by the blockchain thread.
+"""
+
+import threading
+from typing import Any, Callable, Optional
+
+from .blockchain import Block
+from .miner import Miner
+
+
+class MiningJob(object):
+    """ Interruptible mining job running in its own thread.
+
+    Args:
+        miner: Miner used to search the proofs.
+        submit: Called (in the mining thread) with the template
+            and the found proof.
+    """
+
+    def __init__(self,
+                 miner: Miner,
+                 submit: Callable[[Block, int], None]) -> None:
+        self.miner = miner
+        self.submit = submit
+        self.miner_key: Any = None
+        self._template: Optional[Block] = None
+        self._generation = 0
+        self._active = False
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        """ Whether a proof is being searched.
+        """
+        return self._active
+
+    def start(self, template: Block, last_proof: int,
+              difficulty: int, miner_key: Any):
+        """ Start mining a block (cancels a running search).
+
+        Args:
+            template: Block without proof.
+            last_proof: Proof of the last block.
+            difficulty: Difficulty of the block.
+            miner_key: The (public) key of the miner.
+        """
+        self.cancel()
+        with self._lock:
+            self._generation += 1
+            self._template = template
+            self.miner_key = miner_key
+            self._active = True
+            self._thread = threading.Thread(
+                target=self._run,
+                args=(self._generation, last_proof, difficulty, miner_key),
+                daemon=True)
+            self._thread.start()
+
+    def update(self, template: Block):
+        """ Replace the template of the running search.
+
+        Args:
+            template: The refreshed block template.
+        """
+        with self._lock:
+            if self._active:
+                self._template = template
+
+    def cancel(self):
+        """ Cancel the running search.
+        """
+        with self._lock:
+            self._generation += 1
+            self._active = False
+            thread = self._thread
+            self._thread = None
+        if thread is not None:
+            thread.join()
+
+    def _run(self, generation: int, last_proof: int,
+             difficulty: int, miner_key: Any):
+        """ Search the proof and submit the block.
+        """
+        proof = self.miner.search(
+            last_proof, miner_key, difficulty,
+            lambda: self._generation != generation)
+        with self._lock:
+            if proof is None or self._generation != generation:
+                return
+            template = self._template
+            self._active = False
+        self.submit(template, proof)
@@ -0,0 +1,106 @@
+""" Pool of blocks that arrived before their parent block.
+
+Blocks are kept by the hash of their parent (previous_hash),
+once the parent is connected to the chain its children are
+connected right after it without requesting them again.
+The pool is bounded (the oldest blocks are removed first)
+and blocks expire after ORPHAN_EXPIRY seconds.
+"""
+
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Tuple
+
+# Maximum number of blocks in the pool
+MAX_ORPHANS = 100
+
+# Seconds until a block is removed from the pool
+ORPHAN_EXPIRY = 600.0
+
+
+class OrphanPool(object):
+    """ Blocks without a parent in the chain.
+
+    Args:
+        max_size: Maximum number of blocks.
+        expiry: Seconds until a block is removed.
+        clock: Source of the current time.
+    """
+
+    def __init__(self,
+                 max_size: int = MAX_ORPHANS,
+                 expiry: float = ORPHAN_EXPIRY,
+                 clock: Callable[[], float] = time.monotonic) -> None:
+        self.max_size = max_size
+        self.expiry = expiry
+        self.clock = clock
+        # Blocks in the order of arrival (header -> (block, arrival))
+        self._blocks: Dict[Any, Tuple[Any, float]] = OrderedDict()
+        # Headers of the children of a block (previous_hash -> headers)
+        self._children: Dict[Any, List[Any]] = {}
+
+    def __contains__(self, header: Any) -> bool:
+        return header in self._blocks
+
+    def __len__(self) -> int:
+        return len(self._blocks)
+
+    def add(self, block: Any) -> bool:
+        """ Add a block whose parent is unknown.
+
+        Args:
+            block: The block.
+
+        Returns:
+            True if the block was added, False if it is known.
+        """
+        self.expire()
+        header = block.header
+        if header in self._blocks:
+            return False
+        while len(self._blocks) >= self.max_size:
+            self.remove(next(iter(self._blocks)))
+        self._blocks[header] = (block, self.clock())
+        self._children.setdefault(header.previous_hash, []).append(header)
+        return True
+
+    def remove(self, header: Any):
+        """ Remove a block from the pool.
+
+        Args:
+            header: Header of the block.
+        """
+        del self._blocks[header]
+        siblings = self._children[header.previous_hash]
+        siblings.remove(header)
+        if not siblings:
+            del self._children[header.previous_hash]
+
+    def pop_children(self, root_hash: Any) -> List[Any]:
+        """ Remove the children of a connected block from the pool.
+
+        Args:
+            root_hash: Root hash of the connected block.
+
+        Returns:
+            The blocks whose previous_hash is the root hash.
+        """
+        self.expire()
+        headers = self._children.pop(root_hash, [])
+        return [self._blocks.pop(header)[0] for header in headers]
+
+    def expire(self):
+        """ Remove the blocks that are in the pool for too long.
+        """
+        deadline = self.clock() - self.expiry
+        while self._blocks:
+            header, (_, arrival) = next(iter(self._blocks.items()))
+            if arrival > deadline:
+                break
+            self.remove(header)
+
+    def clear(self):
+        """ Remove all blocks.
+        """
+        self._blocks.clear()
+        self._children.clear()
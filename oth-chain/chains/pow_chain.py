@@ -5,14 +5,14 @@ import hashlib
 import math
 import time
 from pprint import pprint
-from typing import Any, Callable, Dict, List, Tuple
+from queue import Queue
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
-import nacl.encoding
-import nacl.signing
-from nacl.exceptions import BadSignatureError
 from collections import OrderedDict
 
 from .blockchain import Block, Blockchain, Transaction, Header
+from .miner import Miner
+from .mining_job import MiningJob
 from networking import Address
 from utils import print_debug_info
 
@@ -23,8 +23,65 @@ class PoW_Blockchain(Blockchain):
     Args:
         send_queue: Queue for messages to other nodes.
         gui_queue: Queue for interaction with the gui.
+        validation_workers: Number of processes verifying signatures.
+        mining_threads: Number of processes searching proofs.
+        store_directory: Directory of the block store (None => chain file).
+        prune_depth: Number of latest blocks whose transactions are held
+            (None => hold all blocks).
     """
 
+    def __init__(self,
+                 version: float,
+                 send_queue: Queue,
+                 gui_queue: Queue,
+                 validation_workers: int = 0,
+                 mining_threads: int = 1,
+                 store_directory: Optional[str] = None,
+                 prune_depth: Optional[int] = None) -> None:
+        super(PoW_Blockchain, self).__init__(version, send_queue, gui_queue,
+                                             validation_workers,
+                                             store_directory, prune_depth)
+        self.miner = Miner(mining_threads)
+        self.mining_job: Optional[MiningJob] = None
+
+    def enable_background_mining(self, receive_queue: Queue):
+        """ Mine in a background job instead of the blockchain thread.
+
+        Found blocks are sent back as 'mined_block' message.
+
+        Args:
+            receive_queue: Queue of the messages for the blockchain thread.
+        """
+        self.mining_job = MiningJob(
+            self.miner,
+            lambda template, proof: receive_queue.put(
+                ('mined_block', (template, proof), 'local')))
+
+    def new_transaction(self, transaction: Transaction):
+        """ Add a new transaction to the pool.
+
+        Refreshes the template of a running mining job
+        if the transaction pays a fee.
+        """
+        super(PoW_Blockchain, self).new_transaction(transaction)
+        if self.mining_job and self.mining_job.running and \
+                transaction.fee > 0 and \
+                transaction in self.transaction_pool:
+            self.mining_job.update(
+                self.create_template(self.mining_job.miner_key))
+
+    def new_block(self, block: Block):
+        """ Process a new block.
+
+        Restarts a running mining job if the chain has a new tip.
+        """
+        latest_header = self.latest_header()
+        super(PoW_Blockchain, self).new_block(block)
+        if self.mining_job and self.mining_job.running and \
+                self.latest_header() != latest_header:
+            print_debug_info('New block, restart mining')
+            self.start_mining(self.mining_job.miner_key)
+
     def validate_block(self,
                        block: Block,
                        last_block: Block,
@@ -105,26 +162,25 @@ class PoW_Blockchain(Blockchain):
             return False
         # if transaction.sender == '0' and transaction.signature == '0':
         #    return True
-        try:
-            verify_key = nacl.signing.VerifyKey(
-                transaction.sender, encoder=nacl.encoding.HexEncoder)
-            transaction_hash = verify_key.verify(
-                transaction.signature).decode()
-            validate_hash = hashlib.sha256(
-                (str(transaction.sender) + str(transaction.recipient) +
-                 str(transaction.amount) + str(transaction.fee)
-                 + str(transaction.timestamp)).encode()
-            ).hexdigest()
-
-            if validate_hash == transaction_hash:
-                print_debug_info('Signature OK')
-                return self.validate_balance(transaction)
-            print_debug_info('Wrong Hash')
-            return False
+        if self.verify_signature(transaction):
+            return self.validate_balance(transaction)
+        return False
 
-        except BadSignatureError:
-            print_debug_info('Bad Signature, Validation Failed')
-            return False
+    @staticmethod
+    def legacy_hash(transaction: Transaction) -> str:
+        """ Create the hash signed by legacy transactions.
+
+        Args:
+            transaction: Transaction of the hash.
+
+        Returns:
+            Hex digest signed by the sender.
+        """
+        return hashlib.sha256(
+            (str(transaction.sender) + str(transaction.recipient) +
+             str(transaction.amount) + str(transaction.fee)
+             + str(transaction.timestamp)).encode()
+        ).hexdigest()
 
     def validate_balance(self, transaction: Transaction):
         balance = self.check_balance(
@@ -145,18 +201,17 @@ class PoW_Blockchain(Blockchain):
 
         Find a number that fullfills validate_proof().
         Can take some time, depending on blockchain difficulty.
+        The search is split across the processes of the miner.
 
         Args:
             miner_key: The (public) key of the miner.
 
         Returns:
-            The calculated proof.
+            The calculated proof, None if mining was cancelled.
         """
-        proof = 0
         last_block = self.latest_block()
-        while self.validate_proof(last_block, proof, miner_key) is False:
-            proof += 1
-        return proof
+        return self.miner.search(last_block.header.proof, miner_key,
+                                 self.scale_difficulty(last_block))
 
     def validate_proof(self, last_block: Block,
                        proof: int, miner_key: bytes) -> bool:
@@ -214,6 +269,12 @@ class PoW_Blockchain(Blockchain):
                     f'{balance}')
         elif msg_type == 'mine':
             self.mine(msg_data, msg_address)
+        elif msg_type == 'mined_block':
+            if msg_address == 'local':
+                self.submit_proof(*msg_data)
+        elif msg_type == 'cancel_mining':
+            if msg_address == 'local' and self.mining_job:
+                self.mining_job.cancel()
         else:
             super(PoW_Blockchain, self).process_message(message)
 
@@ -228,14 +289,45 @@ class PoW_Blockchain(Blockchain):
 
     def mine(self, msg_data: Any, msg_address: Address):
         """ Mines a new block.
+
+        Uses the mining job if background mining is enabled,
+        otherwise the block is mined on the blockchain thread.
+
             Args:
                 msg_data: The key of the miner
                 msg_address: -
         """
         if msg_address != 'local':
             return
-        proof = self.create_proof(msg_data)
-        block = self.create_block(proof)
+        if self.mining_job:
+            self.start_mining(msg_data)
+        else:
+            template = self.create_template(msg_data)
+            self.submit_proof(template, self.create_proof(msg_data))
+
+    def start_mining(self, miner_key: Any):
+        """ Hand a new template to the mining job.
+
+        Args:
+            miner_key: The (public) key of the miner.
+        """
+        last_block = self.latest_block()
+        self.mining_job.start(self.create_template(miner_key),
+                              last_block.header.proof,
+                              self.scale_difficulty(last_block),
+                              miner_key)
+
+    def create_template(self, miner_key: Any) -> Block:
+        """ Create a block without proof from the transaction pool.
+
+        Args:
+            miner_key: The (public) key of the miner,
+                receiver of the mining reward.
+
+        Returns:
+            The block template.
+        """
+        block = self.create_block(None)
         fee_sum = 0
         for transaction in block.transactions:
             fee_sum += transaction.fee
@@ -243,13 +335,31 @@ class PoW_Blockchain(Blockchain):
         mining_reward = 50 >> 2 ** reward_multiplier \
             if reward_multiplier >= 0 else 50
         block.transactions.append(
-            Transaction(sender='0', recipient=msg_data,
+            Transaction(sender='0', recipient=miner_key,
                         amount=mining_reward + fee_sum, fee=0,
                         timestamp=time.time(), signature='0'))
-        self.new_block(self.prepare_new_block(block))
+        return self.prepare_new_block(block)
+
+    def submit_proof(self, template: Block, proof: Optional[int]):
+        """ Add a mined block to the chain.
+
+        Args:
+            template: Block template the proof was searched for.
+            proof: The found proof.
+        """
+        if proof is None:
+            return
+        if template.header.previous_hash != self.latest_header().root_hash:
+            print_debug_info('Mined block is outdated')
+            return
+        print_debug_info(
+            f'Mining: {self.miner.hashes_per_second:.0f} hashes/s')
+        header = template.header._replace(proof=proof)
+        self.store_template_tree(header)
+        self.new_block(Block(header, template.transactions))
 
     def prepare_new_block(self, block: Block) -> Block:
-        root_hash = self.create_merkle_root(block.transactions)
+        root_hash = self.template_merkle_root(block.transactions)
         real_header = Header(
             block.header.version,
             block.header.index,
@@ -258,5 +368,6 @@ class PoW_Blockchain(Blockchain):
             root_hash,
             block.header.proof
         )
+        self.store_template_tree(real_header)
         real_block = Block(real_header, block.transactions)
         return real_block
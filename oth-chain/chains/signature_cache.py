@@ -0,0 +1,98 @@
+""" Cache of verified transaction signatures.
+
+Transactions are verified when they enter the transaction pool
+and again when the block containing them is validated.
+The results are cached by transaction id (which includes the signature),
+so every signature is only verified once.
+"""
+
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+import nacl.encoding
+import nacl.signing
+
+MAX_CACHED_SIGNATURES = 100000
+MAX_CACHED_KEYS = 10000
+
+
+class SignatureCache(object):
+    """ Bounded LRU cache of signature verification results.
+
+    Also caches the VerifyKey objects of the senders.
+
+    Args:
+        max_size: Maximum number of cached results.
+        max_keys: Maximum number of cached verify keys.
+    """
+
+    def __init__(self,
+                 max_size: int = MAX_CACHED_SIGNATURES,
+                 max_keys: int = MAX_CACHED_KEYS) -> None:
+        self.max_size = max_size
+        self.max_keys = max_keys
+        self.hits = 0
+        self.misses = 0
+        self._results: Dict[bytes, bool] = OrderedDict()
+        self._keys: Dict[Any, nacl.signing.VerifyKey] = OrderedDict()
+
+    def __contains__(self, transaction_id: bytes) -> bool:
+        return transaction_id in self._results
+
+    def __len__(self) -> int:
+        return len(self._results)
+
+    def get(self, transaction_id: bytes) -> Optional[bool]:
+        """ Get the cached verification result of a transaction.
+
+        Args:
+            transaction_id: Digest of the transaction.
+
+        Returns:
+            The validity of the signature, None if it is not cached.
+        """
+        valid = self._results.get(transaction_id)
+        if valid is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self._results.move_to_end(transaction_id)
+        return valid
+
+    def put(self, transaction_id: bytes, valid: bool):
+        """ Cache the verification result of a transaction.
+
+        Args:
+            transaction_id: Digest of the transaction.
+            valid: The validity of the signature.
+        """
+        self._results[transaction_id] = valid
+        self._results.move_to_end(transaction_id)
+        while len(self._results) > self.max_size:
+            self._results.popitem(last=False)
+
+    def verify_key(self, sender: Any) -> nacl.signing.VerifyKey:
+        """ Get the VerifyKey of a sender.
+
+        Args:
+            sender: Hex encoded public key of the sender.
+
+        Returns:
+            The (cached) VerifyKey.
+        """
+        verify_key = self._keys.get(sender)
+        if verify_key is None:
+            verify_key = nacl.signing.VerifyKey(
+                sender, encoder=nacl.encoding.HexEncoder)
+            self._keys[sender] = verify_key
+            while len(self._keys) > self.max_keys:
+                self._keys.popitem(last=False)
+        else:
+            self._keys.move_to_end(sender)
+        return verify_key
+
+    def clear(self):
+        """ Remove all cached results and keys.
+        """
+        self._results.clear()
+        self._keys.clear()
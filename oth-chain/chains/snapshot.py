@@ -0,0 +1,141 @@
+""" Snapshots of the state derived from the chain.
+
+A snapshot contains the derived state (e.g. balances) after a block,
+tagged with the height and the header of the block.
+Snapshots are written to a temporary file which replaces the
+snapshot file (state-<height>.snap) once it is on the disk,
+so a crash never leaves an incomplete snapshot behind.
+On startup the latest valid snapshot is loaded and
+only the blocks after it are replayed.
+"""
+
+import os
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import serializer
+from utils import print_debug_info
+
+from .block_store import pack_record, unpack_record
+
+# Version of the snapshot format, other versions are ignored
+SNAPSHOT_VERSION = 3
+
+# Number of blocks between two snapshots
+SNAPSHOT_INTERVAL = 1000
+
+# Number of snapshots kept on the disk
+SNAPSHOT_KEEP = 2
+
+
+def snapshot_file_name(height: int) -> str:
+    """ Name of the snapshot file of a height.
+    """
+    return f'state-{height:010d}.snap'
+
+
+class SnapshotStore(object):
+    """ Snapshots of the derived state in a directory.
+
+    Args:
+        directory: Directory of the snapshot files.
+        keep: Number of snapshots kept on the disk.
+    """
+
+    def __init__(self, directory: str, keep: int = SNAPSHOT_KEEP) -> None:
+        self.directory = directory
+        self.keep = keep
+        os.makedirs(directory, exist_ok=True)
+
+    def heights(self) -> List[int]:
+        """ Heights of the existing snapshots (in order).
+        """
+        heights = []
+        for name in os.listdir(self.directory):
+            if name.startswith('state-') and name.endswith('.snap'):
+                try:
+                    heights.append(int(name[6:-5]))
+                except ValueError:
+                    pass
+        return sorted(heights)
+
+    def write(self, height: int, header: Any, state: Dict[str, Any]):
+        """ Write a snapshot atomically and remove old snapshots.
+
+        Args:
+            height: Height of the block of the snapshot.
+            header: Header of the block of the snapshot.
+            state: The derived state after the block.
+        """
+        path = self._path(height)
+        payload = serializer.serialize({
+            'version': SNAPSHOT_VERSION,
+            'height': height,
+            'header': header,
+            'state': state}).encode()
+        with open(path + '.tmp', 'wb') as f:
+            f.write(pack_record(payload))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + '.tmp', path)
+        self._sync_directory()
+
+        for old in self.heights()[:-self.keep]:
+            os.remove(self._path(old))
+
+    def latest(self, valid: Callable[[int, Any], bool]
+               ) -> Optional[Tuple[int, Any, Dict[str, Any]]]:
+        """ Read the latest valid snapshot.
+
+        Args:
+            valid: Checks the height and header of a snapshot
+                (e.g. whether the block is part of the chain).
+
+        Returns:
+            Tuple of (height, header, state), None if there is no snapshot.
+        """
+        for height in reversed(self.heights()):
+            snapshot = self.read(height)
+            if snapshot is None or \
+                    not valid(snapshot['height'], snapshot['header']):
+                print_debug_info(f'Ignoring invalid snapshot {height}')
+                continue
+            return snapshot['height'], snapshot['header'], snapshot['state']
+        return None
+
+    def read(self, height: int) -> Optional[Dict[str, Any]]:
+        """ Read a snapshot.
+
+        Args:
+            height: Height of the snapshot.
+
+        Returns:
+            The snapshot, None if it is corrupted or of another version.
+        """
+        with open(self._path(height), 'rb') as f:
+            payload = unpack_record(f.read(), 0)
+        if payload is None:
+            return None
+        try:
+            snapshot = serializer.deserialize(payload.decode())
+        except (ValueError, KeyError, TypeError):
+            return None
+        if snapshot.get('version') != SNAPSHOT_VERSION:
+            return None
+        return snapshot
+
+    def _sync_directory(self):
+        """ Write the renaming of a snapshot to the disk.
+        """
+        try:
+            fd = os.open(self.directory, os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            os.fsync(fd)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
+
+    def _path(self, height: int) -> str:
+        return os.path.join(self.directory, snapshot_file_name(height))
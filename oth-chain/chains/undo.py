@@ -0,0 +1,66 @@
+""" Undo records of the blocks applied to the derived state.
+
+Applying a block to the derived state (balances, domains, auctions,
+the DDoS tree) returns a record of the changes.
+On a reorganization the records of the replaced blocks are reverted
+down to the common ancestor, so only the blocks of the new branch
+have to be validated and applied.
+Records are only kept for the latest blocks,
+deeper reorganizations replay the state from a snapshot.
+"""
+
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Optional
+
+# Number of latest blocks whose undo records are kept
+UNDO_DEPTH = 1000
+
+
+class UndoLog(object):
+    """ Undo records of the latest applied blocks (in chain order).
+
+    Args:
+        depth: Maximum number of kept records.
+    """
+
+    def __init__(self, depth: int = UNDO_DEPTH) -> None:
+        self.depth = depth
+        self._records: Dict[Any, Any] = OrderedDict()
+
+    def __contains__(self, header: Any) -> bool:
+        return header in self._records
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def add(self, header: Any, record: Any):
+        """ Keep the undo record of an applied block.
+
+        Args:
+            header: Header of the block.
+            record: Changes of the block to the derived state.
+        """
+        self._records[header] = record
+        while len(self._records) > self.depth:
+            self._records.popitem(last=False)
+
+    def pop(self, header: Any) -> Optional[Any]:
+        """ Remove the undo record of a reverted block.
+
+        Args:
+            header: Header of the block.
+
+        Returns:
+            The record, None if it is not kept.
+        """
+        return self._records.pop(header, None)
+
+    def covers(self, headers: Iterable[Any]) -> bool:
+        """ Check whether the records of all given blocks are kept.
+        """
+        return all(header in self._records for header in headers)
+
+    def clear(self):
+        """ Remove all records.
+        """
+        self._records.clear()
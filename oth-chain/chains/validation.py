@@ -0,0 +1,152 @@
+""" Two-stage validation of blocks.
+
+The first stage runs the stateless checks of the transactions
+(signature verification) in parallel on a process pool
+and stores the results in the signature cache of the chain.
+The second stage is the normal (stateful) validation of the chain,
+which checks balances, domain ownership and permissions in order
+and finds the signatures already verified.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from multiprocessing import get_context
+from typing import Any, Callable, Iterable, List, Optional
+
+from nacl.exceptions import BadSignatureError
+
+from utils import print_debug_info
+
+from . import encoding
+from .signature_cache import SignatureCache
+
+# Number of chunks per worker, smaller chunks balance the load better
+CHUNKS_PER_WORKER = 4
+
+# VerifyKeys of the worker processes
+_worker_cache = SignatureCache(max_size=0)
+
+
+def check_signature(transaction: Any,
+                    legacy_hash: Callable[[Any], str],
+                    verify_key: Any) -> bool:
+    """ Verify the signature of a transaction.
+
+    Signatures either sign the message of the byte encoding
+    or the legacy hash of the transaction.
+
+    Args:
+        transaction: Transaction that should be verified.
+        legacy_hash: Function creating the legacy hash of the transaction.
+        verify_key: VerifyKey of the sender.
+
+    Returns:
+        The validity (True/False) of the signature.
+    """
+    try:
+        message = verify_key.verify(transaction.signature)
+    except BadSignatureError:
+        print_debug_info('Bad Signature, Validation Failed')
+        return False
+
+    if encoding.is_binary_message(message):
+        valid = message == transaction.signing_message()
+    else:
+        valid = message.decode() == legacy_hash(transaction)
+
+    if valid:
+        print_debug_info('Signature OK')
+    else:
+        print_debug_info('Wrong Hash')
+    return valid
+
+
+def _check_signatures(transactions: List[Any],
+                      legacy_hash: Callable[[Any], str]
+                      ) -> List[Optional[bool]]:
+    """ Verify the signatures of transactions in a worker process.
+
+    Returns:
+        The validity of every signature, None if the transaction
+        could not be checked (it is then checked by the chain).
+    """
+    results: List[Optional[bool]] = []
+    for transaction in transactions:
+        try:
+            results.append(check_signature(
+                transaction, legacy_hash,
+                _worker_cache.verify_key(transaction.sender)))
+        except Exception:  # malformed keys/signatures
+            results.append(None)
+    return results
+
+
+class ValidationPipeline(object):
+    """ Stateless validation stage using a process pool.
+
+    Args:
+        workers: Number of worker processes
+            (0 => no parallel stage, signatures are verified by the chain).
+    """
+
+    def __init__(self, workers: int = 0) -> None:
+        self.workers = workers
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def verify_signatures(self,
+                          transactions: Iterable[Any],
+                          legacy_hash: Callable[[Any], str],
+                          cache: SignatureCache):
+        """ Verify the unseen signatures of the transactions in parallel.
+
+        Mining and auction transactions (sender '0') are not signed
+        and skipped.
+
+        Args:
+            transactions: Transactions that should be verified.
+            legacy_hash: Function creating the legacy hash of a transaction
+                (has to be picklable, e.g. a staticmethod).
+            cache: Signature cache the results are stored in.
+        """
+        if self.workers < 1:
+            return
+
+        unseen = {}
+        for transaction in transactions:
+            if transaction.sender == '0':
+                continue
+            transaction_id = transaction.digest
+            if transaction_id not in cache:
+                unseen[transaction_id] = transaction
+        if not unseen:
+            return
+
+        pending = list(unseen.values())
+        chunk_size = -(-len(pending) //
+                       (self.workers * CHUNKS_PER_WORKER))
+        chunks = [pending[i:i + chunk_size]
+                  for i in range(0, len(pending), chunk_size)]
+
+        results = self.executor.map(_check_signatures,
+                                    chunks, repeat(legacy_hash))
+        for chunk, chunk_results in zip(chunks, results):
+            for transaction, valid in zip(chunk, chunk_results):
+                if valid is not None:
+                    cache.put(transaction.digest, valid)
+
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        """ Process pool of the workers (created on first use).
+        """
+        if self._executor is None:
+            # Spawn, as the chain runs next to the networking threads
+            self._executor = ProcessPoolExecutor(
+                self.workers, mp_context=get_context('spawn'))
+        return self._executor
+
+    def shutdown(self):
+        """ Stop the worker processes.
+        """
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
@@ -7,23 +7,22 @@ Also contains various functions for private/public keys.
 """
 
 import getopt
-import hashlib
 import math
 import re
 import socket
 import sys
 import threading
 import time
-from queue import Queue
-from typing import Any
+from queue import Empty, Queue
+from typing import Any, Callable, Iterator, Optional
 
 import nacl.encoding
 import nacl.signing
 import nacl.utils
 
-from chains import Blockchain, DNSBlockChain, DNS_Transaction, DNS_Data, PoW_Blockchain, Transaction
+from chains import Blockchain, DNSBlockChain, DNS_Transaction, DNS_Data, PoW_Blockchain, Transaction, sign_transaction
 from gui import gui_loop, dns_gui_loop
-from networking import Address, worker
+from networking import SERVER, Address, worker
 from utils import Keystore, load_key, save_key, print_debug_info, set_debug
 
 # Create queues for message transfer blockchain<->networking
@@ -38,7 +37,13 @@ networker_command_queue: Queue = Queue()
 gui_send_queue: Queue = Queue()
 gui_receive_queue: Queue = Queue()
 
-VERSION = 0.7
+VERSION = 0.8
+
+# Default directory of the block store
+BLOCK_STORE_DIRECTORY = 'blocks'
+
+# Seconds between checks of the block download timeouts
+DOWNLOAD_TICK_INTERVAL = 1.0
 
 
 def receive_msg(msg_type: str, msg_data: Any, msg_address: Address,
@@ -60,11 +65,42 @@ def receive_msg(msg_type: str, msg_data: Any, msg_address: Address,
         send_queue.put(
             ('resolve_conflict', blockchain.get_header_chain(), msg_address))
     elif msg_type == 'exit' and msg_address == 'local':
+        blockchain.close()
         sys.exit()
     else:
         processor((msg_type, msg_data, msg_address))
 
 
+def received_messages(processor, queue: Queue = receive_queue,
+                      clock: Callable[[], float] = time.monotonic
+                      ) -> Iterator[Any]:
+    """ Wait for the received messages.
+
+    Lets the blockchain reassign stalled block downloads
+    every DOWNLOAD_TICK_INTERVAL seconds,
+    also while messages keep arriving.
+
+    Args:
+        processor: Processor used to handle blockchain messages.
+        queue: Queue of the received messages.
+        clock: Source of the current time.
+
+    Returns:
+        The messages.
+    """
+    deadline = clock() + DOWNLOAD_TICK_INTERVAL
+    while True:
+        now = clock()
+        if now >= deadline:
+            processor(('download_tick', None, 'local'))
+            deadline = now + DOWNLOAD_TICK_INTERVAL
+            continue
+        try:
+            yield queue.get(timeout=deadline - now)
+        except Empty:
+            pass
+
+
 def blockchain_loop(blockchain: Blockchain, processor):
     """ The main loop of the blockchain thread.
 
@@ -74,8 +110,7 @@ def blockchain_loop(blockchain: Blockchain, processor):
         blockchain: The blockchain upon which to operate.
         processor: Processor used to handle blockchain messages.
     """
-    while True:
-        msg_type, msg_data, msg_address = receive_queue.get()
+    for msg_type, msg_data, msg_address in received_messages(processor):
         print_debug_info('Processing: ' + msg_type)
         try:
             receive_msg(msg_type, msg_data, msg_address, blockchain, processor)
@@ -99,34 +134,23 @@ def create_transaction(dns: bool, sender: str, recipient: str, amount: int, fee:
             dns_data: includes information on dns operations
             signing_key: key used to sign the hash
     """
-    hash_str = (str(sender) +
-                str(recipient) + str(amount)
-                + str(fee) +
-                str(timestamp))
     if not dns:
-        transaction_hash = hashlib.sha256(hash_str.encode()).hexdigest()
-
         transaction = Transaction(sender,
                                   recipient,
                                   amount,
                                   fee,
                                   timestamp,
-                                  signing_key.sign(
-                                      transaction_hash.encode())
-                                  )
-        return transaction
+                                  '')
+        return sign_transaction(transaction, signing_key)
 
-    transaction_hash = hashlib.sha256((hash_str + str(dns_data)).encode()).hexdigest()
     transaction = DNS_Transaction(sender,
                                   recipient,
                                   amount,
                                   fee,
                                   timestamp,
                                   dns_data,
-                                  signing_key.sign(
-                                      transaction_hash.encode())
-                                  )
-    return transaction
+                                  '')
+    return sign_transaction(transaction, signing_key)
 
 
 def parse_args(argv):
@@ -139,9 +163,19 @@ def parse_args(argv):
     port = 6666
     signing_key = None
     dns = False
+    validation_workers = 0
+    mining_threads = 1
+    store_directory = BLOCK_STORE_DIRECTORY
+    prune_depth = None
+    datagram_size = 1024
+    receive_buffer = None
+    send_buffer = None
+    reliable = False
     try:
         opts, _ = getopt.getopt(argv[1:], 'hdnp=k=s=', [
-            'help', 'debug', 'dns', 'port=', 'key=', 'store='])
+            'help', 'debug', 'dns', 'port=', 'key=', 'store=',
+            'validation-workers=', 'mining-threads=', 'blocks=', 'prune=',
+            'datagram-size=', 'receive-buffer=', 'send-buffer=', 'reliable'])
         for o, a in opts:
             if o in ('-h', '--help'):
                 print('-d/--debug to enable debug prints')
@@ -149,6 +183,17 @@ def parse_args(argv):
                 print('-p/--port to change default port')
                 print('-k/--key to load a private key from a file')
                 print('-s/--store to load a keystore from a file')
+                print('--validation-workers to verify signatures' +
+                      ' with multiple processes')
+                print('--mining-threads to mine with multiple processes')
+                print('--blocks to change the directory of the block store')
+                print('--prune to only keep the transactions' +
+                      ' of the latest blocks')
+                print('--datagram-size to change the maximum size' +
+                      ' of UDP datagrams')
+                print('--receive-buffer/--send-buffer to change' +
+                      ' the socket buffer sizes')
+                print('--reliable to resend lost fragments of messages')
                 sys.exit()
             if o in ('-d', '--debug'):
                 set_debug()
@@ -169,16 +214,59 @@ def parse_args(argv):
             elif o in ('-s', '--store'):
                 keystore_filename = a
                 print_debug_info(keystore_filename)
+            elif o == '--validation-workers':
+                try:
+                    validation_workers = int(a)
+                except ValueError:
+                    print("Validation workers was invalid (e.g. not an int)")
+            elif o == '--mining-threads':
+                try:
+                    mining_threads = int(a)
+                except ValueError:
+                    print("Mining threads was invalid (e.g. not an int)")
+            elif o == '--blocks':
+                store_directory = a
+            elif o == '--prune':
+                try:
+                    prune_depth = int(a)
+                except ValueError:
+                    print("Prune depth was invalid (e.g. not an int)")
+            elif o == '--datagram-size':
+                try:
+                    datagram_size = int(a)
+                except ValueError:
+                    print("Datagram size was invalid (e.g. not an int)")
+            elif o == '--receive-buffer':
+                try:
+                    receive_buffer = int(a)
+                except ValueError:
+                    print("Receive buffer was invalid (e.g. not an int)")
+            elif o == '--reliable':
+                reliable = True
+            elif o == '--send-buffer':
+                try:
+                    send_buffer = int(a)
+                except ValueError:
+                    print("Send buffer was invalid (e.g. not an int)")
 
     except getopt.GetoptError as err:
         print('for help use --help')
         print(err)
         sys.exit()
 
-    return keystore_filename, port, signing_key, dns
+    return (keystore_filename, port, signing_key, dns,
+            validation_workers, mining_threads, store_directory, prune_depth,
+            datagram_size, receive_buffer, send_buffer, reliable)
 
 
-def init(keystore_filename: str, port: int, signing_key, dns: bool):
+def init(keystore_filename: str, port: int, signing_key, dns: bool,
+         validation_workers: int = 0, mining_threads: int = 1,
+         store_directory: str = BLOCK_STORE_DIRECTORY,
+         prune_depth: Optional[int] = None,
+         datagram_size: int = 1024,
+         receive_buffer: Optional[int] = None,
+         send_buffer: Optional[int] = None,
+         reliable: bool = False):
     """ Initialize the blockchain client.
 
     Args:
@@ -186,16 +274,35 @@ def init(keystore_filename: str, port: int, signing_key, dns: bool):
         port: Port used for networking.
         signing_key: Key of the current user
         dns: Indicates, whether the chain is a dns-chain or a normal pow-chain
+        validation_workers: Number of processes verifying signatures
+        mining_threads: Number of processes searching proofs
+        store_directory: Directory of the block store
+        prune_depth: Number of latest blocks whose transactions are kept
+            (None => keep all blocks)
+        datagram_size: Maximum size of UDP datagrams
+        receive_buffer: SO_RCVBUF of the socket (None => system default)
+        send_buffer: SO_SNDBUF of the socket (None => system default)
+        reliable: Resend lost fragments of messages
     """
     # Create proof-of-work blockchain
 
     if dns:
-        my_blockchain = DNSBlockChain(VERSION, send_queue, gui_send_queue)
+        my_blockchain = DNSBlockChain(VERSION, send_queue, gui_send_queue,
+                                      validation_workers, mining_threads,
+                                      store_directory, prune_depth)
     else:
-        my_blockchain = PoW_Blockchain(VERSION, send_queue, gui_send_queue)
+        my_blockchain = PoW_Blockchain(VERSION, send_queue, gui_send_queue,
+                                       validation_workers, mining_threads,
+                                       store_directory, prune_depth)
+    my_blockchain.enable_background_mining(receive_queue)
     my_blockchain_processor = my_blockchain.get_message_processor()
 
     # Create networking thread
+    try:
+        SERVER.configure(datagram_size, receive_buffer, send_buffer)
+    except ValueError as err:
+        print(err)
+    SERVER.reliable = reliable
     networker = threading.Thread(
         target=worker,
         args=(send_queue, receive_queue, networker_command_queue, gui_send_queue, port))
@@ -284,6 +391,7 @@ def main(argv):
                 help: prints commands
                 transaction <to> <amount> : Create transaction
                 mine: mine a new block
+                cancel: cancel mining
                 balance [<name>]: Print balance (name optional)
                 dump: print blockchain
                 peers: print peers
@@ -294,7 +402,7 @@ def main(argv):
 keystore
                 export <filename> : Exports one own public key to file\
 <filename>
-                save: Save blockchain to bc_file.txt
+                save: Sync the block store to the disk
                 exit: exits program
                 """)
             print(help_str)
@@ -320,6 +428,8 @@ keystore
             sys.exit()
         elif command == 'mine':
             receive_queue.put(('mine', verify_key_hex, 'local'))
+        elif command == 'cancel':
+            receive_queue.put(('cancel_mining', '', 'local'))
         elif re.fullmatch(r'transaction \w+ \d+', command):
             t = command.split(' ')
             # Create new Transaction, sender = hex(public_key),
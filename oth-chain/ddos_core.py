@@ -10,7 +10,7 @@ import nacl.signing
 import nacl.utils
 
 import core
-from chains import DDosChain, DDosTransaction, DDosData
+from chains import DDosChain, DDosTransaction, DDosData, sign_transaction
 from utils import keystore, set_debug
 from gui import ddos_gui_loop
 
@@ -64,7 +64,8 @@ def init(port: int, signing_key):
     """
     my_blockchain = DDosChain(core.VERSION,
                               core.send_queue,
-                              core.gui_send_queue)
+                              core.gui_send_queue,
+                              store_directory='ddos_blocks')
     my_blockchain_processor = my_blockchain.get_message_processor()
 
     # Create networking thread
@@ -106,19 +107,14 @@ def create_transaction(sender: str,
                        data: DDosData,
                        signing_key: nacl.signing.SigningKey) \
         -> DDosTransaction:
-    hash_str = (str(sender) +
-                str(data) +
-                str(timestamp))
-    transaction_hash = DDosChain.hash(hash_str)
-
     transaction = DDosTransaction(
         sender,
         timestamp,
         data,
-        signing_key.sign(transaction_hash.encode())
+        ''
     )
 
-    return transaction
+    return sign_transaction(transaction, signing_key)
 
 
 def main(argv):
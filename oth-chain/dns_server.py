@@ -67,8 +67,7 @@ def blockchain_loop(blockchain: DNSBlockChain, processor):
         blockchain: The blockchain upon which to operate.
         processor: Processor used to handle blockchain messages.
     """
-    while True:
-        msg_type, msg_data, msg_address = core.receive_queue.get()
+    for msg_type, msg_data, msg_address in core.received_messages(processor):
         print_debug_info('Processing: ' + msg_type)
         try:
             receive_msg(msg_type, msg_data, msg_address, blockchain, processor)
@@ -108,7 +107,8 @@ def parse_args(argv):
 
 def init(port):
     my_blockchain = DNSBlockChain(
-        core.VERSION, core.send_queue, core.gui_send_queue)
+        core.VERSION, core.send_queue, core.gui_send_queue,
+        store_directory=core.BLOCK_STORE_DIRECTORY)
     my_blockchain_processor = my_blockchain.get_message_processor()
 
     # Create networking thread
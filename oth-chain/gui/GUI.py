@@ -1,4 +1,3 @@
-import hashlib
 import sys
 import threading
 import time
@@ -11,7 +10,7 @@ import nacl.signing
 import nacl.utils
 
 from utils import Keystore, load_key, save_key
-from chains import Block, Transaction
+from chains import Block, Transaction, sign_transaction
 from networking import Address
 
 from PyQt5.QtGui import QStandardItemModel, QStandardItem
@@ -604,21 +603,14 @@ class TransactionWidget(QWidget):
                 fee: The fee for the transaction.
                 timestamp: The time when the transaction occurred.
         """
-        transaction_hash = hashlib. \
-            sha256((str(self.verify_key_hex) +
-                    str(recipient) + str(amount)
-                    + str(fee) +
-                    str(timestamp)).encode()).hexdigest()
-
         transaction = Transaction(self.verify_key_hex,
                                   recipient,
                                   amount,
                                   fee,
                                   timestamp,
-                                  self.signing_key.sign(
-                                      transaction_hash.encode())
+                                  ''
                                   )
-        return transaction
+        return sign_transaction(transaction, self.signing_key)
 
     def load_signing_key(self):
         """ Loads a private key, to change the current user.
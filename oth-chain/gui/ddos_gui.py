@@ -1,4 +1,3 @@
-import hashlib
 import sys
 import threading
 import time
@@ -11,7 +10,7 @@ import nacl.signing
 import nacl.utils
 
 from utils import load_key, save_key, Node
-from chains import Block, DDosTransaction, DDosHeader, DDosData
+from chains import Block, DDosTransaction, DDosHeader, DDosData, sign_transaction
 from networking import Address
 from . import GUI
 
@@ -354,19 +353,15 @@ class TransactionWidget(GUI.TransactionWidget):
                 data: The DDoS Data specifying a certain operation.
         """
         timestamp = time.time()
-        hash_str = (str(self.verify_key_hex) +
-                    str(data) +
-                    str(timestamp))
-        transaction_hash = hashlib.sha256(hash_str.encode()).hexdigest()
 
         transaction = DDosTransaction(
             self.verify_key_hex,
             timestamp,
             data,
-            self.signing_key.sign(transaction_hash.encode())
+            ''
         )
 
-        return transaction
+        return sign_transaction(transaction, self.signing_key)
 
     def change_operation(self, button: QRadioButton):
         """ Dis-/Enables specific widgets, according to the
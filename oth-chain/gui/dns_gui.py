@@ -1,4 +1,3 @@
-import hashlib
 import socket
 import sys
 import threading
@@ -10,7 +9,7 @@ from PyQt5 import QtCore
 from PyQt5.QtWidgets import QApplication, QSplitter, QWidget, QVBoxLayout, QTabWidget, QTreeWidget, \
     QTreeWidgetItem, QPushButton, QLineEdit, QGroupBox, QFormLayout, QLabel, QHBoxLayout, \
     QSpinBox, QComboBox, QRadioButton
-from chains import DNS_Transaction, DNS_Data
+from chains import DNS_Transaction, DNS_Data, sign_transaction
 from networking import Address
 from utils import Keystore
 
@@ -391,22 +390,15 @@ class TransactionWidget(GUI.TransactionWidget):
                 timestamp: The timestamp of when the transaction occurred.
                 dns_data: The DNS Operation included with the transaction.
         """
-        transaction_hash = hashlib. \
-            sha256((str(self.verify_key_hex) +
-                    str(recipient) + str(amount)
-                    + str(fee) +
-                    str(timestamp) + str(dns_data)).encode()).hexdigest()
-
         transaction = DNS_Transaction(self.verify_key_hex,
                                       recipient,
                                       amount,
                                       fee,
                                       timestamp,
                                       dns_data,
-                                      self.signing_key.sign(
-                                          transaction_hash.encode())
+                                      ''
                                       )
-        return transaction
+        return sign_transaction(transaction, self.signing_key)
 
     def send_operation(self):
         """ Reads the values from the widgets in the dns_form
@@ -1,3 +1,3 @@
-from .networking import Address, SERVER, PEERS, pack_msg, unpack_msg, process_incoming_msg, send_msg, worker
+from .networking import Address, SERVER, PEERS, INVENTORY, PAYLOADS, pack_msg, unpack_msg, process_incoming_msg, send_msg, worker
 from .ext_udp import ExtendedUDP
 from .peers import PeerManager
@@ -3,14 +3,179 @@
 Allows for sending and receiving of messages
 that are bigger than the buffersize.
 
-Does not handle out-of-order messages.
+Messages are split into fragments, every datagram starts with
+a fragment header:
+
+    marker (b'F'), message id, fragment index, fragment count,
+    length of the message
+
+All fragments except the last one have the same size,
+so every fragment is copied to its position in a preallocated
+buffer, independent of the order of arrival.
+Several messages per peer can be reassembled at the same time.
+Incomplete messages are dropped after REASSEMBLY_TIMEOUT seconds
+or if the peer exceeds its memory limits.
+
+Optional reliability (reliable=True): fragments are sent with the
+marker b'R' and kept by the sender for a while.
+The receiver reports the missing fragments of an incomplete message
+(NACK, after NACK_DELAY seconds without new fragments),
+only these fragments are sent again.
+Complete messages are acknowledged (ACK).
+The gap between the bursts of fragments sent to a peer grows
+with every NACK and shrinks with every ACK of a message without loss.
+
+The datagram size is configured per node (buffersize),
+messages to a peer use the smaller size of the node and the peer
+(announced by the peer, DEFAULT_DATAGRAM_SIZE until then).
+
+With an asyncio event loop (start()), datagrams are received by
+ExtendedUDPProtocol and sent with the transport of the loop,
+the pacing schedules the bursts of fragments instead of sleeping.
 """
 
+import asyncio
+import random
 import socket
-from typing import Dict, Tuple, Optional
+import struct
+import time
+from collections import OrderedDict
+from typing import (Any, Callable, Dict, Iterable, Iterator, List, Optional,
+                    Sequence, Tuple)
 
 Address = Tuple[str, int]
 
+# Marker, message id, fragment index, fragment count, message length
+FRAGMENT_HEADER = struct.Struct('!cIHHI')
+FRAGMENT_MARKER = b'F'
+RELIABLE_MARKER = b'R'
+
+# Marker, message id, number of missing fragment indices (then the indices)
+NACK_HEADER = struct.Struct('!cIH')
+NACK_MARKER = b'N'
+
+# Marker, message id
+ACK_HEADER = struct.Struct('!cI')
+ACK_MARKER = b'A'
+
+# Datagram size of peers that did not announce their size (bytes)
+DEFAULT_DATAGRAM_SIZE = 1024
+
+# Limits of the datagram size (bytes, maximum UDP payload over IPv4)
+MIN_DATAGRAM_SIZE = 512
+MAX_DATAGRAM_SIZE = 65507
+
+# Maximum number of datagrams received per wakeup of the event loop
+MAX_DRAINED_DATAGRAMS = 1024
+
+# Marker of unsplit messages of older nodes
+LEGACY_MARKER = b'0'
+
+# Seconds until an incomplete message is dropped
+REASSEMBLY_TIMEOUT = 10.0
+
+# Maximum number of incomplete messages per peer
+MAX_PENDING_MESSAGES = 16
+
+# Maximum size of the incomplete messages per peer (bytes)
+MAX_PENDING_BYTES = 16 * 1024 * 1024
+
+# Seconds without new fragments until missing fragments are reported
+NACK_DELAY = 0.2
+
+# Maximum number of reports per message without new fragments
+MAX_NACKS = 5
+
+# Maximum number of sent messages kept for retransmissions
+MAX_SENT_MESSAGES = 32
+
+# Number of completed messages whose late fragments are ignored
+COMPLETED_MESSAGES = 256
+
+# Gap between bursts of fragments: added after loss, upper limit (seconds)
+PACING_STEP = 0.0005
+MAX_PACING = 0.01
+
+# Number of fragments sent without a gap
+PACING_BURST = 8
+
+
+class PartialMessage(object):
+    """ Message whose fragments are being received.
+
+    Args:
+        count: Number of fragments.
+        length: Length of the message.
+        created: Time of the first received fragment.
+        reliable: Report missing fragments to the sender?
+    """
+
+    def __init__(self, count: int, length: int, created: float,
+                 reliable: bool = False) -> None:
+        self.count = count
+        self.length = length
+        self.created = created
+        self.reliable = reliable
+        # Time of the latest fragment or report
+        self.updated = created
+        self.nacks = 0
+        self.buffer = bytearray(length)
+        self.view = memoryview(self.buffer)
+        self.received = bytearray(count)
+        self.missing = count
+        # Size of the fragments (except the last one)
+        self.stride: Optional[int] = None
+
+    def add(self, index: int, fragment: memoryview) -> bool:
+        """ Copy a fragment to its position in the message.
+
+        Args:
+            index: Index of the fragment.
+            fragment: Data of the fragment.
+
+        Returns:
+            False if the fragment does not fit the message.
+        """
+        size = len(fragment)
+        if index == self.count - 1:
+            # Only the last fragment can be shorter
+            offset = self.length - size
+        elif self.stride in (None, size):
+            self.stride = size
+            offset = index * size
+        else:
+            return False
+        if offset < 0 or offset + size > self.length:
+            return False
+        if not self.received[index]:
+            self.view[offset:offset + size] = fragment
+            self.received[index] = 1
+            self.missing -= 1
+        return True
+
+    @property
+    def complete(self) -> bool:
+        return self.missing == 0
+
+    def missing_indices(self) -> List[int]:
+        """ Indices of the fragments that were not received.
+        """
+        return [i for i in range(self.count) if not self.received[i]]
+
+
+class SentMessage(object):
+    """ Message kept by the sender for retransmissions.
+
+    Args:
+        datagrams: The datagrams of the message (shared by all receivers).
+        sent: Time of sending.
+    """
+
+    def __init__(self, datagrams: List[bytes], sent: float) -> None:
+        self.datagrams = datagrams
+        self.sent = sent
+        self.lossy = False
+
 
 class ExtendedUDP(object):
     """ Implementation of an extended UDP socket.
@@ -18,20 +183,83 @@ class ExtendedUDP(object):
     Can send/receive messages that are bigger
     than the buffersize.
 
-    Does not handle out-of-order messages.
-
     Call setup() before use and
     teardown() after use.
 
     Args:
-        buffersize: Buffersize of the socket. (default=1024)
+        buffersize: Maximum size of the datagrams. (default=1024)
+        reliable: Retransmit lost fragments? (default=False)
+        receive_buffer: SO_RCVBUF of the socket (None => system default)
+        send_buffer: SO_SNDBUF of the socket (None => system default)
     """
 
-    def __init__(self, buffersize: int = 1024) -> None:
+    def __init__(self, buffersize: int = 1024,
+                 reliable: bool = False,
+                 receive_buffer: Optional[int] = None,
+                 send_buffer: Optional[int] = None) -> None:
         self.buffersize = buffersize
+        self.reliable = reliable
+        self.receive_buffer = receive_buffer
+        self.send_buffer = send_buffer
         self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        self.received_data: Dict[Tuple[str, int], Tuple[bool, bytes]] = {}
         self.port = 6666
+        self.clock = time.monotonic
+        self.sleep = time.sleep
+        # call_later of the event loop (None => sleep between bursts)
+        self.call_later: Optional[Callable[..., Any]] = None
+        self.timeout = REASSEMBLY_TIMEOUT
+        self.max_pending_messages = MAX_PENDING_MESSAGES
+        self.max_pending_bytes = MAX_PENDING_BYTES
+        # Incomplete messages (address -> message id -> message)
+        self.partial_messages: Dict[
+            Address, Dict[int, PartialMessage]] = {}
+        # Messages kept for retransmissions ((address, id) -> message)
+        self.sent_messages: Dict[Tuple[Address, int], SentMessage] = \
+            OrderedDict()
+        self.completed: Dict[Tuple[Address, int], None] = OrderedDict()
+        # Gap between the bursts of fragments sent to a peer (seconds)
+        self.pacing: Dict[Address, float] = {}
+        # Datagram sizes announced by peers
+        self.peer_datagram_sizes: Dict[Address, int] = {}
+        # Random first id: ids of a restarted node don't match
+        # the completed messages of its previous run
+        self._next_id = random.getrandbits(32)
+        self._last_expiry = self.clock()
+        self._receive_buffer = bytearray(self.receive_size)
+        self.dropped = 0
+        self.retransmitted = 0
+
+    @property
+    def receive_size(self) -> int:
+        """ Maximum size of received datagrams
+            (peers send DEFAULT_DATAGRAM_SIZE until they know our size).
+        """
+        return max(self.buffersize, DEFAULT_DATAGRAM_SIZE)
+
+    @property
+    def fragment_size(self) -> int:
+        """ Size of the data of a fragment.
+        """
+        return self.buffersize - FRAGMENT_HEADER.size
+
+    def configure(self, buffersize: int,
+                  receive_buffer: Optional[int] = None,
+                  send_buffer: Optional[int] = None):
+        """ Change the sizes of the datagrams and socket buffers
+            (call before setup()).
+
+        Args:
+            buffersize: Maximum size of the datagrams.
+            receive_buffer: SO_RCVBUF of the socket (None => system default)
+            send_buffer: SO_SNDBUF of the socket (None => system default)
+        """
+        if not MIN_DATAGRAM_SIZE <= buffersize <= MAX_DATAGRAM_SIZE:
+            raise ValueError(f'Datagram size {buffersize} not in ' +
+                             f'[{MIN_DATAGRAM_SIZE}, {MAX_DATAGRAM_SIZE}]')
+        self.buffersize = buffersize
+        self.receive_buffer = receive_buffer
+        self.send_buffer = send_buffer
+        self._receive_buffer = bytearray(self.receive_size)
 
     def setup(self, port: int):
         """ Setup socket.
@@ -40,11 +268,139 @@ class ExtendedUDP(object):
             port: Port of the socket.
         """
         if isinstance(self.socket, socket.socket):
-            self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        self.socket.bind(('', port))
+            self.socket = self.create_socket(port)
+        else:
+            self.socket.bind(('', port))
         self.socket.settimeout(0.1)
+        self.reset(port)
+
+    async def start(self, port: int,
+                    on_message: Callable[[bytes, Address], Any]):
+        """ Setup socket for the running asyncio event loop.
+
+        Args:
+            port: Port of the socket.
+            on_message: Called with every complete message and its sender.
+
+        Returns:
+            The transport of the socket (closed by teardown()).
+        """
+        if isinstance(self.socket, socket.socket):
+            self.socket.close()
+        sock = self.create_socket(port)
+        sock.setblocking(False)
+        loop = asyncio.get_running_loop()
+        transport, _ = await loop.create_datagram_endpoint(
+            lambda: ExtendedUDPProtocol(self, sock, on_message), sock=sock)
+        self.socket = transport
+        self.call_later = loop.call_later
+        self.reset(port)
+        return transport
+
+    def create_socket(self, port: int) -> socket.socket:
+        """ Create a bound UDP socket with the configured buffer sizes.
+
+        Args:
+            port: Port of the socket.
+        """
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        if self.receive_buffer:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF,
+                            self.receive_buffer)
+        if self.send_buffer:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF,
+                            self.send_buffer)
+        sock.bind(('', port))
+        return sock
+
+    def reset(self, port: int):
+        """ Forget the state of the previous socket.
+
+        Args:
+            port: Port of the new socket.
+        """
         self.port = port
-        self.received_data.clear()
+        self.partial_messages.clear()
+        self.sent_messages.clear()
+        self.completed.clear()
+        self.pacing.clear()
+        self.peer_datagram_sizes.clear()
+
+    def datagram_size(self, address: Address) -> int:
+        """ Size of the datagrams sent to a peer.
+
+        Args:
+            address: Address of the peer.
+        """
+        return min(self.buffersize, self.peer_datagram_sizes.get(
+            address, DEFAULT_DATAGRAM_SIZE))
+
+    def peer_datagram_size(self, address: Address, size: Any):
+        """ Set the datagram size announced by a peer.
+
+        Args:
+            address: Address of the peer.
+            size: Announced size (invalid sizes are ignored).
+        """
+        if isinstance(size, int) and not isinstance(size, bool) and \
+                MIN_DATAGRAM_SIZE <= size <= MAX_DATAGRAM_SIZE:
+            self.peer_datagram_sizes[address] = size
+
+    def fragment_count(self, length: int, size: Optional[int] = None) -> int:
+        """ Number of fragments of a message.
+
+        Args:
+            length: Length of the message.
+            size: Size of the fragments (default: fragment_size).
+        """
+        count = max(1, -(-length // (size or self.fragment_size)))
+        if count > 0xFFFF:
+            raise ValueError(f'Message too long ({length} bytes)')
+        return count
+
+    def new_message_id(self) -> int:
+        """ Id for the next sent message.
+        """
+        msg_id = self._next_id
+        self._next_id = (self._next_id + 1) & 0xFFFFFFFF
+        return msg_id
+
+    def fragment(self, msg: bytes, msg_id: int,
+                 index: int, count: int, size: int) -> bytes:
+        """ Create the datagram of a fragment.
+
+        Args:
+            msg: The message.
+            msg_id: Id of the message.
+            index: Index of the fragment.
+            count: Number of fragments.
+            size: Size of the fragments.
+
+        Returns:
+            The datagram (fragment header + fragment).
+        """
+        marker = RELIABLE_MARKER if self.reliable and count > 1 \
+            else FRAGMENT_MARKER
+        return FRAGMENT_HEADER.pack(marker, msg_id, index, count,
+                                    len(msg)) + \
+            memoryview(msg)[index * size:(index + 1) * size]
+
+    def fragments(self, msg: bytes,
+                  size: Optional[int] = None) -> Iterator[bytes]:
+        """ Split a message into datagrams.
+
+        Args:
+            msg: Message to split.
+            size: Size of the fragments (default: fragment_size).
+
+        Returns:
+            The datagrams (fragment header + fragment).
+        """
+        size = size or self.fragment_size
+        count = self.fragment_count(len(msg), size)
+        msg_id = self.new_message_id()
+        for index in range(count):
+            yield self.fragment(msg, msg_id, index, count, size)
 
     def send_msg(self, msg: bytes, address: Address):
         """ Send message to the address.
@@ -53,26 +409,66 @@ class ExtendedUDP(object):
             msg: Message to send.
             address: Address to send the message to.
         """
-        if len(msg) < self.buffersize:
-            # Simple message
-            self.socket.sendto(b'0' + msg, address)
-        else:
-            # Longer message (maybe take bytes_send into consideration?)
-            index = (self.buffersize - 1) - 1
-            # Send first part
-            self.socket.sendto(b'1' + msg[0:index], address)
-            # Send intermediate parts
-            while index + (self.buffersize - 1) < len(msg):
-                self.socket.sendto(
-                    b'2' + msg[index:index + (self.buffersize - 1)], address)
-                index += (self.buffersize - 1)
-            # Send last part
-            self.socket.sendto(b'3' + msg[index:], address)
+        self.send_many(msg, [address])
+
+    def send_many(self, msg: bytes, addresses: Iterable[Address]):
+        """ Send a message to several addresses.
+
+        The message is split once per datagram size,
+        all addresses with the same size get the same datagrams.
+
+        Args:
+            msg: Message to send.
+            addresses: Addresses to send the message to.
+        """
+        msg_id = self.new_message_id()
+        datagrams_by_size: Dict[int, List[bytes]] = {}
+        for address in addresses:
+            size = self.datagram_size(address) - FRAGMENT_HEADER.size
+            datagrams = datagrams_by_size.get(size)
+            if datagrams is None:
+                count = self.fragment_count(len(msg), size)
+                datagrams = [self.fragment(msg, msg_id, index, count, size)
+                             for index in range(count)]
+                datagrams_by_size[size] = datagrams
+            if self.reliable and len(datagrams) > 1:
+                self.sent_messages[(address, msg_id)] = \
+                    SentMessage(datagrams, self.clock())
+                while len(self.sent_messages) > MAX_SENT_MESSAGES:
+                    self.sent_messages.popitem(last=False)
+            self.send_datagrams(datagrams, address)
+
+    def send_datagrams(self, datagrams: Sequence[bytes], address: Address):
+        """ Send datagrams (paced for the address).
+
+        Args:
+            datagrams: The datagrams.
+            address: Address to send the datagrams to.
+        """
+        gap = self.pacing.get(address, 0)
+        if not gap:
+            sendto = self.socket.sendto
+            for datagram in datagrams:
+                sendto(datagram, address)
+            return
+        for start in range(0, len(datagrams), PACING_BURST):
+            if start:
+                if self.call_later is not None:
+                    self.call_later(gap, self.send_datagrams,
+                                    datagrams[start:], address)
+                    return
+                self.sleep(gap)
+            for datagram in datagrams[start:start + PACING_BURST]:
+                self.socket.sendto(datagram, address)
 
     def teardown(self):
         """ Closes socket.
         """
         self.socket.close()
+        if self.call_later is not None:
+            # Transport of an event loop, allow setup() again
+            self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self.call_later = None
 
     def receive_msg(self) -> Optional[Tuple[bytes, Address]]:
         """ Try to receive message.
@@ -81,42 +477,243 @@ class ExtendedUDP(object):
             None if no new message.
             (Message, Address) if new message.
         """
+        if self.reliable:
+            self.report_missing()
         try:
-            msg_in, address = self.socket.recvfrom(self.buffersize)
-            if msg_in[0:1] == b'0':
-                # unsplit message
-                self.received_data[address] = (True, msg_in[1:])
-            elif msg_in[0:1] == b'1':
-                # beginning of split message
-                if address in self.received_data.keys():
-                    # remove old unfinished message
-                    self.received_data.pop(address)
-                self.received_data[address] = (False, msg_in[1:])
-            elif msg_in[0:1] == b'2':
-                # middle of split message
-                if (address in self.received_data.keys() and
-                        self.received_data[address][0] is False):
-                    self.received_data[address] = (
-                        False, self.received_data[address][1] + msg_in[1:])
-            elif msg_in[0:1] == b'3':
-                # end of split message
-                if (address in self.received_data.keys() and
-                        self.received_data[address][0] is False):
-                    self.received_data[address] = (
-                        True, self.received_data[address][1] + msg_in[1:])
-            else:
-                # No useful message
-                if address in self.received_data.keys():
-                    # remove old unfinished message
-                    self.received_data.pop(address)
-
-            # check for finished message
-            for addr, (finished, msg) in self.received_data.items():
-                if finished:
-                    self.received_data.pop(addr)
-                    return msg, addr
-
+            size, address = self.socket.recvfrom_into(self._receive_buffer)
         except socket.error:
             return None
-        else:
+        return self.receive_datagram(
+            memoryview(self._receive_buffer)[:size], address)
+
+    def receive_datagram(self, datagram: memoryview,
+                         address: Address) -> Optional[Tuple[bytes, Address]]:
+        """ Add a received datagram to its message.
+
+        Args:
+            datagram: The datagram.
+            address: Sender of the datagram.
+
+        Returns:
+            None if no message is complete.
+            (Message, Address) if the message of the datagram is complete.
+        """
+        self.expire()
+        marker = datagram[0:1]
+        if marker == LEGACY_MARKER:
+            return bytes(datagram[1:]), address
+        if marker == NACK_MARKER:
+            self.receive_nack(datagram, address)
+            return None
+        if marker == ACK_MARKER:
+            self.receive_ack(datagram, address)
+            return None
+        if len(datagram) < FRAGMENT_HEADER.size or \
+                marker not in (FRAGMENT_MARKER, RELIABLE_MARKER):
+            # No useful message
             return None
+        _, msg_id, index, count, length = \
+            FRAGMENT_HEADER.unpack_from(datagram)
+        fragment = datagram[FRAGMENT_HEADER.size:]
+        if index >= count:
+            return None
+        if count == 1:
+            if len(fragment) != length:
+                return None
+            return bytes(fragment), address
+
+        reliable = self.reliable and marker == RELIABLE_MARKER
+        if (address, msg_id) in self.completed:
+            # Late retransmission
+            if reliable:
+                self.socket.sendto(
+                    ACK_HEADER.pack(ACK_MARKER, msg_id), address)
+            return None
+
+        messages = self.partial_messages.setdefault(address, OrderedDict())
+        message = messages.get(msg_id)
+        if message is not None and \
+                (message.count != count or message.length != length):
+            # Message id was reused
+            del messages[msg_id]
+            message = None
+        if message is None:
+            if length > self.max_pending_bytes or \
+                    length > count * (self.receive_size -
+                                      FRAGMENT_HEADER.size):
+                self.dropped += 1
+                return None
+            self.limit(messages, length)
+            message = PartialMessage(count, length, self.clock(), reliable)
+            messages[msg_id] = message
+
+        if not message.add(index, fragment):
+            return None
+        message.updated = self.clock()
+        message.nacks = 0
+        if not message.complete:
+            return None
+        del messages[msg_id]
+        if not messages:
+            del self.partial_messages[address]
+        if reliable:
+            self.completed[(address, msg_id)] = None
+            while len(self.completed) > COMPLETED_MESSAGES:
+                self.completed.popitem(last=False)
+            self.socket.sendto(ACK_HEADER.pack(ACK_MARKER, msg_id), address)
+        return bytes(message.buffer), address
+
+    def report_missing(self):
+        """ Send NACKs for the incomplete reliable messages
+            without new fragments for NACK_DELAY seconds.
+        """
+        now = self.clock()
+        for address, messages in self.partial_messages.items():
+            limit = (self.datagram_size(address) - NACK_HEADER.size) // 2
+            for msg_id, message in messages.items():
+                if not message.reliable or message.nacks >= MAX_NACKS or \
+                        now - message.updated < NACK_DELAY:
+                    continue
+                missing = message.missing_indices()[:limit]
+                message.updated = now
+                message.nacks += 1
+                self.socket.sendto(
+                    NACK_HEADER.pack(NACK_MARKER, msg_id, len(missing)) +
+                    struct.pack(f'!{len(missing)}H', *missing), address)
+
+    def receive_nack(self, datagram: memoryview, address: Address):
+        """ Send the missing fragments of a NACK again
+            and slow down the sending to the address.
+
+        Args:
+            datagram: The NACK.
+            address: Sender of the NACK.
+        """
+        if len(datagram) < NACK_HEADER.size:
+            return
+        _, msg_id, number = NACK_HEADER.unpack_from(datagram)
+        if len(datagram) < NACK_HEADER.size + 2 * number:
+            return
+        sent = self.sent_messages.get((address, msg_id))
+        if sent is None:
+            return
+        missing = [sent.datagrams[i] for i in struct.unpack_from(
+            f'!{number}H', datagram, NACK_HEADER.size)
+            if i < len(sent.datagrams)]
+        sent.lossy = True
+        self.pacing[address] = min(
+            MAX_PACING, max(PACING_STEP, 2 * self.pacing.get(address, 0)))
+        self.retransmitted += len(missing)
+        self.send_datagrams(missing, address)
+
+    def receive_ack(self, datagram: memoryview, address: Address):
+        """ Forget an acknowledged message,
+            speed up the sending to the address if nothing was lost.
+
+        Args:
+            datagram: The ACK.
+            address: Sender of the ACK.
+        """
+        if len(datagram) < ACK_HEADER.size:
+            return
+        _, msg_id = ACK_HEADER.unpack_from(datagram)
+        sent = self.sent_messages.pop((address, msg_id), None)
+        if sent is None or sent.lossy or address not in self.pacing:
+            return
+        self.pacing[address] /= 2
+        if self.pacing[address] < PACING_STEP:
+            del self.pacing[address]
+
+    def limit(self, messages: Dict[int, PartialMessage], length: int):
+        """ Drop the oldest incomplete messages of a peer
+            to make room for a new message.
+
+        Args:
+            messages: Incomplete messages of the peer.
+            length: Length of the new message.
+        """
+        pending = sum(m.length for m in messages.values())
+        while messages and (len(messages) >= self.max_pending_messages or
+                            pending + length > self.max_pending_bytes):
+            _, message = messages.popitem(last=False)
+            pending -= message.length
+            self.dropped += 1
+
+    def expire(self):
+        """ Drop the incomplete messages that timed out
+            (checked at most once per second).
+        """
+        now = self.clock()
+        if now - self._last_expiry < 1:
+            return
+        self._last_expiry = now
+        for key in [k for k, m in self.sent_messages.items()
+                    if now - m.sent >= self.timeout]:
+            del self.sent_messages[key]
+        for address in list(self.partial_messages):
+            messages = self.partial_messages[address]
+            for msg_id in [i for i, m in messages.items()
+                           if now - m.created >= self.timeout]:
+                del messages[msg_id]
+                self.dropped += 1
+            if not messages:
+                del self.partial_messages[address]
+
+
+class ExtendedUDPProtocol(asyncio.DatagramProtocol):
+    """ Receives the datagrams of an ExtendedUDP socket
+        in an asyncio event loop.
+
+    Every wakeup drains all pending datagrams of the socket
+    (at most MAX_DRAINED_DATAGRAMS).
+
+    Args:
+        udp: The extended UDP socket.
+        sock: The non-blocking socket of the transport.
+        on_message: Called with every complete message and its sender.
+    """
+
+    def __init__(self, udp: ExtendedUDP, sock: socket.socket,
+                 on_message: Callable[[bytes, Address], Any]) -> None:
+        self.udp = udp
+        self.sock = sock
+        self.on_message = on_message
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    def connection_made(self, transport):
+        self._loop = asyncio.get_running_loop()
+        if self.udp.reliable:
+            self.report_missing()
+
+    def connection_lost(self, exc):
+        if self._timer is not None:
+            self._timer.cancel()
+
+    def datagram_received(self, data: bytes, addr: Address):
+        self.receive(memoryview(data), addr)
+        buffer = self.udp._receive_buffer
+        for _ in range(MAX_DRAINED_DATAGRAMS - 1):
+            try:
+                size, addr = self.sock.recvfrom_into(buffer)
+            except OSError:
+                # Includes BlockingIOError (no pending datagram)
+                break
+            self.receive(memoryview(buffer)[:size], addr)
+
+    def error_received(self, exc):
+        pass  # e.g. ICMP port unreachable of a peer, ignore!
+
+    def receive(self, datagram: memoryview, address: Address):
+        """ Add a datagram to its message, pass on complete messages.
+        """
+        result = self.udp.receive_datagram(datagram, address)
+        if result is not None:
+            self.on_message(*result)
+
+    def report_missing(self):
+        """ Report missing fragments every NACK_DELAY / 2 seconds.
+        """
+        self.udp.report_missing()
+        self._timer = self._loop.call_later(NACK_DELAY / 2,
+                                            self.report_missing)
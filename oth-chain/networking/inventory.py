@@ -0,0 +1,205 @@
+""" Inventory based relay of transactions.
+
+Instead of broadcasting every transaction to all peers,
+nodes announce the ids of new transactions:
+
+    ('N_inv', [<id>, ...])
+
+Peers request the transactions they have not seen:
+
+    ('N_get_tx', [<id>, ...])
+
+and receive them as new_transaction messages.
+The ids of valid transactions (announced by the blockchain)
+are kept in a bounded cache, so duplicates are dropped by the
+networker before they reach the blockchain (and its signature checks).
+Received transactions that are not announced within the request
+timeout (e.g. invalid ones) are accepted again.
+"""
+
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List
+
+# Number of transaction ids kept in the seen cache
+SEEN_CACHE_SIZE = 50000
+
+# Number of announced transactions kept to answer requests
+RELAY_CACHE_SIZE = 5000
+
+# Seconds until an unanswered transaction is requested again
+# (and an unannounced transaction is received again)
+REQUEST_TIMEOUT = 5.0
+
+# Maximum number of ids per N_inv/N_get_tx message
+MAX_INV_IDS = 100
+
+
+def transaction_id(transaction: Any) -> str:
+    """ Id of a transaction in N_inv/N_get_tx messages.
+
+    Args:
+        transaction: The transaction.
+
+    Returns:
+        Hex of the transaction digest.
+    """
+    return transaction.digest.hex()
+
+
+class SeenCache(object):
+    """ Bounded set of ids, the oldest ids are removed first.
+
+    Args:
+        max_size: Maximum number of ids.
+    """
+
+    def __init__(self, max_size: int = SEEN_CACHE_SIZE):
+        self.max_size = max_size
+        self._ids: Dict[Any, None] = OrderedDict()
+
+    def __contains__(self, item: Any) -> bool:
+        return item in self._ids
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def add(self, item: Any) -> bool:
+        """ Add an id.
+
+        Args:
+            item: The id.
+
+        Returns:
+            True if the id was not seen before.
+        """
+        if item in self._ids:
+            return False
+        self._ids[item] = None
+        while len(self._ids) > self.max_size:
+            self._ids.popitem(last=False)
+        return True
+
+
+class Inventory(object):
+    """ Transactions seen, announced and requested by the node.
+
+    Args:
+        seen_size: Number of ids kept in the seen cache.
+        relay_size: Number of transactions kept to answer requests.
+        timeout: Seconds until a transaction is requested
+            (or received) again.
+        clock: Source of the current time.
+    """
+
+    def __init__(self,
+                 seen_size: int = SEEN_CACHE_SIZE,
+                 relay_size: int = RELAY_CACHE_SIZE,
+                 timeout: float = REQUEST_TIMEOUT,
+                 clock: Callable[[], float] = time.monotonic):
+        self.seen = SeenCache(seen_size)
+        self.relay_size = relay_size
+        self.timeout = timeout
+        self.clock = clock
+        self._relay: Dict[str, Any] = OrderedDict()
+        self._requested: Dict[str, float] = OrderedDict()
+        # Received transactions that are validated by the blockchain
+        self._validating: Dict[str, float] = OrderedDict()
+        self._pending: List[str] = []
+        self.duplicates = 0
+
+    def announce(self, transaction: Any):
+        """ Queue the announcement of a transaction
+            (sent with the next flush).
+
+        Args:
+            transaction: The transaction.
+        """
+        tx_id = transaction_id(transaction)
+        self.seen.add(tx_id)
+        self._validating.pop(tx_id, None)
+        self._relay[tx_id] = transaction
+        self._relay.move_to_end(tx_id)
+        while len(self._relay) > self.relay_size:
+            self._relay.popitem(last=False)
+        self._pending.append(tx_id)
+
+    def flush(self) -> List[List[str]]:
+        """ Take the queued announcements.
+
+        Returns:
+            The ids of the queued announcements
+            (in lists of at most MAX_INV_IDS ids).
+        """
+        pending, self._pending = self._pending, []
+        return [pending[i:i + MAX_INV_IDS]
+                for i in range(0, len(pending), MAX_INV_IDS)]
+
+    def wanted(self, tx_ids: List[str]) -> List[str]:
+        """ Select the announced ids that should be requested.
+
+        Args:
+            tx_ids: Announced ids.
+
+        Returns:
+            Ids that were not seen, received or requested (recently).
+        """
+        now = self.clock()
+        self._expire(self._requested, now)
+        self._expire(self._validating, now)
+
+        wanted = []
+        for tx_id in tx_ids[:MAX_INV_IDS]:
+            if tx_id in self.seen or tx_id in self._requested or \
+                    tx_id in self._validating:
+                continue
+            self._requested[tx_id] = now
+            wanted.append(tx_id)
+        return wanted
+
+    def get(self, tx_ids: List[str]) -> List[Any]:
+        """ Get announced transactions.
+
+        Args:
+            tx_ids: Requested ids.
+
+        Returns:
+            The known transactions of the ids.
+        """
+        return [self._relay[tx_id] for tx_id in tx_ids[:MAX_INV_IDS]
+                if tx_id in self._relay]
+
+    def receive(self, transaction: Any) -> bool:
+        """ Check a received transaction.
+
+        The transaction is only marked as seen when the blockchain
+        announces it (after its validation).
+
+        Args:
+            transaction: The transaction.
+
+        Returns:
+            True if the transaction was not seen or received (recently).
+        """
+        tx_id = transaction_id(transaction)
+        self._requested.pop(tx_id, None)
+        now = self.clock()
+        self._expire(self._validating, now)
+        if tx_id in self.seen or tx_id in self._validating:
+            self.duplicates += 1
+            return False
+        self._validating[tx_id] = now
+        return True
+
+    def _expire(self, entries: Dict[str, float], now: float):
+        """ Remove the entries older than the timeout.
+
+        Args:
+            entries: Ids and their times (oldest first).
+            now: The current time.
+        """
+        while entries:
+            tx_id, added = next(iter(entries.items()))
+            if now - added < self.timeout:
+                break
+            del entries[tx_id]
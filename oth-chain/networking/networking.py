@@ -5,16 +5,19 @@ in the blockchain network, as well as interpret incoming messages
 """
 
 
+import asyncio
 import sys
-import time
+import threading
 from pprint import pprint
 from queue import Empty, Queue
-from typing import Any, Tuple
+from typing import Any, Callable, List, Tuple
 
 import serializer
 from utils import print_debug_info
 
 from .ext_udp import ExtendedUDP
+from .inventory import Inventory
+from .payload_cache import PayloadCache
 from .peers import PeerManager
 
 Address = Tuple[str, int]
@@ -22,6 +25,8 @@ Address = Tuple[str, int]
 # Initialize
 PEERS = PeerManager()
 SERVER = ExtendedUDP(1024)
+INVENTORY = Inventory()
+PAYLOADS = PayloadCache(lambda msg: pack_msg(msg))
 
 
 def send_msg(msg_type: str, msg_data: Any, address: Address):
@@ -33,7 +38,7 @@ Args:
     address: Address to send message to
     """
 
-    message = pack_msg((msg_type, msg_data))
+    message = PAYLOADS.get(msg_type, msg_data)
 
     SERVER.send_msg(message, address)
 
@@ -41,12 +46,14 @@ Args:
 def broadcast(msg_type: str, msg_data: Any):
     """ Send message to all connected peers.
 
+    The message is serialized and split once for all peers.
+
     Args:
         msg_type: Type of the message.
         msg_data: Data of the message.
     """
-    for peer in PEERS.get_broadcast_peers():
-        send_msg(msg_type, msg_data, peer)
+    SERVER.send_many(PAYLOADS.get(msg_type, msg_data),
+                     PEERS.get_broadcast_peers())
 
 
 def unpack_msg(msg: bytes) -> Tuple[str, Any]:
@@ -98,15 +105,56 @@ def process_incoming_msg(msg: bytes, in_address: Address,
         elif msg_type == 'N_get_peers':
             get_peers(in_address)
         elif msg_type == 'N_ping':
-            send_msg('N_pong', '', in_address)
+            SERVER.peer_datagram_size(in_address, msg_data)
+            send_msg('N_pong', SERVER.buffersize, in_address)
         elif msg_type == 'N_pong':
-            pass  # Only needed for peer update. Ignore!
+            SERVER.peer_datagram_size(in_address, msg_data)
+        elif msg_type == 'N_inv':
+            wanted = INVENTORY.wanted(msg_data)
+            if wanted:
+                send_msg('N_get_tx', wanted, in_address)
+        elif msg_type == 'N_get_tx':
+            for transaction in INVENTORY.get(msg_data):
+                send_msg('new_transaction', transaction, in_address)
     else:
         # blockchain messages
+        if msg_type == 'new_transaction' and \
+                hasattr(msg_data, 'digest') and \
+                not INVENTORY.receive(msg_data):
+            print_debug_info('Dropped known transaction')
+            return
 
         receive_queue.put((msg_type, msg_data, in_address))
 
 
+def send_outgoing_msg(msg_type: str, msg_data: Any, address: Any):
+    """ Send a message of the blockchain.
+
+    Broadcast transactions are announced with N_inv (see inventory),
+    pings announce the datagram size of the node.
+
+    Args:
+        msg_type: Type of the message.
+        msg_data: Data of the message.
+        address: Address of the receiver or 'broadcast'.
+    """
+    if msg_type == 'N_ping':
+        msg_data = SERVER.buffersize
+    if address != 'broadcast':
+        send_msg(msg_type, msg_data, address)
+    elif msg_type == 'new_transaction':
+        INVENTORY.announce(msg_data)
+    else:
+        broadcast(msg_type, msg_data)
+
+
+def flush_inventory():
+    """ Broadcast the queued announcements of transactions.
+    """
+    for tx_ids in INVENTORY.flush():
+        broadcast('N_inv', tx_ids)
+
+
 def get_peers(address: Address):
     """ Send all known peers.
 
@@ -117,47 +165,88 @@ def get_peers(address: Address):
         send_msg('N_new_peer', peer, address)
 
 
-def example_worker(send_queue: Queue,
-                   receive_queue: Queue,
-                   command_queue: Queue):
-    """ Simple example of a networker.
+def process_command(cmd: str):
+    """ Process a command of the user.
 
     Args:
-        send_queue: Queue for messages to other nodes.
-        receive_queue: Queue for messages to the attached blockchain.
+        cmd: The command.
     """
+    if cmd == 'print_peers':
+        print('all peers:')
+        pprint(PEERS.get_all_peers())
+        print('active peers:')
+        pprint(PEERS.get_active_peers())
+
 
-    # Main loop
+def bridge(queue: Queue, loop: asyncio.AbstractEventLoop,
+           callback: Callable[[List[Any]], Any]):
+    """ Pass the items of a (thread-safe) queue to the event loop.
+
+    Blocks until items arrive, all waiting items are passed
+    with one call of the callback. Stops after None.
+
+    Args:
+        queue: The queue.
+        loop: The event loop.
+        callback: Called in the event loop with a list of items.
+    """
     while True:
+        items = [queue.get()]
         try:
-            cmd = command_queue.get(block=False)
-            if cmd == 'print_peers':
-                print('all peers:')
-                pprint(PEERS.get_all_peers())
-                print('active peers:')
-                pprint(PEERS.get_active_peers())
+            while items[-1] is not None:
+                items.append(queue.get_nowait())
         except Empty:
             pass
         try:
-            msg = send_queue.get(block=False)
-            if msg is None:
-                SERVER.teardown()
-                sys.exit()
-            msg_out_type, msg_out_data, msg_out_address = msg
-        except Empty:
-            pass
-        else:
-            if msg_out_address == 'broadcast':
-                broadcast(msg_out_type, msg_out_data)
-            else:
-                send_msg(msg_out_type, msg_out_data, msg_out_address)
+            loop.call_soon_threadsafe(callback, items)
+        except RuntimeError:
+            return  # Event loop is closed
+        if items[-1] is None:
+            return
+
 
-        received = SERVER.receive_msg()
-        if received:
-            process_incoming_msg(received[0], received[1], receive_queue)
+async def event_worker(send_queue: Queue,
+                       receive_queue: Queue,
+                       command_queue: Queue,
+                       port: int):
+    """ Networker based on an asyncio event loop.
 
-        time.sleep(0.01)  # Maybe use threading.Event()
-        # (https://stackoverflow.com/questions/29082268/python-time-sleep-vs-event-wait)
+    Incoming datagrams are handled as soon as they arrive,
+    the queues are read by bridge threads.
+    Returns after None was put on the send_queue.
+
+    Args:
+        send_queue: Queue for messages to other nodes.
+        receive_queue: Queue for messages to the attached blockchain.
+        command_queue: Queue for commands of the user.
+        port: Port of the node.
+    """
+    loop = asyncio.get_running_loop()
+    stopped = loop.create_future()
+
+    def send(messages: List[Any]):
+        for msg in messages:
+            if msg is None:
+                if not stopped.done():
+                    stopped.set_result(None)
+                return
+            send_outgoing_msg(*msg)
+        flush_inventory()
+
+    def run_commands(commands: List[Any]):
+        for cmd in commands:
+            process_command(cmd)
+
+    await SERVER.start(port, lambda msg, address: process_incoming_msg(
+        msg, address, receive_queue))
+    for queue, callback in ((send_queue, send),
+                            (command_queue, run_commands)):
+        threading.Thread(target=bridge, args=(queue, loop, callback),
+                         daemon=True).start()
+    try:
+        await stopped
+    finally:
+        SERVER.teardown()
 
 
 def worker(send_queue: Queue,
@@ -172,15 +261,13 @@ def worker(send_queue: Queue,
         receive_queue: Queue for messages to the attached blockchain.
     """
     print_debug_info("Started networking")
-    # Example:
-    # Find peers
-    # Main loop:
-    # - check send_queue (send new messages)
-    # - check incoming messages
+    # Main loop (see event_worker):
+    # - send_queue: send new messages
+    # - incoming messages
     #   -- networking message (e.g. new peer, get peers)
     #   -- Blockchain message: put on receive_queue
 
-    SERVER.setup(port)
     PEERS.setup(send_queue, gui_queue, port)
 
-    example_worker(send_queue, receive_queue, command_queue)
+    asyncio.run(event_worker(send_queue, receive_queue, command_queue, port))
+    sys.exit()
@@ -0,0 +1,80 @@
+""" Cache of encoded messages.
+
+Answers to repeated requests (e.g. the same block for several peers)
+and broadcasts are serialized once:
+the encoded payload is kept per message type and key (see payload_key).
+"""
+
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+# Number of encoded payloads kept per message type
+PAYLOAD_CACHE_SIZE = 16
+
+
+def payload_key(msg_type: str, msg_data: Any) -> Optional[Hashable]:
+    """ Key of the data of cacheable messages.
+
+    Args:
+        msg_type: Type of the message.
+        msg_data: Data of the message.
+
+    Returns:
+        The key or None if the message should not be cached.
+    """
+    if msg_type == 'new_block':
+        # Block (header determines the transactions)
+        return getattr(msg_data, 'header', None)
+    if msg_type == 'compact_block' and isinstance(msg_data, tuple):
+        # (header, short ids, prefilled transactions)
+        return msg_data[0]
+    if msg_type == 'headers' and isinstance(msg_data, list) and msg_data:
+        # Hash-linked headers (first, last and length determine the page)
+        return msg_data[0], msg_data[-1], len(msg_data)
+    return None
+
+
+class PayloadCache(object):
+    """ Encoded payloads of cacheable messages (see payload_key).
+
+    Args:
+        encode: Function that encodes a message (type, data).
+        max_size: Number of payloads kept per message type.
+    """
+
+    def __init__(self, encode: Callable[[Tuple[str, Any]], bytes],
+                 max_size: int = PAYLOAD_CACHE_SIZE):
+        self.encode = encode
+        self.max_size = max_size
+        self._payloads: Dict[str, Dict[Hashable, bytes]] = {}
+        self.hits = 0
+
+    def get(self, msg_type: str, msg_data: Any) -> bytes:
+        """ Get the encoded message (encode it if it isn't cached).
+
+        Args:
+            msg_type: Type of the message.
+            msg_data: Data of the message.
+
+        Returns:
+            The encoded message.
+        """
+        key = payload_key(msg_type, msg_data)
+        if key is None:
+            return self.encode((msg_type, msg_data))
+        payloads = self._payloads.setdefault(msg_type, OrderedDict())
+        payload = payloads.get(key)
+        if payload is not None:
+            self.hits += 1
+            payloads.move_to_end(key)
+            return payload
+        payload = self.encode((msg_type, msg_data))
+        payloads[key] = payload
+        while len(payloads) > self.max_size:
+            payloads.popitem(last=False)
+        return payload
+
+    def clear(self):
+        """ Remove all payloads.
+        """
+        self._payloads.clear()
@@ -0,0 +1,644 @@
+""" Benchmark module for the blockchain client,
+    contains benchmarks on synthetic chains
+    to compare the performance of different implementations.
+
+    Run from the oth-chain directory:
+        python -m tests.benchmark --balance [--blocks=<N>]
+        python -m tests.benchmark --validation [--blocks=<N>]
+        python -m tests.benchmark --mining [--blocks=<N>]
+        python -m tests.benchmark --startup [--blocks=<N>]
+        python -m tests.benchmark --sync [--blocks=<N>]
+        python -m tests.benchmark --relay [--blocks=<N>]
+        python -m tests.benchmark --datagram [--blocks=<N>]
+        python -m tests.benchmark --broadcast [--blocks=<N>]
+"""
+import getopt
+import heapq
+import itertools
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from queue import Queue
+
+import nacl.encoding
+import nacl.signing
+
+from chains import (Block, Header, PoW_Blockchain, Transaction,
+                    sign_transaction)
+from chains.block_download import DOWNLOAD_WINDOW, BlockDownloader
+from chains.block_store import BlockStore
+from chains.miner import Miner
+from networking import ExtendedUDP
+from networking.networking import pack_msg, unpack_msg
+from networking.payload_cache import PayloadCache
+
+VERSION = 0.7
+
+ACCOUNTS = [f'account_{i}' for i in range(10)]
+
+# Simulated network of the sync benchmark
+SYNC_PEERS = 4
+SYNC_BANDWIDTH = 1000000  # bytes/s sent/received per node
+SYNC_LATENCIES = [0.01, 0.02, 0.05, 0.1]  # seconds per direction
+
+DATAGRAM_SIZES = [1024, 4096, 8192, 16384, 32768, 65507]
+DATAGRAM_MESSAGE = 1024 * 1024  # bytes per message
+SOCKET_BUFFER = 4 * 1024 * 1024  # SO_RCVBUF/SO_SNDBUF
+
+BROADCAST_PEERS = [('127.0.0.1', 7000 + i) for i in range(50)]
+
+
+def create_synthetic_chain(blocks: int) -> OrderedDict:
+    """ Create a chain with a mining transaction and a transfer per block.
+
+    Transactions are not signed, the chain is only used for state lookups.
+
+    Args:
+        blocks: Number of blocks after the genesis block.
+
+    Returns:
+        The synthetic chain.
+    """
+    chain = OrderedDict()
+    chain[Header(0, 0, 768894480, 0, 0, 0)] = []
+    for index in range(1, blocks + 1):
+        miner = ACCOUNTS[index % len(ACCOUNTS)]
+        recipient = ACCOUNTS[(index + 1) % len(ACCOUNTS)]
+        transactions = [
+            Transaction(miner, recipient, 10, 1, index, 'Sign'),
+            Transaction('0', miner, 50, 0, index, '0')
+        ]
+        chain[Header(VERSION, index, index, index - 1, index, 0)] = \
+            transactions
+    return chain
+
+
+def scan_balance(chain: OrderedDict, key: str) -> int:
+    """ Balance calculation by iterating through the whole chain.
+
+    Reference for the ledger lookup.
+
+    Args:
+        chain: Chain to scan.
+        key: Key that identifies the user.
+
+    Returns:
+        The balance of the user.
+    """
+    balance = 0
+    for block_transactions in chain.values():
+        for transaction in block_transactions:
+            if transaction.sender == key:
+                balance -= transaction.amount + transaction.fee
+            if transaction.recipient == key:
+                balance += transaction.amount
+    return balance
+
+
+def measure(function, *args, repeat: int = 1):
+    """ Measure the average run time of a function.
+
+    Returns:
+        Tuple of (result of the last call, average time in seconds)
+    """
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = function(*args)
+    return result, (time.perf_counter() - start) / repeat
+
+
+def benchmark_balance(blocks: int = 100000):
+    """ Compare balance checks of a full-chain scan and of the ledger.
+    """
+    print(f'Creating synthetic chain with {blocks} blocks')
+    chain = create_synthetic_chain(blocks)
+
+    blockchain = PoW_Blockchain(VERSION, Queue(), Queue())
+    blockchain.chain = chain
+    _, rebuild_time = measure(blockchain.rebuild_state)
+    print(f'Ledger rebuild: {rebuild_time * 1000:.2f} ms')
+
+    key = ACCOUNTS[0]
+    scanned, scan_time = measure(scan_balance, chain, key, repeat=3)
+    looked_up, lookup_time = measure(
+        blockchain.check_balance, key, time.time(), repeat=10000)
+    assert scanned == looked_up
+
+    print(f'Full scan:      {scan_time * 1000:.3f} ms per balance check')
+    print(f'Ledger lookup:  {lookup_time * 1000:.6f} ms per balance check')
+    print(f'Speedup:        {scan_time / lookup_time:.0f}x')
+
+
+def create_signed_chain(blocks: int) -> OrderedDict:
+    """ Create a chain with a mining transaction and a signed transfer
+    per block.
+
+    Args:
+        blocks: Number of blocks after the genesis block.
+
+    Returns:
+        The synthetic chain.
+    """
+    keys = [nacl.signing.SigningKey(seed=bytes([i + 1]) * 32)
+            for i in range(len(ACCOUNTS))]
+    accounts = [k.verify_key.encode(nacl.encoding.HexEncoder) for k in keys]
+    chain = OrderedDict()
+    chain[Header(0, 0, 768894480, 0, 0, 0)] = []
+    for index in range(1, blocks + 1):
+        sender = index % len(accounts)
+        recipient = accounts[(index + 1) % len(accounts)]
+        transactions = [
+            sign_transaction(Transaction(accounts[sender], recipient,
+                                         10, 1, index, ''), keys[sender]),
+            Transaction('0', accounts[sender], 50, 0, index - 0.5, '0')
+        ]
+        chain[Header(VERSION, index, index, index - 1, index, 0)] = \
+            transactions
+    return chain
+
+
+def validate_chain(blockchain: PoW_Blockchain, chain: OrderedDict) -> bool:
+    """ Validate the transactions of a chain with the two-stage pipeline.
+
+    Args:
+        blockchain: Chain used for the validation (with the state of chain).
+        chain: Chain whose transactions are validated.
+
+    Returns:
+        The validity of all transactions.
+    """
+    blockchain.signature_cache.clear()
+    blockchain.verify_signatures(
+        t for transactions in chain.values() for t in transactions)
+    return all(blockchain.validate_transaction(t, True, mining=True)
+               for transactions in chain.values()
+               for t in transactions if t.sender != '0')
+
+
+def benchmark_validation(blocks: int = 10000):
+    """ Compare the validation of a chain with different worker counts.
+    """
+    print(f'Creating signed synthetic chain with {blocks} blocks')
+    chain = create_signed_chain(blocks)
+
+    sequential = None
+    for workers in (0, 1, 2, 4, 8):
+        blockchain = PoW_Blockchain(VERSION, Queue(), Queue(), workers)
+        blockchain.chain = chain
+        blockchain.rebuild_state()
+        if workers:
+            # Start the worker processes before measuring
+            blockchain.verify_signatures(next(iter(chain.values()), []))
+            blockchain.validation.executor.submit(int).result()
+        valid, validation_time = measure(validate_chain, blockchain, chain)
+        blockchain.validation.shutdown()
+        assert valid
+
+        if sequential is None:
+            sequential = validation_time
+            print(f'Chain thread only: {validation_time:.2f} s')
+        else:
+            print(f'{workers} workers:        {validation_time:.2f} s' +
+                  f' (speedup {sequential / validation_time:.2f}x)')
+
+
+def benchmark_mining(blocks: int = 20):
+    """ Compare the hash rate of the nonce loop and of the miner.
+    """
+    blockchain = PoW_Blockchain(VERSION, Queue(), Queue())
+    miner_key = ACCOUNTS[0].encode()
+    last_blocks = [Block(Header(VERSION, 3000, 0, 0, 0, proof), [])
+                   for proof in range(blocks)]
+
+    def nonce_loop():
+        hashes = 0
+        for last_block in last_blocks:
+            proof = 0
+            while not blockchain.validate_proof(last_block, proof,
+                                                miner_key):
+                proof += 1
+            hashes += proof + 1
+        return hashes
+
+    hashes, loop_time = measure(nonce_loop)
+    print(f'Nonce loop:  {hashes / loop_time:.0f} hashes/s')
+
+    for threads in (1, 2, 4, 8):
+        miner = Miner(threads)
+        miner.search(0, miner_key, 1)  # start the processes
+        rates = []
+        for last_block in last_blocks:
+            proof = miner.search(
+                last_block.header.proof, miner_key,
+                blockchain.scale_difficulty(last_block))
+            assert blockchain.validate_proof(last_block, proof, miner_key)
+            rates.append(miner.hashes_per_second)
+        miner.shutdown()
+        print(f'{threads} threads:   {sum(rates) / len(rates):.0f} hashes/s')
+
+
+def benchmark_startup(blocks: int = 100000):
+    """ Compare the startup with and without state snapshot.
+    """
+    print(f'Creating synthetic chain with {blocks} blocks')
+    chain = create_synthetic_chain(blocks)
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'blocks')
+        store = BlockStore(path)
+        store.import_chain(chain)
+        store.close()
+
+        def start():
+            return PoW_Blockchain(VERSION, Queue(), Queue(),
+                                  store_directory=path)
+
+        blockchain, rebuild_time = measure(start)
+        print(f'Without snapshot: {rebuild_time:.2f} s')
+
+        # Closing writes the snapshot
+        blockchain.close()
+        loaded, snapshot_time = measure(start)
+        assert loaded.ledger.balances == blockchain.ledger.balances
+        loaded.close()
+        print(f'With snapshot:    {snapshot_time:.2f} s')
+
+
+class SyncChain(PoW_Blockchain):
+    """ Chain with proofs that are always valid,
+    used to create synthetic chains that pass the block validation.
+    """
+
+    def validate_proof(self, last_block: Block,
+                       proof: int, miner_key: bytes) -> bool:
+        return True
+
+
+def create_sync_chain(blocks: int) -> SyncChain:
+    """ Create a chain whose blocks contain the mining transaction.
+
+    Args:
+        blocks: Number of blocks after the genesis block.
+
+    Returns:
+        The chain.
+    """
+    chain = SyncChain(VERSION, Queue(), Queue())
+    for index in range(1, blocks + 1):
+        multiplicator = index // 10 - 1
+        reward = 50 >> 2 ** multiplicator if multiplicator >= 0 else 50
+        mining_transaction = Transaction(
+            '0', ACCOUNTS[index % len(ACCOUNTS)], reward, 0, time.time(), '0')
+        chain.new_block(chain.create_block(0, [mining_transaction]))
+    assert len(chain.chain) == blocks + 1
+    return chain
+
+
+def simulate_sync(source: SyncChain, scheduled: bool):
+    """ Sync a new node with peers that all have the source chain.
+
+    Answers are sent with the bandwidth of the peer
+    and share the bandwidth of the syncing node.
+    Answers that are in flight when the node is synced are still counted.
+
+    Args:
+        source: Chain of the peers.
+        scheduled: Use the download scheduler (False => every
+            block is requested from all peers at once).
+
+    Returns:
+        Tuple of (simulated sync time in seconds, received bytes,
+        number of received blocks)
+    """
+    node = SyncChain(VERSION, Queue(), Queue())
+    now = [0.0]
+    window = DOWNLOAD_WINDOW if scheduled else len(source.chain)
+    node.downloader = BlockDownloader(node.send_queue, window,
+                                      clock=lambda: now[0])
+    if scheduled:
+        for peer in range(SYNC_PEERS):
+            node.downloader.add_peer(peer)
+
+    node.resolve_conflict(source.get_header_chain())
+    answers: list = []
+    order = itertools.count()
+    uplink_free = [0.0] * SYNC_PEERS
+    downlink_free = 0.0
+    received_bytes = 0
+    received_blocks = 0
+    sync_time = None
+    while True:
+        while not node.send_queue.empty():
+            msg_type, msg_data, address = node.send_queue.get_nowait()
+            if msg_type != 'get_block':
+                continue
+            block = source.get_block(msg_data)
+            size = len(pack_msg(('new_block', block)))
+            peers = range(SYNC_PEERS) if address == 'broadcast' \
+                else [address]
+            for peer in peers:
+                latency = SYNC_LATENCIES[peer]
+                uplink_free[peer] = max(uplink_free[peer],
+                                        now[0] + latency) + \
+                    size / SYNC_BANDWIDTH
+                heapq.heappush(answers, (uplink_free[peer] + latency,
+                                         next(order), size, block))
+        if not answers:
+            break
+        arrival, _, size, block = heapq.heappop(answers)
+        downlink_free = max(downlink_free, arrival) + size / SYNC_BANDWIDTH
+        now[0] = downlink_free
+        received_bytes += size
+        received_blocks += 1
+        node.new_block(block)
+        if sync_time is None and \
+                node.latest_header() == source.latest_header():
+            sync_time = now[0]
+    assert sync_time is not None
+    return sync_time, received_bytes, received_blocks
+
+
+def benchmark_sync(blocks: int = 500):
+    """ Compare the sync of a new node with blocks requested
+    from all peers and with the download scheduler.
+    """
+    print(f'Creating chain with {blocks} blocks')
+    source = create_sync_chain(blocks)
+
+    print(f'{SYNC_PEERS} peers, latencies {SYNC_LATENCIES} s,' +
+          f' {SYNC_BANDWIDTH} bytes/s')
+    for name, scheduled in (('Broadcast', False), ('Scheduled', True)):
+        sync_time, received_bytes, received_blocks = \
+            simulate_sync(source, scheduled)
+        print(f'{name}: {sync_time:.2f} s, {received_bytes} bytes,' +
+              f' {received_blocks} blocks received')
+
+
+def create_relay_nodes(transactions: int):
+    """ Create two nodes with the same chain
+    and a pool of signed transactions at the first node.
+
+    Args:
+        transactions: Number of pool transactions.
+
+    Returns:
+        Tuple of (sender node, receiver node, pool transactions)
+    """
+    keys = [nacl.signing.SigningKey(seed=bytes([i + 1]) * 32)
+            for i in range(len(ACCOUNTS))]
+    accounts = [k.verify_key.encode(nacl.encoding.HexEncoder) for k in keys]
+    sender = SyncChain(VERSION, Queue(), Queue())
+    receiver = SyncChain(VERSION, Queue(), Queue())
+    for index in range(1, len(accounts)):
+        reward = Transaction('0', accounts[index], 50, 0, time.time(), '0')
+        block = sender.create_block(0, [reward])
+        sender.new_block(block)
+        receiver.new_block(block)
+
+    pool = []
+    for number in range(transactions):
+        index = number % (len(accounts) - 1) + 1
+        pool.append(sign_transaction(
+            Transaction(accounts[index], accounts[0], 1, 0,
+                        time.time(), ''), keys[index]))
+        sender.new_transaction(pool[-1])
+    return sender, receiver, pool
+
+
+def relay_block(sender: SyncChain, receiver: SyncChain, compact: bool):
+    """ Announce a new block of the sender to the receiver
+    and deliver the messages until the receiver has the block.
+
+    Every message takes the latency of the link plus the time to
+    transfer it, the processing time of the nodes is measured.
+
+    Returns:
+        Tuple of (propagation latency in seconds, received bytes)
+    """
+    receiver.fetcher.compact = compact
+    for node in (sender, receiver):
+        while not node.send_queue.empty():
+            node.send_queue.get_nowait()
+
+    latency = 0.0
+    received_bytes = 0
+    message = ('new_header', sender.latest_header(), 'sender')
+    while receiver.latest_header() != sender.latest_header():
+        msg_type, msg_data, address = message
+        target = receiver if address == 'sender' else sender
+        packed = pack_msg((msg_type, msg_data))
+        if target is receiver:
+            received_bytes += len(packed)
+        latency += SYNC_LATENCIES[0] + len(packed) / SYNC_BANDWIDTH
+
+        start = time.perf_counter()
+        msg_type, msg_data = unpack_msg(packed)
+        target.process_message((msg_type, msg_data, address))
+        latency += time.perf_counter() - start
+
+        answers = [m for m in iter_queue(target.send_queue)
+                   if m[0] not in ('new_header', 'new_transaction')]
+        if not answers:
+            break
+        msg_type, msg_data, _ = answers[0]
+        message = (msg_type, msg_data,
+                   'receiver' if target is receiver else 'sender')
+    assert receiver.latest_header() == sender.latest_header()
+    return latency, received_bytes
+
+
+def iter_queue(queue: Queue):
+    """ Remove all messages of a queue.
+    """
+    while not queue.empty():
+        yield queue.get_nowait()
+
+
+def benchmark_relay(transactions: int = 200):
+    """ Compare the relay of a block as full block and as compact block
+    (with all and with 10% of the transactions missing at the receiver).
+    """
+    print(f'Relaying a block with {transactions} transactions,' +
+          f' latency {SYNC_LATENCIES[0]} s, {SYNC_BANDWIDTH} bytes/s')
+    for name, compact, known in (('Full block', False, 1.0),
+                                 ('Compact, all known', True, 1.0),
+                                 ('Compact, 10% missing', True, 0.9)):
+        sender, receiver, pool = create_relay_nodes(transactions)
+        for transaction in pool[:int(len(pool) * known)]:
+            receiver.new_transaction(transaction)
+        reward = Transaction('0', ACCOUNTS[0], 25, 0, time.time(), '0')
+        sender.new_block(sender.create_block(0, [reward]))
+
+        latency, received_bytes = relay_block(sender, receiver, compact)
+        print(f'{name}: {received_bytes} bytes,' +
+              f' {latency * 1000:.1f} ms')
+
+
+def transfer_messages(size: int, messages: int) -> float:
+    """ Send messages (one after another) between two reliable sockets
+    over loopback.
+
+    Args:
+        size: Datagram size of both sockets.
+        messages: Number of messages.
+
+    Returns:
+        Seconds until all messages were received.
+    """
+    sender, receiver = (ExtendedUDP(size, True, SOCKET_BUFFER, SOCKET_BUFFER)
+                        for _ in range(2))
+    sender.setup(0)
+    receiver.setup(0)
+    # Don't wait 0.1 s for retransmission requests after the last message
+    sender.socket.settimeout(0.001)
+    sender_address = ('127.0.0.1', sender.socket.getsockname()[1])
+    receiver_address = ('127.0.0.1', receiver.socket.getsockname()[1])
+    # Result of the negotiation with N_ping/N_pong
+    sender.peer_datagram_size(receiver_address, size)
+    receiver.peer_datagram_size(sender_address, size)
+
+    msg = os.urandom(DATAGRAM_MESSAGE)
+    received = threading.Event()
+
+    def receive():
+        for _ in range(messages):
+            while receiver.receive_msg() is None:
+                pass
+            received.set()
+
+    receiver_thread = threading.Thread(target=receive, daemon=True)
+    receiver_thread.start()
+    start = time.perf_counter()
+    for _ in range(messages):
+        received.clear()
+        sender.send_msg(msg, receiver_address)
+        deadline = time.perf_counter() + 10
+        while not received.is_set():
+            # Retransmissions
+            sender.receive_msg()
+            if time.perf_counter() > deadline:
+                raise RuntimeError(f'Message lost ({size} bytes datagrams)')
+    duration = time.perf_counter() - start
+    receiver_thread.join()
+    sender.teardown()
+    receiver.teardown()
+    return duration
+
+
+def benchmark_datagram(messages: int = 20):
+    """ Compare the loopback throughput of different datagram sizes.
+    """
+    print(f'Sending {messages} messages of {DATAGRAM_MESSAGE} bytes' +
+          ' over loopback')
+    for size in DATAGRAM_SIZES:
+        duration = transfer_messages(size, messages)
+        print(f'Datagrams of {size} bytes: {duration:.3f} s,' +
+              f' {messages * DATAGRAM_MESSAGE / duration / 1e6:.1f} MB/s')
+
+
+class NullSocket(object):
+    """ Socket that only counts the sent datagrams.
+    """
+
+    def __init__(self):
+        self.sent = 0
+
+    def sendto(self, datagram: bytes, address) -> int:
+        self.sent += 1
+        return len(datagram)
+
+    def close(self):
+        pass
+
+
+def send_per_peer(udp: ExtendedUDP, block: Block):
+    """ Serialize and split the block for every peer.
+    """
+    for peer in BROADCAST_PEERS:
+        udp.send_msg(pack_msg(('new_block', block)), peer)
+
+
+def send_once(udp: ExtendedUDP, block: Block):
+    """ Serialize and split the block once for all peers.
+    """
+    udp.send_many(PayloadCache(pack_msg).get('new_block', block),
+                  BROADCAST_PEERS)
+
+
+def send_cached(udp: ExtendedUDP, cache: PayloadCache, block: Block):
+    """ Answer the requests of all peers for the block (with a cache).
+    """
+    for peer in BROADCAST_PEERS:
+        udp.send_msg(cache.get('new_block', block), peer)
+
+
+def benchmark_broadcast(transactions: int = 200):
+    """ Compare sending a block to all peers
+    with and without serializing it once.
+    """
+    sender, _, pool = create_relay_nodes(transactions)
+    block = Block(sender.latest_header(), pool)
+    udp = ExtendedUDP()
+    udp.socket.close()
+    udp.socket = NullSocket()
+    print(f'Sending a block with {transactions} transactions' +
+          f' ({len(pack_msg(("new_block", block)))} bytes)' +
+          f' to {len(BROADCAST_PEERS)} peers')
+    for name, function, args in (
+            ('Per peer', send_per_peer, (udp, block)),
+            ('Broadcast once', send_once, (udp, block)),
+            ('Cached answers', send_cached,
+             (udp, PayloadCache(pack_msg), block))):
+        udp.socket.sent = 0
+        _, duration = measure(function, *args, repeat=5)
+        print(f'{name}: {duration * 1000:.1f} ms,' +
+              f' {udp.socket.sent // 5} datagrams')
+
+
+def main(argv=sys.argv):
+    """ Main function of the benchmark
+    """
+    blocks = None
+    benchmarks = []
+    try:
+        opts, _ = getopt.getopt(argv[1:], 'b=',
+                                ['blocks=', 'balance', 'validation',
+                                 'mining', 'startup', 'sync', 'relay',
+                                 'datagram', 'broadcast'])
+        for o, a in opts:
+            if o in ('-b', '--blocks'):
+                try:
+                    blocks = int(a)
+                except ValueError:
+                    print("Blocks was invalid (e.g. not an int)")
+            elif o == '--balance':
+                benchmarks.append(benchmark_balance)
+            elif o == '--validation':
+                benchmarks.append(benchmark_validation)
+            elif o == '--mining':
+                benchmarks.append(benchmark_mining)
+            elif o == '--startup':
+                benchmarks.append(benchmark_startup)
+            elif o == '--sync':
+                benchmarks.append(benchmark_sync)
+            elif o == '--relay':
+                benchmarks.append(benchmark_relay)
+            elif o == '--datagram':
+                benchmarks.append(benchmark_datagram)
+            elif o == '--broadcast':
+                benchmarks.append(benchmark_broadcast)
+    except getopt.GetoptError as err:
+        print(err)
+
+    for benchmark in benchmarks:
+        if blocks is None:
+            benchmark()
+        else:
+            benchmark(blocks)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+""" Local stand-in for UDP sockets that drops and reorders datagrams.
+"""
+
+import random
+import socket
+from typing import Dict, List, Tuple
+
+Address = Tuple[str, int]
+
+
+class LossyNetwork(object):
+    """ Delivers datagrams between lossy sockets.
+
+    Args:
+        loss: Probability that a datagram is dropped.
+        reorder: Probability that a datagram overtakes queued datagrams.
+        seed: Seed of the random decisions.
+    """
+
+    def __init__(self, loss: float = 0.0, reorder: float = 0.0,
+                 seed: int = 0) -> None:
+        self.loss = loss
+        self.reorder = reorder
+        self.random = random.Random(seed)
+        self.inboxes: Dict[Address, List[Tuple[bytes, Address]]] = {}
+        self.sent = 0
+        self.dropped = 0
+
+    def socket(self, address: Address) -> 'LossySocket':
+        """ Create a socket of the network.
+
+        Args:
+            address: Address of the socket.
+        """
+        self.inboxes[address] = []
+        return LossySocket(self, address)
+
+    def deliver(self, datagram: bytes, sender: Address, receiver: Address):
+        """ Queue a datagram for the receiver (or drop it).
+        """
+        self.sent += 1
+        inbox = self.inboxes.get(receiver)
+        if inbox is None or self.random.random() < self.loss:
+            self.dropped += 1
+            return
+        if inbox and self.random.random() < self.reorder:
+            inbox.insert(self.random.randrange(len(inbox)),
+                         (datagram, sender))
+        else:
+            inbox.append((datagram, sender))
+
+    @property
+    def idle(self) -> bool:
+        return not any(self.inboxes.values())
+
+
+class LossySocket(object):
+    """ Socket of a lossy network (API subset used by ExtendedUDP).
+    """
+
+    def __init__(self, network: LossyNetwork, address: Address) -> None:
+        self.network = network
+        self.address = address
+
+    def bind(self, address: Address):
+        pass
+
+    def settimeout(self, timeout: float):
+        pass
+
+    def close(self):
+        pass
+
+    def sendto(self, datagram: bytes, address: Address) -> int:
+        self.network.deliver(bytes(datagram), self.address, address)
+        return len(datagram)
+
+    def recvfrom_into(self, buffer: bytearray) -> Tuple[int, Address]:
+        inbox = self.network.inboxes[self.address]
+        if not inbox:
+            raise socket.timeout()
+        datagram, sender = inbox.pop(0)
+        size = min(len(datagram), len(buffer))
+        buffer[:size] = datagram[:size]
+        return size, sender
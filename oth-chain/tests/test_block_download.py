@@ -0,0 +1,135 @@
+""" Testing module for the block download scheduler.
+"""
+
+from queue import Queue
+
+from chains import Block
+from chains.block_download import BlockDownloader
+
+from . import test_header_sync
+from .test_block_store import create_block
+
+
+def requests(queue):
+    """ Remove the get_block requests of a queue.
+
+    Returns:
+        List of (index, peer) of the requests.
+    """
+    sent = []
+    while not queue.empty():
+        msg_type, header, peer = queue.get_nowait()
+        assert msg_type == 'get_block'
+        sent.append((header.index, peer))
+    return sent
+
+
+class TestBlockDownloader(object):
+    """ Testcase for the scheduling of the requests.
+    """
+
+    def setup(self):
+        """ Setup of a downloader with two peers and a fake clock.
+        """
+        self.now = 0.0
+        self.queue = Queue()
+        self.downloader = BlockDownloader(self.queue, window=2, timeout=5,
+                                          clock=lambda: self.now)
+        self.downloader.add_peer('a')
+        self.downloader.add_peer('b')
+        self.blocks = [Block(*create_block(i)) for i in range(1, 7)]
+
+    def test_window(self):
+        """ Test that every block is requested from one peer
+        and the windows are not exceeded.
+        """
+        self.downloader.start([b.header for b in self.blocks])
+
+        assert requests(self.queue) == [(1, 'a'), (2, 'a'),
+                                        (3, 'b'), (4, 'b')]
+
+        self.downloader.receive(self.blocks[0])
+
+        assert requests(self.queue) == [(5, 'a')]
+
+    def test_latency(self):
+        """ Test that faster peers are asked first.
+        """
+        self.downloader.start([b.header for b in self.blocks[:4]])
+        requests(self.queue)
+        self.now = 0.5
+        self.downloader.receive(self.blocks[2])
+        self.now = 3
+        self.downloader.receive(self.blocks[0])
+
+        self.downloader.start([b.header for b in self.blocks[4:]])
+
+        assert requests(self.queue) == [(5, 'b'), (6, 'b')]
+
+    def test_in_order(self):
+        """ Test that blocks are handed over in the order of the chain.
+        """
+        self.downloader.start([b.header for b in self.blocks[:3]])
+
+        assert self.downloader.receive(self.blocks[1]) == []
+        assert self.downloader.receive(self.blocks[0]) == self.blocks[:2]
+        assert self.downloader.receive(self.blocks[0]) == []
+        assert self.downloader.receive(self.blocks[2]) == self.blocks[2:3]
+        assert self.downloader.receive(self.blocks[3]) is None
+        assert not self.downloader.active
+
+    def test_timeout(self):
+        """ Test that stalled requests are reassigned to another peer.
+        """
+        self.downloader.window = 1
+        self.downloader.start([b.header for b in self.blocks[:2]])
+        requests(self.queue)
+        self.now = 1
+        self.downloader.receive(self.blocks[1])
+        requests(self.queue)
+
+        self.now = 5
+        self.downloader.tick()
+
+        assert requests(self.queue) == [(1, 'b')]
+        assert self.downloader.timeouts == 1
+        assert self.downloader.peers['a'] == 5
+
+    def test_unavailable(self):
+        """ Test that pruned blocks are requested from another peer.
+        """
+        self.downloader.start([b.header for b in self.blocks[:1]])
+        requests(self.queue)
+
+        self.downloader.unavailable(self.blocks[0].header, 'b')
+        assert requests(self.queue) == []
+
+        self.downloader.unavailable(self.blocks[0].header, 'a')
+        assert requests(self.queue) == [(1, 'b')]
+
+    def test_broadcast(self):
+        """ Test that blocks are broadcast if no peer is known.
+        """
+        downloader = BlockDownloader(self.queue, window=2)
+        downloader.start([b.header for b in self.blocks])
+
+        assert requests(self.queue) == [(1, 'broadcast'), (2, 'broadcast')]
+
+
+class TestScheduledSync(test_header_sync.SyncFixture):
+    """ Testcase for the sync with the download scheduler.
+    """
+
+    def test_sync(self):
+        """ Test that every missing block is requested once
+        from the peer that sent the headers.
+        """
+        self.blockchain.new_header(self.other.latest_header())
+
+        delivered = self.exchange()
+
+        assert self.blockchain.latest_block() == self.other.latest_block()
+        assert delivered.count('get_block') == 6
+        assert self.blockchain.downloader.requests == 6
+        assert list(self.blockchain.downloader.peers) == ['b']
+        assert not self.blockchain.downloader.active
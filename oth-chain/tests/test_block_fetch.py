@@ -0,0 +1,151 @@
+""" Testing module for the fetching of announced blocks.
+"""
+
+import itertools
+from queue import Queue
+
+from chains.block_fetch import BlockFetcher
+from core import received_messages
+
+from . import test_pow_chain
+from .test_block_download import requests
+from .test_block_store import create_block
+
+
+class TestBlockFetcher(object):
+    """ Testcase for the requests of announced blocks.
+    """
+
+    def setup(self):
+        """ Setup of a fetcher with a fake clock.
+        """
+        self.now = 0.0
+        self.queue = Queue()
+        self.fetcher = BlockFetcher(self.queue, timeout=2,
+                                    clock=lambda: self.now, compact=False)
+        self.header = create_block(1)[0]
+
+    def test_announcer(self):
+        """ Test that a block is only requested from the first announcer.
+        """
+        assert self.fetcher.announce(self.header, 'a')
+        assert not self.fetcher.announce(self.header, 'b')
+        assert not self.fetcher.announce(self.header, 'a')
+
+        assert requests(self.queue) == [(1, 'a')]
+
+        self.fetcher.receive(self.header)
+        self.now = 5
+        self.fetcher.tick()
+
+        assert requests(self.queue) == []
+        assert self.header not in self.fetcher
+
+    def test_timeout(self):
+        """ Test that the next announcer is asked after the timeout.
+        """
+        self.fetcher.announce(self.header, 'a')
+        self.fetcher.announce(self.header, 'b')
+        requests(self.queue)
+
+        self.now = 1
+        self.fetcher.tick()
+        assert requests(self.queue) == []
+
+        self.now = 2
+        self.fetcher.tick()
+        assert requests(self.queue) == [(1, 'b')]
+
+        self.now = 4
+        self.fetcher.tick()
+        assert requests(self.queue) == []
+        assert self.header not in self.fetcher
+
+    def test_compact(self):
+        """ Test that compact blocks are requested from announcers
+        and full blocks after the timeout.
+        """
+        self.fetcher.compact = True
+        self.fetcher.announce(self.header, 'a')
+
+        assert self.queue.get_nowait() == \
+            ('get_compact_block', self.header, 'a')
+
+        self.now = 2
+        self.fetcher.tick()
+
+        assert requests(self.queue) == [(1, 'a')]
+
+    def test_local(self):
+        """ Test that blocks announced without a peer are broadcast.
+        """
+        self.fetcher.announce(self.header, 'local')
+
+        assert requests(self.queue) == [(1, 'broadcast')]
+
+
+class TestAnnouncedBlocks(object):
+    """ Testcase for the block propagation between chains.
+    """
+
+    def setup(self):
+        """ Setup of a chain and a block of another chain.
+        """
+        self.test_obj = test_pow_chain.TestPOW()
+        self.test_obj.setup()
+        self.blockchain = self.test_obj.blockchain
+        other = test_pow_chain.TestPOW()
+        other.setup()
+        other.blockchain.chain = self.blockchain.chain.copy()
+        other.mine_block(other.blockchain)
+        self.block = other.blockchain.latest_block()
+
+    def test_fetch_once(self):
+        """ Test that every node is asked for the block at most once.
+        """
+        for peer in ('a', 'b', 'a'):
+            self.blockchain.process_message(
+                ('new_header', self.block.header, peer))
+
+        assert self.test_obj.sends.get_nowait() == \
+            ('get_compact_block', self.block.header, 'a')
+        assert self.test_obj.sends.empty()
+
+        self.blockchain.process_message(('new_block', self.block, 'a'))
+        self.blockchain.process_message(
+            ('new_header', self.block.header, 'b'))
+
+        assert self.blockchain.latest_block() == self.block
+        assert self.block.header not in self.blockchain.fetcher
+
+
+def test_busy_retry():
+    """ Test that a block is requested from the next announcer
+    while the receive_queue keeps the blockchain busy.
+    """
+    now = [0.0]
+    send_queue = Queue()
+    fetcher = BlockFetcher(send_queue, timeout=2, clock=lambda: now[0],
+                           compact=False)
+    header = create_block(1)[0]
+    fetcher.announce(header, 'a')
+    fetcher.announce(header, 'b')
+    requests(send_queue)
+
+    receive_queue = Queue()
+    for _ in range(20):
+        receive_queue.put(('new_transaction', None, 'c'))
+
+    def processor(msg):
+        if msg[0] == 'download_tick':
+            fetcher.tick()
+
+    def clock():
+        now[0] += 0.25
+        return now[0]
+
+    for _ in itertools.islice(
+            received_messages(processor, receive_queue, clock), 20):
+        pass
+
+    assert requests(send_queue) == [(1, 'b')]
@@ -0,0 +1,195 @@
+""" Testing module for the block store of the blockchain client.
+"""
+
+import os
+import tempfile
+from collections import OrderedDict
+from queue import Queue
+
+import pytest
+
+import serializer
+from chains import Header, PoW_Blockchain, Transaction
+from chains.block_store import INDEX_FILE_NAME, BlockStore, segment_file_name
+
+from . import test_pow_chain
+from .test_pow_chain import VERSION
+
+
+def create_block(index):
+    """ Create a block used in tests.
+    """
+    header = Header(VERSION, index, index, str(index - 1), str(index), index)
+    return header, [Transaction('0', 'a', index, 0, index, '0')]
+
+
+class TestBlockStore(object):
+    """ Testcase for the append-only block store.
+    """
+
+    def setup(self):
+        """ Setup of a temporary directory for the store.
+        """
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = self.directory.name
+
+    def teardown(self):
+        """ Removal of the temporary directory.
+        """
+        self.directory.cleanup()
+
+    def test_append_and_reload(self):
+        """ Test that appended blocks are read after reopening the store.
+        """
+        blocks = [create_block(i) for i in range(10)]
+        store = BlockStore(self.path, segment_size=300)
+        for header, transactions in blocks:
+            store.append(header, transactions)
+        store.close()
+
+        # Small segments => blocks are split across files
+        assert os.path.exists(os.path.join(self.path, segment_file_name(1)))
+
+        store = BlockStore(self.path)
+
+        assert store.headers() == [header for header, _ in blocks]
+        assert store.load() == OrderedDict(blocks)
+        assert store.read(3) == blocks[3]
+        store.close()
+
+    def test_truncate(self):
+        """ Test that truncated blocks are replaced by appended ones.
+        """
+        blocks = [create_block(i) for i in range(10)]
+        store = BlockStore(self.path, segment_size=300)
+        for header, transactions in blocks:
+            store.append(header, transactions)
+        store.truncate(2)
+        store.append(*blocks[5])
+        store.close()
+
+        store = BlockStore(self.path)
+
+        assert store.load() == OrderedDict(blocks[:2] + [blocks[5]])
+        store.close()
+
+    def test_recovery(self):
+        """ Test that incomplete records of a crash are truncated.
+        """
+        blocks = [create_block(i) for i in range(3)]
+        store = BlockStore(self.path)
+        for header, transactions in blocks:
+            store.append(header, transactions)
+        store.close()
+
+        segment = os.path.join(self.path, segment_file_name(0))
+        index = os.path.join(self.path, INDEX_FILE_NAME)
+        # Last block was not written completely
+        with open(segment, 'r+b') as f:
+            f.truncate(os.path.getsize(segment) - 5)
+        # Incomplete index entry
+        with open(index, 'rb') as f:
+            data = f.read()
+        with open(index, 'ab') as f:
+            f.write(data[:10])
+
+        store = BlockStore(self.path)
+
+        assert store.load() == OrderedDict(blocks[:2])
+
+        store.append(*blocks[2])
+        store.close()
+        store = BlockStore(self.path)
+
+        assert store.load() == OrderedDict(blocks)
+        store.close()
+
+    def test_corrupted_block(self):
+        """ Test that blocks with invalid checksums are truncated on load.
+        """
+        blocks = [create_block(i) for i in range(3)]
+        store = BlockStore(self.path)
+        for header, transactions in blocks:
+            store.append(header, transactions)
+        store.close()
+
+        segment = os.path.join(self.path, segment_file_name(0))
+        with open(segment, 'r+b') as f:
+            f.seek(-2, os.SEEK_END)
+            f.write(b'xx')
+
+        store = BlockStore(self.path)
+
+        assert store.load() == OrderedDict(blocks[:2])
+        assert len(store) == 2
+        store.close()
+
+    def test_lock(self):
+        """ Test that a store can only be opened once at a time.
+        """
+        store = BlockStore(self.path)
+
+        with pytest.raises(RuntimeError):
+            BlockStore(self.path)
+
+        store.close()
+        BlockStore(self.path).close()
+
+
+class TestChainStore(object):
+    """ Testcase for the block store of the PoW chain.
+    """
+
+    def setup(self):
+        """ Setup of the blockchain in a temporary directory.
+        """
+        self.test_obj = test_pow_chain.TestPOW()
+        self.test_obj.setup()
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'blocks')
+        self.cwd = os.getcwd()
+        os.chdir(self.directory.name)
+
+    def teardown(self):
+        """ Removal of the temporary directory.
+        """
+        os.chdir(self.cwd)
+        self.directory.cleanup()
+
+    def create_chain(self):
+        """ Create a blockchain using the block store.
+        """
+        return PoW_Blockchain(VERSION, Queue(), Queue(),
+                              store_directory=self.path)
+
+    def test_new_blocks(self):
+        """ Test that new blocks are appended to the store.
+        """
+        blockchain = self.create_chain()
+        self.test_obj.mine_block(blockchain)
+        self.test_obj.mine_block(blockchain)
+        blockchain.close()
+
+        loaded = self.create_chain()
+
+        assert loaded.chain == blockchain.chain
+        assert loaded.check_balance(self.test_obj.sender_verify,
+                                    float('inf')) == 100
+        loaded.close()
+
+    def test_migration(self):
+        """ Test that an existing chain file is moved into the store.
+        """
+        blockchain = PoW_Blockchain(VERSION, Queue(), Queue())
+        self.test_obj.mine_block(blockchain)
+        blockchain.save_chain()
+
+        with open(PoW_Blockchain.chain_file) as f:
+            assert serializer.deserialize(f.read()) == \
+                blockchain.get_block_chain()
+
+        loaded = self.create_chain()
+
+        assert loaded.chain == blockchain.chain
+        assert len(loaded.store) == 2
+        loaded.close()
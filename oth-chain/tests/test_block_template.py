@@ -0,0 +1,71 @@
+""" Testing module for the block template builder of the blockchain client.
+"""
+
+from chains import DNS_Data, DNS_Transaction, DNSBlockChain, Transaction
+from chains.block_template import TemplateBuilder
+
+
+def create_transaction(sender, recipient, amount, fee, timestamp):
+    """ Create an unsigned transaction used in tests.
+    """
+    return Transaction(sender, recipient, amount, fee, timestamp, 'Sign')
+
+
+def test_fee_order_and_limits():
+    """ Test that the transactions with the highest fees are picked.
+    """
+    transactions = [create_transaction('a', 'b', 1, fee, fee)
+                    for fee in (1, 5, 3, 4)]
+    builder = TemplateBuilder(max_transactions=2)
+
+    assert builder.select(transactions) == [transactions[1],
+                                            transactions[3]]
+
+    builder = TemplateBuilder(
+        max_size=TemplateBuilder.size(transactions[0]) * 3)
+
+    assert builder.select(transactions,
+                          reserved=[transactions[0]]) == [transactions[1],
+                                                          transactions[3]]
+
+
+def test_balance_dependencies():
+    """ Test that spendings are only picked with the funding transactions.
+    """
+    balances = {'a': 10}
+    funding = create_transaction('a', 'b', 8, 1, 1)
+    spending = create_transaction('b', 'c', 3, 5, 2)
+
+    def balance(key):
+        return balances.get(key, 0)
+
+    assert TemplateBuilder().select([funding, spending], balance) == \
+        [funding, spending]
+    assert TemplateBuilder(max_transactions=1).select(
+        [funding, spending], balance) == [funding]
+
+    # Picking the older transaction leaves the funding uncovered
+    older = create_transaction('a', 'c', 5, 3, 0)
+
+    assert TemplateBuilder().select([funding, spending, older],
+                                    balance) == [older]
+
+    # Picking the older transaction would uncover the later one
+    later = create_transaction('a', 'c', 5, 4, 5)
+    cheap = create_transaction('a', 'b', 1, 1, 1)
+
+    assert TemplateBuilder().select([cheap, later], balance) == [later]
+
+
+def test_domain_conflicts():
+    """ Test that operations on a domain are picked in order.
+    """
+    register = DNS_Transaction('a', '0', 20, 1, 1,
+                               DNS_Data('r', 'seclab.oth', '127.0.0.1'), 's')
+    update = DNS_Transaction('a', '0', 20, 9, 2,
+                             DNS_Data('u', 'seclab.oth', '127.0.0.2'), 's')
+    builder = TemplateBuilder(max_transactions=1)
+
+    assert builder.select([register, update],
+                          conflict_key=DNSBlockChain.conflict_key) == \
+        [register]
@@ -0,0 +1,206 @@
+""" Testing module for the compact block relay.
+"""
+
+from queue import Empty, Queue
+
+from chains import Block, PoW_Blockchain
+from chains.compact_block import (SHORT_ID_BYTES, PartialBlocks,
+                                  create_compact_block, rebuild_transactions,
+                                  valid_compact_block)
+from networking.networking import pack_msg, unpack_msg
+
+from . import test_pow_chain
+from .test_block_store import create_block
+from .test_pow_chain import VERSION
+
+
+def test_rebuild():
+    """ Test that transactions are found by their short ids
+    and mining rewards are sent in full.
+    """
+    header, transactions = create_block(1)
+    test_obj = test_pow_chain.TestPOW()
+    test_obj.setup()
+    transactions = [test_obj.create_transaction() for _ in range(3)] + \
+        transactions
+    block = Block(header, transactions)
+
+    compact_block = create_compact_block(block)
+
+    assert compact_block[2] == [(3, transactions[3])]
+    assert rebuild_transactions(compact_block, transactions) == \
+        transactions
+    assert rebuild_transactions(compact_block, transactions[1:2]) == \
+        [None, transactions[1], None, transactions[3]]
+
+
+def test_malformed():
+    """ Test that malformed compact blocks are not rebuilt.
+    """
+    header, transactions = create_block(1)
+    compact_block = create_compact_block(Block(header, transactions))
+    short_ids = '00' * SHORT_ID_BYTES
+
+    assert valid_compact_block(compact_block)
+    for malformed in [(header, '', [(5, transactions[0])]),
+                      (header, short_ids, [(-1, transactions[0])]),
+                      (header, short_ids, [(0, transactions[0]),
+                                           (0, transactions[0])]),
+                      (header, short_ids[1:], [(0, transactions[0])]),
+                      (header, '', [(0, None)]),
+                      (header, '', [('0', transactions[0])]),
+                      (None, '', []),
+                      (header, '')]:
+        assert not valid_compact_block(malformed)
+    assert rebuild_transactions((None, '', [(5, transactions[0])]), []) \
+        is None
+
+
+def test_partial_blocks():
+    """ Test that only the sender can complete a block.
+    """
+    partial_blocks = PartialBlocks(max_size=1)
+    partial_blocks.add('header', [None, 1, None], 'a')
+
+    assert partial_blocks.complete('header', 'b', [0, 2]) is None
+    assert partial_blocks.complete('header', 'a', [0, 2]) == [0, 1, 2]
+    assert 'header' not in partial_blocks
+
+    partial_blocks.add('header', [None], 'a')
+    partial_blocks.add('other', [None], 'a')
+
+    assert 'header' not in partial_blocks
+    assert partial_blocks.complete('other', 'a', [0, 1]) is None
+
+    partial_blocks.add('header', [None, 1], 'a')
+
+    assert partial_blocks.complete('header', 'a', [None]) is None
+
+
+class TestCompactRelay(object):
+    """ Testcase for the relay of a block between two chains.
+    """
+
+    def setup(self):
+        """ Setup of two chains and a transaction in both pools.
+        """
+        self.test_obj = test_pow_chain.TestPOW()
+        self.test_obj.setup()
+        self.blockchain = self.test_obj.blockchain
+        self.test_obj.mine_block(self.blockchain)
+        self.other = PoW_Blockchain(VERSION, Queue(), Queue())
+        self.other.new_block(self.blockchain.latest_block())
+
+        self.transaction = self.test_obj.create_transaction()
+        self.blockchain.new_transaction(self.transaction)
+
+    def relay(self):
+        """ Mine a block and deliver the messages until both are idle.
+
+        Returns:
+            The types of the messages received by the other chain.
+        """
+        self.blockchain.process_message(
+            ('mine', self.test_obj.sender_verify, 'local'))
+        for chain in (self.blockchain, self.other):
+            while not chain.send_queue.empty():
+                chain.send_queue.get_nowait()
+        self.other.process_message(
+            ('new_header', self.blockchain.latest_header(), 'a'))
+
+        received = []
+        chains_by_address = {'a': self.blockchain, 'b': self.other}
+        while True:
+            for address, chain in chains_by_address.items():
+                try:
+                    msg_type, msg_data, _ = chain.send_queue.get_nowait()
+                except Empty:
+                    continue
+                if msg_type in ('new_header', 'new_transaction'):
+                    break
+                receiver = 'b' if address == 'a' else 'a'
+                if receiver == 'b':
+                    received.append(msg_type)
+                # Through the serializer of the network
+                msg_type, msg_data = unpack_msg(
+                    pack_msg((msg_type, msg_data)))
+                chains_by_address[receiver].process_message(
+                    (msg_type, msg_data, address))
+                break
+            else:
+                return received
+
+    def test_known_transactions(self):
+        """ Test that a block is rebuilt from the pool.
+        """
+        self.other.new_transaction(self.transaction)
+
+        received = self.relay()
+
+        assert received == ['compact_block']
+        assert self.other.latest_block() == self.blockchain.latest_block()
+        assert self.transaction not in self.other.transaction_pool
+
+    def test_missing_transactions(self):
+        """ Test that only the missing transactions are requested.
+        """
+        received = self.relay()
+
+        assert received == ['compact_block', 'block_transactions']
+        assert self.other.latest_block() == self.blockchain.latest_block()
+
+    def test_malformed(self):
+        """ Test that malformed messages of a peer are dropped.
+        """
+        self.blockchain.process_message(
+            ('mine', self.test_obj.sender_verify, 'local'))
+        header, short_ids, prefilled = create_compact_block(
+            self.blockchain.latest_block())
+        latest = self.other.latest_block()
+        while not self.blockchain.send_queue.empty():
+            self.blockchain.send_queue.get_nowait()
+
+        for msg_type, msg_data in [
+                ('compact_block',
+                 (header, short_ids, [(len(prefilled) + 5, prefilled[0][1])])),
+                ('compact_block', (header, short_ids[1:], prefilled)),
+                ('compact_block', (header, short_ids)),
+                ('block_transactions', (header,)),
+                ('get_block_transactions', (header, ['0'])),
+                ('get_block_transactions', header)]:
+            msg_type, msg_data = unpack_msg(pack_msg((msg_type, msg_data)))
+            self.other.process_message((msg_type, msg_data, 'a'))
+            self.blockchain.process_message((msg_type, msg_data, 'b'))
+
+        assert self.other.latest_block() == latest
+        assert header not in self.other.partial_blocks
+        assert self.blockchain.send_queue.empty()
+
+        # Missing transactions of a kept block have to be transactions
+        self.other.new_compact_block((header, short_ids, prefilled), 'a')
+        assert header in self.other.partial_blocks
+        self.other.process_message(('block_transactions',
+                                    (header, [None]), 'a'))
+
+        assert header not in self.other.partial_blocks
+        assert self.other.latest_block() == latest
+
+    def test_collision(self):
+        """ Test that a block that can't be rebuilt
+        is requested in full.
+        """
+        self.blockchain.process_message(
+            ('mine', self.test_obj.sender_verify, 'local'))
+        block = self.blockchain.latest_block()
+        while not self.other.send_queue.empty():
+            self.other.send_queue.get_nowait()
+
+        # Transaction with the same short id
+        colliding = [self.test_obj.create_transaction()
+                     if t == self.transaction else t
+                     for t in block.transactions]
+        self.other.rebuilt_block(block.header, colliding, 'a')
+
+        assert self.other.send_queue.get_nowait() == \
+            ('get_block', block.header, 'a')
+        assert len(self.other.chain) == 2
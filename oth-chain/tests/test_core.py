@@ -1,10 +1,12 @@
 """ Testing module for the core module of the blockchain client.
 """
 
+import itertools
 import time
+from queue import Queue
 
-from core import send_queue, gui_send_queue, receive_msg
-from .test_pow_chain import TestPOW
+from core import send_queue, gui_send_queue, receive_msg, received_messages
+from . import test_pow_chain
 
 
 class TestCore(object):
@@ -16,7 +18,7 @@ class TestCore(object):
     def setup(self):
         """ Setup for the tests.
         """
-        self.test_obj = TestPOW()
+        self.test_obj = test_pow_chain.TestPOW()
         self.test_obj.setup()
         self.chain = self.test_obj.blockchain
         self.processor = self.chain.get_message_processor()
@@ -143,3 +145,25 @@ class TestCore(object):
         are read in main().
         """
         pass
+
+
+def test_busy_download_tick():
+    """ Test that download ticks are dispatched
+    while messages keep arriving.
+    """
+    now = [0.0]
+    queue = Queue()
+    for index in range(10):
+        queue.put(('msg', index, 'local'))
+    processed = []
+
+    def clock():
+        now[0] += 0.3
+        return now[0]
+
+    messages = list(itertools.islice(
+        received_messages(processed.append, queue, clock), 10))
+
+    assert [m[1] for m in messages] == list(range(10))
+    assert len(processed) >= 2
+    assert all(p[0] == 'download_tick' for p in processed)
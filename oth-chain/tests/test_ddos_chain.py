@@ -311,6 +311,23 @@ class TestDDos(object):
         captured = capsys.readouterr()
         assert 'IP was already blocked' in captured.out
 
+    def test_block_template(self):
+        """ Test that blocks of five pool operations are created.
+        """
+        transactions = [
+            self.create_transaction(self.sender_verify, time.time() + i,
+                                    chains.DDosData('b', f'10.0.0.{i}'),
+                                    self.sender_sign)
+            for i in range(7)]
+        for transaction in transactions:
+            self.chain.transaction_pool.add(transaction)
+
+        self.chain.create_m_blocks()
+
+        assert len(self.chain.chain) == 2
+        assert self.chain.latest_block().transactions == transactions[:5]
+        assert list(self.chain.transaction_pool) == transactions[5:]
+
     # ####################### HELPER FUNCTIONS ###########################
 
     def fill_block(self, capsys, amount):
@@ -0,0 +1,97 @@
+""" Testing module for the byte encoding of the blockchain client.
+"""
+
+import time
+
+import pytest
+
+from chains import (Blockchain, DNS_Data, DNS_Transaction, Header,
+                    Transaction, sign_transaction)
+from chains.encoding import encode_value
+from serializer import deserialize, serialize
+
+from . import test_pow_chain
+
+
+def test_encoding():
+    """ Test that the encoding is canonical and distinguishes types.
+    """
+    t = Transaction(b'send', 'rec', 50, 5, 123.5, b'Sign')
+
+    assert t.encoded() == Transaction(*t).encoded()
+    assert t.digest == deserialize(serialize(t)).digest
+    assert len(t.digest) == 32
+
+    assert encode_value(1) != encode_value(1.0)
+    assert encode_value('1') != encode_value(b'1')
+    assert Transaction(*t).digest != \
+        Header(b'send', 'rec', 50, 5, 123.5, b'Sign').digest
+
+    d = DNS_Transaction(b'send', 'rec', 50, 5, 123.5,
+                        DNS_Data('r', 'seclab.oth', '127.0.0.1'), b'Sign')
+
+    assert d.digest != d._replace(data=DNS_Data('r', 'seclab.oth', '')).digest
+
+    with pytest.raises(TypeError):
+        encode_value(object())
+
+
+def test_message_digest():
+    """ Test that the signed message excludes the signature.
+    """
+    t = Transaction(b'send', 'rec', 50, 5, 123.5, '')
+
+    assert t.message_digest == t._replace(signature=b'Sign').message_digest
+    assert t.digest != t._replace(signature=b'Sign').digest
+
+
+def test_merkle_version():
+    """ Test the version switch of the Merkle root.
+    """
+    t = [Transaction(b'send', 'rec', 50, 5, i, b'Sign') for i in range(5)]
+
+    assert Blockchain.create_merkle_root(t, 0.8) == \
+        Blockchain.create_merkle_root(list(reversed(t)), 0.8)
+    assert Blockchain.create_merkle_root(t, 0.8) != \
+        Blockchain.create_merkle_root(t, 0.7)
+    assert Blockchain.create_merkle_root(t) == \
+        Blockchain.create_merkle_root(t, 0.7)
+
+
+class TestSignature(object):
+    """ Testcase for the signatures of both encodings.
+    """
+
+    def setup(self):
+        """ Setup of the blockchain for the tests.
+        """
+        self.test_obj = test_pow_chain.TestPOW()
+        self.test_obj.setup()
+        self.blockchain = self.test_obj.blockchain
+        self.test_obj.mine_block(self.blockchain)
+
+    def test_binary_signature(self):
+        """ Test that transactions signed with the byte encoding are valid.
+        """
+        transaction = sign_transaction(
+            Transaction(self.test_obj.sender_verify,
+                        self.test_obj.receiver_verify,
+                        10, 1, time.time(), ''),
+            self.test_obj.sender_sign)
+
+        assert self.blockchain.validate_transaction(transaction, False)
+
+        forged = transaction._replace(amount=20)
+
+        assert not self.blockchain.validate_transaction(forged, False)
+
+    def test_legacy_signature(self):
+        """ Test that transactions signed with the legacy hash are valid.
+        """
+        transaction = self.test_obj.create_transaction()
+
+        assert self.blockchain.legacy_hash(transaction) == \
+            self.test_obj.create_transaction_hash(transaction.amount,
+                                                  transaction.fee,
+                                                  transaction.timestamp)
+        assert self.blockchain.validate_transaction(transaction, False)
@@ -0,0 +1,365 @@
+""" Testing module for the fragmentation of the extended UDP socket.
+"""
+
+import os
+import random
+import time
+
+import pytest
+
+# Imported before networking (circular import)
+import chains  # noqa: F401
+from networking import ExtendedUDP
+from networking.ext_udp import (DEFAULT_DATAGRAM_SIZE, FRAGMENT_HEADER,
+                                NACK_DELAY, PACING_BURST, PACING_STEP,
+                                ExtendedUDPProtocol)
+
+from .lossy_socket import LossyNetwork
+
+ADDRESS = ('127.0.0.1', 1)
+OTHER = ('127.0.0.1', 2)
+
+
+class TestFragments(object):
+    """ Testcase for the reassembly of fragmented messages.
+    """
+
+    def setup(self):
+        """ Setup of a socket with small fragments.
+        """
+        self.udp = ExtendedUDP(FRAGMENT_HEADER.size + 10)
+
+    def teardown(self):
+        """ Close the socket.
+        """
+        self.udp.teardown()
+
+    def deliver(self, datagrams, address=ADDRESS):
+        """ Receive datagrams.
+
+        Returns:
+            The completed messages.
+        """
+        received = []
+        for datagram in datagrams:
+            result = self.udp.receive_datagram(memoryview(datagram), address)
+            if result is not None:
+                received.append(result)
+        return received
+
+    def test_single(self):
+        """ Test that short messages are sent in one datagram.
+        """
+        datagrams = list(self.udp.fragments(b'short'))
+
+        assert len(datagrams) == 1
+        assert self.deliver(datagrams) == [(b'short', ADDRESS)]
+        assert self.deliver([b'0legacy']) == [(b'legacy', ADDRESS)]
+
+    def test_out_of_order(self):
+        """ Test that shuffled and duplicated fragments are reassembled.
+        """
+        msg = os.urandom(95)
+        datagrams = list(self.udp.fragments(msg))
+        random.Random(1).shuffle(datagrams)
+
+        assert len(datagrams) == 10
+        assert self.deliver(datagrams[:5] + datagrams[:5]) == []
+        assert self.deliver(datagrams[5:]) == [(msg, ADDRESS)]
+        assert not self.udp.partial_messages
+
+    def test_concurrent(self):
+        """ Test that interleaved messages of a peer are reassembled.
+        """
+        first = list(self.udp.fragments(b'a' * 30))
+        second = list(self.udp.fragments(b'b' * 25))
+
+        received = self.deliver([first[0], second[2], second[0], first[2],
+                                 second[1], first[1]])
+
+        assert received == [(b'b' * 25, ADDRESS), (b'a' * 30, ADDRESS)]
+
+    def test_invalid(self):
+        """ Test that inconsistent fragments are ignored.
+        """
+        datagrams = list(self.udp.fragments(b'c' * 30))
+        msg_id = FRAGMENT_HEADER.unpack_from(datagrams[0])[1]
+        beyond = FRAGMENT_HEADER.pack(b'F', msg_id, 3, 3, 30) + b'c' * 10
+        too_long = FRAGMENT_HEADER.pack(b'F', msg_id + 1, 0, 1, 11) + \
+            b'c' * 10
+
+        assert self.deliver([beyond, too_long, b'Fshort', b'x']) == []
+        assert self.deliver(datagrams) == [(b'c' * 30, ADDRESS)]
+
+    def test_limits(self):
+        """ Test that the oldest incomplete messages are dropped
+        if a peer exceeds its limits.
+        """
+        self.udp.max_pending_messages = 2
+        messages = [list(self.udp.fragments(bytes([i]) * 20))
+                    for i in range(3)]
+
+        self.deliver(m[0] for m in messages)
+        self.deliver([messages[0][0]], ('127.0.0.1', 2))
+
+        assert self.udp.dropped == 1
+        assert self.deliver(m[1] for m in messages[1:]) == \
+            [(bytes([1]) * 20, ADDRESS), (bytes([2]) * 20, ADDRESS)]
+        assert self.deliver([messages[0][1]], ('127.0.0.1', 2)) == \
+            [(bytes([0]) * 20, ('127.0.0.1', 2))]
+
+        self.udp.max_pending_bytes = 100
+        assert self.deliver(self.udp.fragments(b'd' * 101)) == []
+
+    def test_timeout(self):
+        """ Test that incomplete messages are dropped after the timeout.
+        """
+        self.udp.timeout = 0
+        self.udp._last_expiry = 0
+        datagrams = list(self.udp.fragments(b'e' * 20))
+
+        self.deliver(datagrams[:1])
+        self.udp._last_expiry = 0
+
+        assert self.deliver(datagrams[1:]) == []
+        assert self.udp.dropped == 1
+
+
+class TestReliable(object):
+    """ Testcase for the retransmission of lost fragments.
+    """
+
+    def setup(self):
+        """ Setup of two reliable sockets on a lossy network
+        with a fake clock.
+        """
+        self.now = 0.0
+        self.network = LossyNetwork(loss=0.2, reorder=0.3, seed=3)
+        self.sender = self.create_udp(ADDRESS)
+        self.receiver = self.create_udp(OTHER)
+
+    def create_udp(self, address):
+        """ Create a reliable socket of the lossy network.
+        """
+        udp = ExtendedUDP(FRAGMENT_HEADER.size + 100, reliable=True)
+        udp.socket.close()
+        udp.socket = self.network.socket(address)
+        udp.clock = lambda: self.now
+        udp._last_expiry = self.now
+        udp.sleep = lambda gap: None
+        return udp
+
+    def transfer(self, msg, rounds=50):
+        """ Send a message and deliver the datagrams
+        until the receiver reassembled it.
+
+        Returns:
+            The received messages.
+        """
+        self.sender.send_msg(msg, OTHER)
+        received = []
+        for _ in range(rounds):
+            while not self.network.idle:
+                for udp in (self.receiver, self.sender):
+                    result = udp.receive_msg()
+                    if result is not None:
+                        received.append(result)
+            self.now += NACK_DELAY
+            self.sender.receive_msg()
+            self.receiver.receive_msg()
+        return received
+
+    def test_recovery(self):
+        """ Test that messages are reassembled despite loss and reordering
+        and only the missing fragments are sent again.
+        """
+        msg = os.urandom(5000)
+
+        assert self.transfer(msg) == [(msg, ADDRESS)]
+        assert self.network.dropped > 0
+        assert 0 < self.sender.retransmitted < 50
+        assert not self.receiver.partial_messages
+
+        # Kept until acknowledged or expired (the ACK can be lost)
+        self.now += self.sender.timeout
+        self.sender.expire()
+
+        assert not self.sender.sent_messages
+
+    def test_lossless(self):
+        """ Test that nothing is resent without loss.
+        """
+        self.network.loss = 0
+        msg = os.urandom(1000)
+
+        assert self.transfer(msg, rounds=3) == [(msg, ADDRESS)]
+        assert self.sender.retransmitted == 0
+        assert self.network.sent == 11
+
+    def test_pacing(self):
+        """ Test that the gap between fragments grows with loss
+        and shrinks with lossless messages.
+        """
+        self.transfer(os.urandom(5000))
+        gap = self.sender.pacing[OTHER]
+
+        assert gap >= PACING_STEP
+
+        self.network.loss = 0
+        self.transfer(os.urandom(1000), rounds=3)
+
+        assert self.sender.pacing.get(OTHER, 0) < gap
+
+    def test_scheduled_pacing(self):
+        """ Test that an event loop schedules the bursts of fragments
+        instead of sleeping.
+        """
+        scheduled = []
+        self.sender.call_later = lambda *args: scheduled.append(args)
+        self.sender.pacing[OTHER] = PACING_STEP
+        self.sender.send_msg(os.urandom(2000), OTHER)
+
+        assert self.network.sent == PACING_BURST
+        assert scheduled[0][0] == PACING_STEP
+
+        scheduled[0][1](*scheduled[0][2:])
+
+        assert self.network.sent == 2 * PACING_BURST
+        assert len(scheduled) == 2
+
+    def test_restart(self):
+        """ Test that the messages of a restarted peer
+        are not taken for retransmissions of its previous run.
+        """
+        self.network.loss = self.network.reorder = 0
+        msg = os.urandom(1000)
+        self.transfer(msg, rounds=1)
+        self.sender = self.create_udp(ADDRESS)
+
+        assert self.transfer(msg, rounds=1) == [(msg, ADDRESS)]
+
+    def test_late_fragments(self):
+        """ Test that retransmissions of completed messages are ignored.
+        """
+        self.network.loss = self.network.reorder = 0
+        datagrams = list(self.sender.fragments(os.urandom(300)))
+
+        for datagram in datagrams + datagrams[:1]:
+            self.sender.socket.sendto(datagram, OTHER)
+        received = [self.receiver.receive_msg() for _ in datagrams]
+
+        assert received[-1] is not None
+        assert self.receiver.receive_msg() is None
+        assert not self.receiver.partial_messages
+
+
+class TestDatagramSize(object):
+    """ Testcase for the negotiation of the datagram size.
+    """
+
+    def setup(self):
+        """ Setup of a socket with large datagrams on a lossless network.
+        """
+        self.network = LossyNetwork()
+        self.network.socket(OTHER)
+        self.udp = ExtendedUDP(8192)
+        self.udp.socket.close()
+        self.udp.socket = self.network.socket(ADDRESS)
+
+    def test_negotiation(self):
+        """ Test that the smaller size of both peers is used
+        and invalid sizes are ignored.
+        """
+        assert self.udp.datagram_size(OTHER) == DEFAULT_DATAGRAM_SIZE
+
+        self.udp.peer_datagram_size(OTHER, 4096)
+
+        assert self.udp.datagram_size(OTHER) == 4096
+
+        self.udp.peer_datagram_size(OTHER, 100000)
+        self.udp.peer_datagram_size(OTHER, '')
+        self.udp.peer_datagram_size(ADDRESS, 65507)
+
+        assert self.udp.datagram_size(OTHER) == 4096
+        assert self.udp.datagram_size(ADDRESS) == 8192
+
+    def test_send(self):
+        """ Test that messages are split for the receiving peer.
+        """
+        msg = os.urandom(10000)
+        self.udp.send_msg(msg, OTHER)
+        sent = self.network.sent
+        self.udp.peer_datagram_size(OTHER, 8192)
+        self.udp.send_msg(msg, OTHER)
+
+        assert sent == 10
+        assert self.network.sent - sent == 2
+        assert max(len(d) for d, _ in self.network.inboxes[OTHER]) == 8192
+
+    def test_send_many(self):
+        """ Test that peers with the same datagram size
+        get the same datagrams.
+        """
+        peers = [('127.0.0.1', 3), ('127.0.0.1', 4)]
+        for peer in peers:
+            self.network.socket(peer)
+        self.udp.peer_datagram_size(OTHER, 4096)
+        self.udp.send_many(b'h' * 5000, [OTHER] + peers)
+
+        inboxes = [[d for d, _ in self.network.inboxes[peer]]
+                   for peer in [OTHER] + peers]
+
+        assert len(inboxes[0]) == 2
+        assert len(inboxes[1]) == 5
+        assert inboxes[2] == inboxes[1]
+
+    def test_mismatched_sizes(self):
+        """ Test that a node with small datagrams receives the larger
+        datagrams of peers that don't know its size yet.
+        """
+        receiver = ExtendedUDP()
+        receiver.configure(512)
+        receiver.socket.close()
+        receiver.socket = self.network.socket(OTHER)
+        msg = os.urandom(3000)
+        self.udp.send_msg(msg, OTHER)
+
+        assert len(self.network.inboxes[OTHER]) == 3
+
+        received = [receiver.receive_msg() for _ in range(3)]
+
+        assert received[-1] == (msg, ADDRESS)
+
+    def test_configure(self):
+        """ Test that only valid sizes can be configured.
+        """
+        self.udp.configure(65507, receive_buffer=1 << 20)
+
+        assert self.udp.fragment_size == 65507 - FRAGMENT_HEADER.size
+        assert self.udp.receive_buffer == 1 << 20
+
+        with pytest.raises(ValueError):
+            self.udp.configure(100)
+
+
+def test_drain():
+    """ Test that the protocol receives all pending datagrams per wakeup.
+    """
+    udp = ExtendedUDP(FRAGMENT_HEADER.size + 10)
+    sock = udp.create_socket(0)
+    sock.setblocking(False)
+    received = []
+    protocol = ExtendedUDPProtocol(
+        udp, sock, lambda msg, address: received.append(msg))
+    try:
+        datagrams = list(udp.fragments(b'g' * 50))
+        for datagram in datagrams[1:]:
+            udp.socket.sendto(datagram, sock.getsockname())
+        time.sleep(0.05)
+        protocol.datagram_received(
+            datagrams[0], ('127.0.0.1', udp.socket.getsockname()[1]))
+    finally:
+        sock.close()
+        udp.teardown()
+
+    assert received == [b'g' * 50]
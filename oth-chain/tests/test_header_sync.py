@@ -0,0 +1,121 @@
+""" Testing module for the paginated header synchronization.
+"""
+
+from queue import Empty, Queue
+
+import chains.blockchain
+from chains import PoW_Blockchain
+from chains.header_sync import header_locator, headers_after
+
+from . import test_pow_chain
+from .test_block_store import create_block
+from .test_pow_chain import VERSION
+
+
+def test_locator():
+    """ Test that the locator is dense near the tip
+    and contains the genesis block.
+    """
+    headers = [create_block(i)[0] for i in range(50)]
+
+    locator = header_locator(headers)
+
+    assert locator[:10] == [str(i) for i in range(49, 39, -1)]
+    assert locator[10:] == ['38', '34', '26', '10', '0']
+    assert header_locator(headers[:1]) == ['0']
+    assert header_locator([]) == []
+
+
+def test_headers_after():
+    """ Test that the headers after the latest known header are sent.
+    """
+    headers = [create_block(i)[0] for i in range(50)]
+
+    assert headers_after(headers, ['20', '10', '0'], 5) == headers[21:26]
+    assert headers_after(headers, ['48', '49'], 5) == []
+    assert headers_after(headers, ['unknown'], 3) == headers[:3]
+    assert headers_after(headers, ['0'], 0) == []
+
+
+class SyncFixture(object):
+    """ Two chains exchanging their messages (base of the sync tests).
+    """
+
+    def setup(self):
+        """ Setup of a chain that is behind another chain
+        and a small page size.
+        """
+        self.test_obj = test_pow_chain.TestPOW()
+        self.test_obj.setup()
+        self.page_size = chains.blockchain.HEADERS_PAGE_SIZE
+        chains.blockchain.HEADERS_PAGE_SIZE = 2
+
+        self.blockchain = self.test_obj.blockchain
+        self.test_obj.mine_block(self.blockchain)
+        self.other = PoW_Blockchain(VERSION, Queue(), Queue())
+        self.other.new_block(self.blockchain.latest_block())
+        for _ in range(6):
+            self.test_obj.mine_block(self.other)
+        self.clear(self.other.send_queue)
+        self.clear(self.test_obj.sends)
+
+    def teardown(self):
+        """ Reset of the page size.
+        """
+        chains.blockchain.HEADERS_PAGE_SIZE = self.page_size
+
+    @staticmethod
+    def clear(queue):
+        """ Remove all messages of a queue.
+        """
+        while not queue.empty():
+            queue.get_nowait()
+
+    def exchange(self):
+        """ Deliver the messages between the chains until both are idle.
+
+        Returns:
+            The types of the delivered messages.
+        """
+        delivered = []
+        chains_by_address = {'a': self.blockchain, 'b': self.other}
+        while True:
+            for address, chain in chains_by_address.items():
+                try:
+                    msg_type, msg_data, _ = chain.send_queue.get_nowait()
+                except Empty:
+                    continue
+                receiver = 'b' if address == 'a' else 'a'
+                delivered.append(msg_type)
+                chains_by_address[receiver].process_message(
+                    (msg_type, msg_data, address))
+                break
+            else:
+                return delivered
+
+
+class TestPagedSync(SyncFixture):
+    """ Testcase for the header sync between two chains.
+    """
+
+    def test_sync(self):
+        """ Test that the headers are requested page by page.
+        """
+        self.blockchain.new_header(self.other.latest_header())
+
+        delivered = self.exchange()
+
+        assert self.blockchain.latest_block() == self.other.latest_block()
+        # 6 new headers => 3 full pages and an empty page
+        assert delivered.count('headers') == 4
+        assert delivered.count('get_block') == 6
+        assert 'resolve_conflict' not in delivered
+
+    def test_unknown_fork_point(self):
+        """ Test that pages without a known header are ignored.
+        """
+        page = self.other.get_headers(self.other.header_locator()[2:], 2)
+        self.blockchain.resolve_conflict(page[1:], 'b')
+
+        assert not self.blockchain.new_chain
+        assert self.test_obj.sends.empty()
@@ -0,0 +1,113 @@
+""" Testing module for the inventory based transaction relay.
+"""
+
+from queue import Queue
+
+# Imported before networking (circular import)
+import chains  # noqa: F401
+import networking.networking
+from networking import PeerManager, pack_msg, process_incoming_msg
+from networking.inventory import Inventory, SeenCache, transaction_id
+
+from . import test_pow_chain
+
+
+def create_transactions(count):
+    """ Create signed transactions.
+    """
+    test_obj = test_pow_chain.TestPOW()
+    test_obj.setup()
+    return [test_obj.create_transaction() for _ in range(count)]
+
+
+def test_seen_cache():
+    """ Test that only the latest ids are kept.
+    """
+    seen = SeenCache(max_size=2)
+
+    assert seen.add('a')
+    assert not seen.add('a')
+    seen.add('b')
+    seen.add('c')
+
+    assert 'a' not in seen
+    assert len(seen) == 2
+
+
+class TestInventory(object):
+    """ Testcase for the announcements and requests of transactions.
+    """
+
+    def setup(self):
+        """ Setup of an inventory with a fake clock.
+        """
+        self.now = 0.0
+        self.inventory = Inventory(timeout=5, clock=lambda: self.now)
+        self.transactions = create_transactions(3)
+        self.ids = [transaction_id(t) for t in self.transactions]
+
+    def test_announce(self):
+        """ Test that announced transactions can be requested.
+        """
+        for transaction in self.transactions[:2]:
+            self.inventory.announce(transaction)
+
+        assert self.inventory.flush() == [self.ids[:2]]
+        assert self.inventory.flush() == []
+        assert self.inventory.get(self.ids) == self.transactions[:2]
+        assert self.inventory.wanted(self.ids) == self.ids[2:]
+
+    def test_requests(self):
+        """ Test that ids are only requested again after the timeout.
+        """
+        assert self.inventory.wanted(self.ids[:1]) == self.ids[:1]
+        assert self.inventory.wanted(self.ids[:1]) == []
+
+        self.now = 5
+
+        assert self.inventory.wanted(self.ids[:1]) == self.ids[:1]
+
+        assert self.inventory.receive(self.transactions[0])
+        assert not self.inventory.receive(self.transactions[0])
+        assert self.inventory.wanted(self.ids[:1]) == []
+        assert self.inventory.duplicates == 1
+
+    def test_invalid(self):
+        """ Test that transactions are only seen once they are announced
+        (validated by the blockchain).
+        """
+        assert self.inventory.receive(self.transactions[0])
+        assert self.inventory.receive(self.transactions[1])
+        assert self.ids[0] not in self.inventory.seen
+
+        # The first transaction is valid, the second one is not
+        self.inventory.announce(self.transactions[0])
+        self.now = 5
+
+        assert not self.inventory.receive(self.transactions[0])
+        assert self.inventory.wanted(self.ids[:2]) == self.ids[1:2]
+        assert self.inventory.receive(self.transactions[1])
+
+
+def test_drop_duplicates():
+    """ Test that known transactions don't reach the receive_queue.
+    """
+    inventory = networking.networking.INVENTORY
+    peers = networking.networking.PEERS
+    networking.networking.INVENTORY = Inventory()
+    networking.networking.PEERS = PeerManager()
+    networking.networking.PEERS.setup(Queue(), Queue(), 6669)
+    try:
+        transaction = create_transactions(1)[0]
+        receive_queue = Queue()
+        address = ('0.0.0.0', 1)
+        for _ in range(3):
+            process_incoming_msg(pack_msg(('new_transaction', transaction)),
+                                 address, receive_queue)
+
+        assert receive_queue.get_nowait() == \
+            ('new_transaction', transaction, address)
+        assert receive_queue.empty()
+    finally:
+        networking.networking.INVENTORY = inventory
+        networking.networking.PEERS = peers
@@ -0,0 +1,118 @@
+""" Testing module for the lazily loaded chain of the blockchain client.
+"""
+
+import os
+import tempfile
+from collections import OrderedDict
+from queue import Queue
+
+from chains import DNSBlockChain, PoW_Blockchain
+from chains.block_store import BlockStore
+from chains.lazy_chain import LazyChain
+
+from . import test_pow_chain
+from .test_block_store import create_block
+from .test_pow_chain import VERSION
+
+
+class TestLazyChain(object):
+    """ Testcase for the chain reading transactions on demand.
+    """
+
+    def setup(self):
+        """ Setup of a store with some blocks.
+        """
+        self.directory = tempfile.TemporaryDirectory()
+        self.blocks = [create_block(i) for i in range(10)]
+        store = BlockStore(self.directory.name)
+        for header, transactions in self.blocks:
+            store.append(header, transactions)
+        store.close()
+        self.store = BlockStore(self.directory.name)
+
+    def teardown(self):
+        """ Removal of the temporary directory.
+        """
+        self.store.close()
+        self.directory.cleanup()
+
+    def test_mapping(self):
+        """ Test that the lazy chain behaves like the OrderedDict.
+        """
+        chain = LazyChain(self.store, cache_size=3)
+        expected = OrderedDict(self.blocks)
+
+        assert list(chain) == list(expected)
+        assert next(reversed(chain)) == self.blocks[-1][0]
+        assert self.blocks[4][0] in chain
+        assert chain[self.blocks[4][0]] == self.blocks[4][1]
+        assert chain == expected
+
+        # Only the cached blocks are decoded
+        assert len(chain._blocks) == 3
+
+    def test_changes(self):
+        """ Test that changes of the chain are written to the store.
+        """
+        chain = LazyChain(self.store)
+        header, transactions = create_block(10)
+        chain[header] = transactions
+        del chain[self.blocks[2][0]]
+        chain[self.blocks[0][0]] = []
+        chain.truncate(8)
+
+        expected = OrderedDict(self.blocks[:2] + self.blocks[3:9])
+        expected[self.blocks[0][0]] = []
+
+        assert chain == expected
+        assert LazyChain(self.store) == expected
+
+
+class TestChainLoading(object):
+    """ Testcase for the lazy loading of the chains.
+    """
+
+    def setup(self):
+        """ Setup of a temporary directory for the store.
+        """
+        self.test_obj = test_pow_chain.TestPOW()
+        self.test_obj.setup()
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'blocks')
+
+    def teardown(self):
+        """ Removal of the temporary directory.
+        """
+        self.directory.cleanup()
+
+    def test_get_block(self):
+        """ Test that blocks of a loaded chain are read when requested.
+        """
+        blockchain = PoW_Blockchain(VERSION, Queue(), Queue(),
+                                    store_directory=self.path)
+        self.test_obj.mine_block(blockchain)
+        block = blockchain.latest_block()
+        blockchain.close()
+
+        sends = Queue()
+        loaded = PoW_Blockchain(VERSION, sends, Queue(),
+                                store_directory=self.path)
+        loaded.chain._blocks.clear()
+
+        assert isinstance(loaded.chain, LazyChain)
+        assert loaded.get_block(block.header) == block
+
+        loaded.send_block(block.header, 'address')
+
+        assert sends.get_nowait() == ('new_block', block, 'address')
+        loaded.close()
+
+    def test_dns_chain(self):
+        """ Test that the DNS chain is loaded once.
+        """
+        blockchain = DNSBlockChain(VERSION, Queue(), Queue(),
+                                   store_directory=self.path)
+
+        assert isinstance(blockchain.chain, LazyChain)
+        assert len(blockchain.store) == 1
+        blockchain.close()
@@ -0,0 +1,100 @@
+""" Testing module for the balance ledger of the blockchain client.
+"""
+
+from chains import Ledger, Transaction
+
+
+def create_transaction(sender, recipient, amount, fee, timestamp):
+    """ Create an unsigned transaction used in tests.
+    """
+    return Transaction(sender, recipient, amount, fee, timestamp, 'Sign')
+
+
+def test_apply_revert():
+    """ Test that applying and reverting blocks updates the balances.
+    """
+    ledger = Ledger()
+    block_1 = [create_transaction('0', 'a', 50, 0, 1)]
+    block_2 = [create_transaction('a', 'b', 10, 1, 2),
+               create_transaction('b', 'b', 5, 1, 3)]
+
+    ledger.rebuild([block_1, block_2])
+
+    assert ledger.balance('a', 10) == 39
+    assert ledger.balance('b', 10) == 9
+
+    ledger.revert_transactions(block_2)
+
+    assert ledger.balance('a', 10) == 50
+    assert ledger.balance('b', 10) == 0
+
+
+def test_deltas():
+    """ Test that the balance changes of a block are reverted.
+    """
+    ledger = Ledger()
+    ledger.apply_transactions([create_transaction('0', 'a', 50, 0, 1)])
+
+    deltas = ledger.apply_transactions(
+        [create_transaction('a', 'b', 10, 1, 2),
+         create_transaction('b', 'a', 5, 1, 3)])
+
+    assert deltas == {'a': -6, 'b': 4}
+
+    ledger.revert_deltas(deltas)
+
+    assert ledger.balance('a', 10) == 50
+    assert ledger.balance('b', 10) == 0
+
+
+def test_pending():
+    """ Test that the pending overlay respects the timestamp.
+    """
+    ledger = Ledger()
+    ledger.apply_transactions([create_transaction('0', 'a', 50, 0, 1)])
+
+    t = create_transaction('a', 'b', 10, 1, 5)
+    ledger.add_pending(t)
+
+    assert ledger.balance('a', 5) == 50
+    assert ledger.balance('a', 6) == 39
+    assert ledger.balance('b', 6) == 10
+
+    ledger.remove_pending(t)
+
+    assert ledger.balance('a', 6) == 50
+    assert not ledger.pending
+
+    ledger.reset_pending([t])
+
+    assert ledger.balance('b', 6) == 10
+
+
+def test_pending_deltas():
+    """ Test that the summed pending changes follow the overlay.
+    """
+    ledger = Ledger()
+    ledger.apply_transactions([create_transaction('0', 'a', 50, 0, 1)])
+
+    t_1 = create_transaction('a', 'b', 10, 1, 5)
+    t_2 = create_transaction('a', 'a', 5, 2, 7)
+    t_3 = create_transaction('b', 'a', 3, 1, 6)
+    for t in (t_1, t_2, t_3):
+        ledger.add_pending(t)
+
+    assert ledger.pending_deltas == {'a': -10, 'b': 6}
+    assert ledger.balance('a', 8) == 40
+    assert ledger.balance('a', 7) == 42
+    assert ledger.balance('b', 6) == 10
+
+    ledger.remove_pending(t_2)
+
+    assert ledger.balance('a', 8) == 42
+    assert ledger.balance('a', 6) == 39
+
+    ledger.remove_pending(t_1)
+    ledger.remove_pending(t_3)
+
+    assert not ledger.pending_deltas
+    assert not ledger.pending_timestamps
+    assert ledger.balance('a', 8) == 50
@@ -0,0 +1,83 @@
+""" Testing module for the transaction pool of the blockchain client.
+"""
+
+import pytest
+
+from chains import DNS_Data, DNS_Transaction, Mempool, Transaction
+from chains.mempool import EVICT_OLDEST, REJECT_NEW
+
+
+def create_transaction(sender, fee, timestamp):
+    """ Create an unsigned transaction used in tests.
+    """
+    return Transaction(sender, 'rec', 10, fee, timestamp, 'Sign')
+
+
+def test_order_and_removal():
+    """ Test that the pool keeps the insertion order.
+    """
+    pool = Mempool()
+    transactions = [create_transaction('a', i % 3, i) for i in range(6)]
+    for t in transactions:
+        assert pool.add(t) == []
+
+    assert list(pool) == transactions
+    assert transactions[2] in pool
+
+    pool.remove(transactions[2])
+    pool.discard(transactions[2])
+
+    assert transactions[2] not in pool
+    assert len(pool) == 5
+    assert list(pool) == transactions[:2] + transactions[3:]
+
+    with pytest.raises(KeyError):
+        pool.remove(transactions[2])
+
+
+def test_indexes():
+    """ Test the sender, domain and fee indexes.
+    """
+    pool = Mempool()
+    t1 = create_transaction('a', 1, 1)
+    t2 = create_transaction('b', 5, 2)
+    t3 = DNS_Transaction('a', '0', 0, 3, 3,
+                         DNS_Data('r', 'seclab.oth', '127.0.0.1'), 'Sign')
+    for t in (t1, t2, t3):
+        pool.add(t)
+
+    assert pool.by_sender('a') == [t1, t3]
+    assert pool.by_domain('seclab.oth') == [t3]
+    assert pool.by_data(DNS_Data('r', 'seclab.oth', '127.0.0.1')) == [t3]
+    assert pool.by_fee() == [t2, t3, t1]
+
+    pool.remove(t3)
+
+    assert pool.by_sender('a') == [t1]
+    assert pool.by_domain('seclab.oth') == []
+
+
+def test_eviction():
+    """ Test the eviction policies of a full pool.
+    """
+    pool = Mempool(max_size=2)
+    t1 = create_transaction('a', 2, 1)
+    t2 = create_transaction('a', 1, 2)
+    t3 = create_transaction('a', 3, 3)
+    pool.add(t1)
+    pool.add(t2)
+
+    assert pool.add(create_transaction('a', 1, 4))
+    assert pool.add(t3) == [t2]
+    assert list(pool) == [t1, t3]
+
+    pool = Mempool(max_size=2, eviction=EVICT_OLDEST)
+    pool.reset([t1, t2])
+
+    assert pool.add(t3) == [t1]
+
+    pool = Mempool(max_size=2, eviction=REJECT_NEW)
+    pool.reset([t1, t2])
+
+    assert pool.add(t3) == [t3]
+    assert t3 not in pool
@@ -0,0 +1,94 @@
+""" Testing module for the Merkle trees of the blockchain client.
+"""
+
+import hashlib
+
+from chains import Header, Transaction
+from chains.merkle import MerkleCache, MerkleTree, merkle_root
+
+
+def reference_root(transactions, binary):
+    """ Straightforward Merkle root (full rebuild) used for comparison.
+    """
+    if binary:
+        def combine(left, right):
+            return hashlib.sha256(left + right).digest()
+        nodes = [t.digest for t in sorted(transactions,
+                                          key=lambda t: t.timestamp)]
+        if not nodes:
+            return hashlib.sha256(b'').hexdigest()
+    else:
+        def combine(left, right):
+            return hashlib.sha256((left + right).encode()).hexdigest()
+        nodes = [hashlib.sha256(str(t).encode()).hexdigest()
+                 for t in sorted(transactions, key=lambda t: t.timestamp)]
+        if not nodes:
+            return hashlib.sha256(str([]).encode()).hexdigest()
+    width = 1
+    while width < len(nodes):
+        width *= 2
+    nodes += [nodes[-1]] * (width - len(nodes))
+    while len(nodes) != 1:
+        nodes = [combine(nodes[i], nodes[i + 1])
+                 for i in range(0, len(nodes), 2)]
+    return nodes[0].hex() if binary else nodes[0]
+
+
+def create_transactions(amount):
+    """ Create unsigned transactions with increasing timestamps.
+    """
+    return [Transaction('send', 'rec', 10, 1, i, 'Sign')
+            for i in range(amount)]
+
+
+def test_root_compatibility():
+    """ Test the binary and the legacy roots against a full rebuild.
+    """
+    for amount in range(18):
+        t = create_transactions(amount)
+
+        assert merkle_root(t, 0.8) == reference_root(t, True)
+        assert merkle_root(t, 0.7) == reference_root(t, False)
+
+
+def test_incremental_update():
+    """ Test that updating a tree equals building a new one.
+    """
+    t = create_transactions(13)
+    tree = MerkleTree()
+
+    for i in range(len(t) + 1):
+        assert tree.update(t[:i]) == reference_root(t[:i], True)
+
+    # Remove a transaction in the middle and add new ones
+    changed = t[:5] + t[6:] + create_transactions(20)[13:]
+    assert tree.update(changed) == reference_root(changed, True)
+
+    # Templates with an additional (mining) transaction
+    mining = Transaction('0', 'rec', 10, 0, 100, '0')
+    assert tree.update(changed + [mining]) == \
+        reference_root(changed + [mining], True)
+    assert tree.update(changed) == reference_root(changed, True)
+
+    copy = tree.copy()
+    assert copy.update(t) == reference_root(t, True)
+    assert tree.root == reference_root(changed, True)
+
+
+def test_cache():
+    """ Test that the cache only reuses the tree of matching blocks.
+    """
+    t = create_transactions(5)
+    header = Header(0.8, 1, 0, '', merkle_root(t, 0.8), 0)
+    cache = MerkleCache(max_size=1)
+
+    assert cache.root(header, t) == header.root_hash
+    assert header in cache
+    assert cache.root(header, list(reversed(t))) == header.root_hash
+    assert cache.root(header, t[:4]) != header.root_hash
+
+    other = header._replace(index=2)
+    cache.root(other, t)
+
+    assert other in cache
+    assert header not in cache
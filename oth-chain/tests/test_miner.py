@@ -0,0 +1,58 @@
+""" Testing module for the proof-of-work miner of the blockchain client.
+"""
+
+import hashlib
+import threading
+
+from chains.miner import Miner, proof_target
+
+from . import test_pow_chain
+
+
+def test_target():
+    """ Test that the byte target equals the leading zero check.
+    """
+    for difficulty in range(1, 4):
+        target = proof_target(difficulty)
+        for i in range(2000):
+            digest = hashlib.sha256(b'%d' % i)
+            assert (digest.digest() < target) == \
+                (digest.hexdigest()[:difficulty] == '0' * difficulty)
+
+
+def test_valid_proof():
+    """ Test that the proofs of the miner are accepted by the chain.
+    """
+    test_obj = test_pow_chain.TestPOW()
+    test_obj.setup()
+    blockchain = test_obj.blockchain
+    last_block = blockchain.latest_block()
+
+    for threads in (1, 2):
+        miner = Miner(threads)
+        try:
+            proof = miner.search(last_block.header.proof,
+                                 test_obj.sender_verify, 3)
+        finally:
+            miner.shutdown()
+
+        assert blockchain.validate_proof(last_block, proof,
+                                         test_obj.sender_verify)
+        assert miner.hashes_per_second > 0
+
+
+def test_cancel():
+    """ Test that a running search can be cancelled.
+    """
+    for threads in (1, 2):
+        miner = Miner(threads)
+        results = []
+        search = threading.Thread(
+            target=lambda: results.append(miner.search(0, b'key', 64)))
+        search.start()
+        search.join(0.5)
+        miner.cancel()
+        search.join(10)
+        miner.shutdown()
+
+        assert results == [None]
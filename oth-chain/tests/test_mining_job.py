@@ -0,0 +1,89 @@
+""" Testing module for the background mining of the blockchain client.
+"""
+
+from queue import Queue
+
+from chains.mining_job import MiningJob
+
+from . import test_pow_chain
+
+
+class TestMiningJob(object):
+    """ Testcase for the mining job of the PoW chain.
+    """
+
+    def setup(self):
+        """ Setup of the blockchain for the tests.
+        """
+        self.test_obj = test_pow_chain.TestPOW()
+        self.test_obj.setup()
+        self.blockchain = self.test_obj.blockchain
+        self.key = self.test_obj.sender_verify
+        self.submitted = Queue()
+
+    def start_job(self):
+        """ Start a job that does not find a proof.
+        """
+        self.blockchain.mining_job = MiningJob(
+            self.blockchain.miner,
+            lambda template, proof: self.submitted.put((template, proof)))
+        self.blockchain.mining_job.start(
+            self.blockchain.create_template(self.key), 0, 64, self.key)
+
+    def test_background_block(self):
+        """ Test that a block found in the background is added to the chain.
+        """
+        receive_queue = Queue()
+        self.blockchain.enable_background_mining(receive_queue)
+        self.blockchain.process_message(('mine', self.key, 'local'))
+        message = receive_queue.get(timeout=60)
+
+        assert message[0] == 'mined_block'
+        assert not self.blockchain.mining_job.running
+
+        self.blockchain.process_message(message)
+
+        assert len(self.blockchain.chain) == 2
+        assert self.blockchain.latest_header().proof == message[1][1]
+
+    def test_cancel(self):
+        """ Test that a cancelled job does not submit a block.
+        """
+        self.start_job()
+
+        assert self.blockchain.mining_job.running
+
+        self.blockchain.process_message(('cancel_mining', '', 'local'))
+
+        assert not self.blockchain.mining_job.running
+        assert self.submitted.empty()
+
+    def test_refresh_and_restart(self):
+        """ Test the refresh of the template and the restart on a new tip.
+        """
+        self.test_obj.mine_block(self.blockchain)
+        self.start_job()
+        job = self.blockchain.mining_job
+        transaction = self.test_obj.create_transaction()
+        self.blockchain.new_transaction(transaction)
+
+        assert transaction in job._template.transactions
+
+        self.test_obj.mine_block(self.blockchain)
+
+        assert job.running
+        assert job._template.header.previous_hash == \
+            self.blockchain.latest_header().root_hash
+        job.cancel()
+
+    def test_outdated_block(self):
+        """ Test that blocks mined on an old tip are dropped.
+        """
+        template = self.blockchain.create_template(self.key)
+        proof = self.blockchain.create_proof(self.key)
+        self.test_obj.mine_block(self.blockchain)
+        length = len(self.blockchain.chain)
+
+        self.blockchain.submit_proof(template, proof)
+
+        assert len(self.blockchain.chain) == length
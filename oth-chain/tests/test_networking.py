@@ -1,6 +1,8 @@
 """ Testing module for the networking module of the blockchain client.
 """
 
+import threading
+import time
 from queue import Queue
 
 import pytest
@@ -181,3 +183,37 @@ def test_worker():
                Queue(),
                6668)
     assert pytest_wrapped_e.type == SystemExit
+
+
+def test_event_worker():
+    """ Test that the event loop of the worker delivers incoming messages
+    and sends the messages of the send_queue without polling.
+    """
+    send_queue = Queue()
+    receive_queue = Queue()
+    networker = threading.Thread(
+        target=worker,
+        args=(send_queue, receive_queue, Queue(), Queue(), 6668))
+    networker.start()
+    while SERVER.call_later is None:
+        time.sleep(0.01)  # Endpoint not yet bound
+
+    data = 'x' * (3 * SERVER.buffersize)
+    RECEIVER.send_msg(pack_msg(('test-msg', data)), ('127.0.0.1', 6668))
+
+    assert receive_queue.get(timeout=2) == \
+        ('test-msg', data, ('127.0.0.1', 6667))
+
+    send_queue.put(('test-reply', 'reply-data', ('127.0.0.1', 6667)))
+    for _ in range(20):
+        received = RECEIVER.receive_msg()
+        # Skip the pings/peer requests of the worker
+        if received and unpack_msg(received[0])[0] == 'test-reply':
+            break
+
+    assert unpack_msg(received[0]) == ('test-reply', 'reply-data')
+
+    send_queue.put(None)
+    networker.join(2)
+
+    assert not networker.is_alive()
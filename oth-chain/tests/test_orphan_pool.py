@@ -0,0 +1,89 @@
+""" Testing module for the pool of orphan blocks.
+"""
+
+from queue import Queue
+
+from chains import Block, PoW_Blockchain
+from chains.orphan_pool import OrphanPool
+
+from . import test_pow_chain
+from .test_block_store import create_block
+from .test_pow_chain import VERSION
+
+
+def test_pool():
+    """ Test that children are returned by the hash of their parent.
+    """
+    pool = OrphanPool()
+    blocks = [Block(*create_block(i)) for i in range(1, 4)]
+    for block in blocks[1:]:
+        assert pool.add(block)
+
+    assert not pool.add(blocks[2])
+    assert blocks[2].header in pool
+    assert pool.pop_children(blocks[0].header.root_hash) == blocks[1:2]
+    assert pool.pop_children(blocks[0].header.root_hash) == []
+    assert len(pool) == 1
+
+
+def test_limits():
+    """ Test that the oldest blocks are removed
+    if the pool is full or they expired.
+    """
+    now = [0]
+    pool = OrphanPool(max_size=2, expiry=10, clock=lambda: now[0])
+    blocks = [Block(*create_block(i)) for i in range(1, 5)]
+    for block in blocks[:3]:
+        now[0] += 1
+        pool.add(block)
+
+    assert blocks[0].header not in pool
+    assert len(pool) == 2
+
+    now[0] = 12
+    pool.add(blocks[3])
+
+    assert blocks[1].header not in pool
+    assert blocks[2].header in pool
+
+    now[0] = 30
+    assert pool.pop_children(blocks[2].header.root_hash) == []
+    assert len(pool) == 0
+
+
+class TestOrphanBlocks(object):
+    """ Testcase for blocks that arrive before their parent.
+    """
+
+    def setup(self):
+        """ Setup of a chain that is 3 blocks ahead.
+        """
+        self.test_obj = test_pow_chain.TestPOW()
+        self.test_obj.setup()
+        self.blockchain = self.test_obj.blockchain
+        self.other = PoW_Blockchain(VERSION, Queue(), Queue())
+        for _ in range(3):
+            self.test_obj.mine_block(self.other)
+        self.blocks = self.other.get_block_chain()[1:]
+
+    def test_connect_descendants(self):
+        """ Test that the kept blocks are connected after their parent.
+        """
+        self.blockchain.new_block(self.blocks[2])
+        self.blockchain.new_block(self.blocks[1])
+
+        assert len(self.blockchain.orphans) == 2
+        assert len(self.blockchain.chain) == 1
+
+        self.blockchain.new_block(self.blocks[0])
+
+        assert self.blockchain.latest_block() == self.other.latest_block()
+        assert len(self.blockchain.orphans) == 0
+
+    def test_stale_block(self):
+        """ Test that blocks of the current chain are not kept.
+        """
+        self.blockchain.new_block(self.blocks[0])
+        self.blockchain.new_block(self.blocks[0])
+
+        assert len(self.blockchain.orphans) == 0
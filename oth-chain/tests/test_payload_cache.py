@@ -0,0 +1,93 @@
+""" Testing module for the serialize-once sending of messages.
+"""
+
+from queue import Queue
+
+# Imported before networking (circular import)
+import chains  # noqa: F401
+import networking.networking
+from chains import Block
+from networking import ExtendedUDP, PeerManager, pack_msg, unpack_msg
+from networking.payload_cache import PayloadCache, payload_key
+
+from .lossy_socket import LossyNetwork
+from .test_block_store import create_block
+
+PEERS = [('127.0.0.1', 7000 + i) for i in range(3)]
+
+
+def test_payload_key():
+    """ Test that only blocks and header pages are cached.
+    """
+    header, transactions = create_block(1)
+
+    assert payload_key('new_block', Block(header, transactions)) == header
+    assert payload_key('compact_block', (header, '', [])) == header
+    assert payload_key('headers', [header]) == (header, header, 1)
+    assert payload_key('headers', []) is None
+    assert payload_key('new_block', 'no block') is None
+    assert payload_key('new_transaction', transactions[0]) is None
+
+
+def test_cache():
+    """ Test that payloads are encoded once and the oldest are removed.
+    """
+    encoded = []
+
+    def encode(msg):
+        encoded.append(msg)
+        return pack_msg(msg)
+
+    cache = PayloadCache(encode, max_size=1)
+    blocks = [Block(*create_block(i)) for i in range(1, 3)]
+
+    assert unpack_msg(cache.get('new_block', blocks[0])) == \
+        ('new_block', blocks[0])
+    assert cache.get('new_block', blocks[0]) == pack_msg(
+        ('new_block', blocks[0]))
+    assert cache.hits == 1
+
+    cache.get('new_block', blocks[1])
+    cache.get('new_block', blocks[0])
+    cache.get('ping', '')
+    cache.get('ping', '')
+
+    assert len(encoded) == 5
+
+
+def test_broadcast():
+    """ Test that a broadcast is serialized and split once for all peers.
+    """
+    network = LossyNetwork()
+    for peer in PEERS:
+        network.socket(peer)
+    server = ExtendedUDP(512)
+    server.socket.close()
+    server.socket = network.socket(('127.0.0.1', 6999))
+    peers = PeerManager()
+    peers.setup(Queue(), Queue(), 6999)
+    for peer in PEERS:
+        peers.peer_seen(peer)
+    encoded = []
+    payloads = PayloadCache(lambda msg: encoded.append(msg) or pack_msg(msg))
+
+    originals = (networking.networking.SERVER, networking.networking.PEERS,
+                 networking.networking.PAYLOADS)
+    (networking.networking.SERVER, networking.networking.PEERS,
+     networking.networking.PAYLOADS) = server, peers, payloads
+    try:
+        block = Block(*create_block(1))
+        networking.networking.broadcast('new_block', block)
+    finally:
+        (networking.networking.SERVER, networking.networking.PEERS,
+         networking.networking.PAYLOADS) = originals
+
+    assert len(encoded) == 1
+    inboxes = [[d for d, _ in network.inboxes[peer]] for peer in PEERS]
+    assert len(inboxes[0]) > 1
+    assert inboxes[1] == inboxes[0] and inboxes[2] == inboxes[0]
+    receiver = ExtendedUDP(512)
+    received = [receiver.receive_datagram(memoryview(d), PEERS[0])
+                for d in inboxes[0]]
+    receiver.teardown()
+    assert unpack_msg(received[-1][0]) == ('new_block', block)
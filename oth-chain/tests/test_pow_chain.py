@@ -12,6 +12,7 @@ import nacl.encoding
 import nacl.signing
 
 from chains import Transaction, Block, Header, PoW_Blockchain
+from chains.header_sync import HEADERS_PAGE_SIZE
 import utils
 
 VERSION = 0.7
@@ -200,7 +201,10 @@ class TestPOW(object):
                                          new_header,
                                          ''))
 
-        assert self.sends.get() == ('get_chain', '', 'broadcast')
+        assert self.sends.get() == (
+            'get_headers',
+            (self.blockchain.header_locator(), HEADERS_PAGE_SIZE),
+            'broadcast')
 
     def test_get_block(self):
         """ Test that get_block works.
@@ -294,6 +298,12 @@ class TestPOW(object):
 
         assert bchain2.latest_block() == self.blockchain.latest_block()
 
+        # Balances follow the exchanged chain
+
+        for key in (self.sender_verify, self.receiver_verify):
+            assert self.blockchain.check_balance(key, time.time()) == \
+                bchain2.check_balance(key, time.time())
+
     # ####################### HELPER FUNCTIONS ###########################
 
     def mine_block(self, chain):
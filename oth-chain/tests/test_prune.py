@@ -0,0 +1,132 @@
+""" Testing module for the pruned-node mode of the blockchain client.
+"""
+
+import os
+import tempfile
+from queue import Queue
+
+import chains.blockchain
+from chains import PoW_Blockchain
+from chains.block_store import BlockStore, segment_file_name
+
+from . import test_pow_chain
+from .test_block_store import create_block
+from .test_pow_chain import VERSION
+
+
+class TestStorePruning(object):
+    """ Testcase for the pruning of the block store.
+    """
+
+    def setup(self):
+        """ Setup of a temporary directory for the store.
+        """
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = self.directory.name
+
+    def teardown(self):
+        """ Removal of the temporary directory.
+        """
+        self.directory.cleanup()
+
+    def test_prune(self):
+        """ Test that old segments are removed and stay pruned.
+        """
+        blocks = [create_block(i) for i in range(10)]
+        store = BlockStore(self.path, segment_size=300)
+        for header, transactions in blocks:
+            store.append(header, transactions)
+        store.prune(6)
+
+        assert not os.path.exists(
+            os.path.join(self.path, segment_file_name(0)))
+        assert 0 < store.pruned <= 6
+        assert store.read(0) is None
+        assert store.read(6) == blocks[6]
+        store.close()
+
+        store = BlockStore(self.path)
+
+        assert store.headers() == [header for header, _ in blocks]
+        assert 0 < store.pruned <= 6
+        assert store.read(9) == blocks[9]
+        store.close()
+
+
+class TestChainPruning(object):
+    """ Testcase for a pruned PoW chain.
+    """
+
+    def setup(self):
+        """ Setup of a temporary directory and a short prune interval.
+
+        The mining reward changes after 10 blocks,
+        so the depth is lowered as well.
+        """
+        self.test_obj = test_pow_chain.TestPOW()
+        self.test_obj.setup()
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'blocks')
+        self.interval = chains.blockchain.PRUNE_INTERVAL
+        self.depth = chains.blockchain.MIN_PRUNE_DEPTH
+        chains.blockchain.PRUNE_INTERVAL = 1
+        chains.blockchain.MIN_PRUNE_DEPTH = 3
+
+    def teardown(self):
+        """ Removal of the temporary directory.
+        """
+        chains.blockchain.PRUNE_INTERVAL = self.interval
+        chains.blockchain.MIN_PRUNE_DEPTH = self.depth
+        self.directory.cleanup()
+
+    def create_chain(self):
+        """ Create a pruned blockchain.
+        """
+        return PoW_Blockchain(VERSION, Queue(), Queue(),
+                              store_directory=self.path, prune_depth=1)
+
+    def test_pruned_chain(self):
+        """ Test that only the latest blocks are held
+        and the state survives a restart.
+        """
+        blockchain = self.create_chain()
+        blockchain.store.segment_size = 300
+        for _ in range(8):
+            self.test_obj.mine_block(blockchain)
+        headers = list(blockchain.chain)
+
+        # Depth is raised to the minimum
+        assert blockchain.prune_depth == 3
+        assert blockchain.chain.pruned_height == 6
+        assert not blockchain.has_block(headers[5])
+        assert blockchain.has_block(headers[6])
+        assert not os.path.exists(
+            os.path.join(self.path, segment_file_name(0)))
+
+        sends = blockchain.send_queue = Queue()
+        blockchain.send_block(headers[1], 'address')
+        assert sends.get_nowait() == ('pruned_block', headers[1], 'address')
+        blockchain.send_block(headers[-1], 'address')
+        assert sends.get_nowait()[0] == 'new_block'
+
+        balance = blockchain.check_balance(self.test_obj.sender_verify, 0)
+        blockchain.close()
+
+        loaded = self.create_chain()
+
+        assert list(loaded.chain) == headers
+        assert loaded.chain.pruned_height > 0
+        assert loaded.check_balance(self.test_obj.sender_verify, 0) == \
+            balance
+        loaded.close()
+
+    def test_pruned_peer(self):
+        """ Test that peers answering with pruned blocks are recorded.
+        """
+        blockchain = PoW_Blockchain(VERSION, Queue(), Queue())
+        header = create_block(5)[0]
+        blockchain.process_message(('pruned_block', header, 'peer'))
+        blockchain.process_message(
+            ('pruned_block', create_block(2)[0], 'peer'))
+
+        assert blockchain.pruned_peers == {'peer': 5}
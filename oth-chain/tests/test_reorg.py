@@ -0,0 +1,244 @@
+""" Testing module for the reorganizations of the blockchain client.
+"""
+
+import time
+from queue import Queue
+
+import chains
+from chains import Block, PoW_Blockchain, Transaction, sign_transaction
+from chains.undo import UndoLog
+
+from . import test_ddos_chain
+from . import test_dns_chain
+from . import test_pow_chain
+from .test_block_store import create_block
+from .test_pow_chain import VERSION
+
+
+def balances(blockchain):
+    """ Non-zero balances of a chain.
+    """
+    return dict((k, v) for k, v in blockchain.ledger.balances.items() if v)
+
+
+def test_undo_log():
+    """ Test that only the records of the latest blocks are kept.
+    """
+    undo_log = UndoLog(depth=2)
+    headers = [create_block(i)[0] for i in range(3)]
+    for header in headers:
+        undo_log.add(header, header.index)
+
+    assert headers[0] not in undo_log
+    assert undo_log.covers(headers[1:])
+    assert undo_log.pop(headers[2]) == 2
+    assert undo_log.pop(headers[2]) is None
+    assert len(undo_log) == 1
+
+
+class TestPoWReorg(object):
+    """ Testcase for the reorganization of the PoW chain.
+    """
+
+    def setup(self):
+        """ Setup of two chains sharing the first block.
+        """
+        self.test_obj = test_pow_chain.TestPOW()
+        self.test_obj.setup()
+        self.blockchain = self.test_obj.blockchain
+        self.test_obj.mine_block(self.blockchain)
+        self.other = PoW_Blockchain(VERSION, Queue(), Queue())
+        self.other.new_block(self.blockchain.latest_block())
+
+        # Block of the replaced branch
+        self.transaction = self.test_obj.create_transaction()
+        self.blockchain.new_transaction(self.transaction)
+        self.blockchain.process_message(
+            ('mine', self.test_obj.sender_verify, 'local'))
+
+    def switch_chain(self):
+        """ Send the other chain to the blockchain.
+
+        Returns:
+            Indices of the blocks validated for the new chain.
+        """
+        validated = []
+        validate_block = self.blockchain.validate_block
+
+        def counting_validate_block(block, last_block, new_chain=False):
+            if new_chain:
+                validated.append(block.header.index)
+            return validate_block(block, last_block, new_chain)
+
+        self.blockchain.validate_block = counting_validate_block
+        self.blockchain.resolve_conflict(self.other.get_header_chain())
+        for block in self.other.get_block_chain():
+            self.blockchain.new_block(block)
+        return validated
+
+    def test_reorg(self):
+        """ Test that only the new branch is validated
+        and orphaned transactions return to the pool.
+        """
+        self.test_obj.mine_block(self.other)
+        self.test_obj.mine_block(self.other)
+
+        validated = self.switch_chain()
+
+        assert self.blockchain.latest_block() == self.other.latest_block()
+        assert validated == [2, 3]
+        assert balances(self.blockchain) == balances(self.other)
+        assert self.transaction in self.blockchain.transaction_pool
+        assert self.blockchain.check_balance(
+            self.test_obj.sender_verify, time.time()) == 150 - 11
+        assert len(self.blockchain.undo_log) == 4
+
+    def test_pooled_branch(self):
+        """ Test that transactions of the pool confirmed by the new
+        branch are not counted twice while the branch is validated.
+        """
+        spendings = [
+            sign_transaction(
+                Transaction(self.test_obj.sender_verify,
+                            self.test_obj.receiver_verify,
+                            40, 0, time.time(), ''),
+                self.test_obj.sender_sign)
+            for _ in range(2)]
+        for spending in spendings:
+            self.blockchain.new_transaction(spending)
+            self.other.new_transaction(spending)
+            self.test_obj.mine_block(self.other)
+
+        assert all(t in self.blockchain.transaction_pool for t in spendings)
+
+        self.switch_chain()
+
+        assert self.blockchain.latest_block() == self.other.latest_block()
+        assert balances(self.blockchain) == balances(self.other)
+        assert not any(t in self.blockchain.transaction_pool
+                       for t in spendings)
+        assert self.transaction in self.blockchain.transaction_pool
+
+    def test_invalid_branch(self):
+        """ Test that an invalid new branch restores the old chain.
+        """
+        old_chain = list(self.blockchain.chain.items())
+        old_balances = balances(self.blockchain)
+        self.test_obj.mine_block(self.other)
+
+        # Block spending coins that don't exist
+        spending = sign_transaction(
+            Transaction(self.test_obj.receiver_verify,
+                        self.test_obj.sender_verify,
+                        1000, 0, time.time(), ''),
+            self.test_obj.receiver_sign)
+        block = self.other.create_block(
+            self.other.create_proof(self.test_obj.sender_verify))
+        transactions = block.transactions + [
+            spending,
+            Transaction('0', self.test_obj.sender_verify, 50, 0,
+                        time.time(), '0')]
+        header = block.header._replace(
+            root_hash=self.other.create_merkle_root(transactions))
+        self.other.chain[header] = transactions
+
+        self.switch_chain()
+
+        assert list(self.blockchain.chain.items()) == old_chain
+        assert balances(self.blockchain) == old_balances
+        assert self.transaction not in self.blockchain.transaction_pool
+
+
+class TestDNSReorg(object):
+    """ Testcase for the undo records of the DNS chain.
+    """
+
+    def setup(self):
+        """ Setup of the DNS chain.
+        """
+        self.test_obj = test_dns_chain.TestDNS()
+        self.test_obj.setup()
+        self.chain = self.test_obj.chain
+        self.test_obj.basic_creation()
+
+    def test_domains(self):
+        """ Test that a replaced registration is reverted.
+        """
+        other = chains.DNSBlockChain(VERSION, Queue(), Queue())
+        other.new_block(self.chain.get_block_chain()[1])
+        for _ in range(3):
+            other.process_message(
+                ('mine', self.test_obj.receiver_verify, 'local'))
+
+        assert self.chain._resolve_domain_name(
+            'seclab.oth', time.time())[0] == '127.0.0.1'
+
+        self.chain.resolve_conflict(other.get_header_chain())
+        for block in other.get_block_chain():
+            self.chain.new_block(block)
+
+        assert self.chain.latest_block() == other.latest_block()
+        assert self.chain._resolve_domain_name(
+            'seclab.oth', time.time()) == ('', '')
+        assert not self.chain.domains
+        assert self.chain.transaction_pool.by_domain('seclab.oth')
+
+    def test_auctions(self):
+        """ Test that the auctions of a reverted block are removed.
+        """
+        auction = self.test_obj.create_transaction(
+            chains.DNS_Data('t', 'seclab.oth', ''), 0, 5, '0')
+        header = self.chain.latest_header()._replace(index=7)
+
+        record = self.chain.apply_state(Block(header, [auction]))
+
+        assert self.chain.auctions[11][0][0] == auction
+
+        self.chain.revert_state(record)
+
+        assert not self.chain.auctions
+
+
+class TestDDosReorg(object):
+    """ Testcase for the undo records of the DDoS chain.
+    """
+
+    def test_revert_operations(self):
+        """ Test that tree edits and blocked IPs are reverted.
+        """
+        test_obj = test_ddos_chain.TestDDos()
+        test_obj.setup()
+        chain = test_obj.chain
+        third = b'third'
+
+        def operation(sender, sign, action, data):
+            return test_obj.create_transaction(
+                sender, time.time(), chains.DDosData(action, data), sign)
+
+        transactions = [
+            operation(test_obj.sender_verify, test_obj.sender_sign,
+                      'i', test_obj.receiver_verify),
+            operation(test_obj.receiver_verify, test_obj.receiver_sign,
+                      'b', '1.2.3.4'),
+            operation(test_obj.receiver_verify, test_obj.receiver_sign,
+                      'i', third),
+            operation(test_obj.sender_verify, test_obj.sender_sign,
+                      'b', '5.6.7.8'),
+            operation(test_obj.sender_verify, test_obj.sender_sign,
+                      'p', test_obj.receiver_verify),
+        ]
+        header = chain.latest_header()._replace(index=1)
+        chain.apply_state(Block(header, transactions[:2]))
+        before = chain.snapshot_state()
+
+        record = chain.apply_state(Block(header, transactions[2:]))
+
+        assert str(third) in chain.tree
+        assert str(test_obj.receiver_verify) not in chain.tree
+        assert chain.get_ips() == ['5.6.7.8']
+
+        chain.revert_state(record)
+
+        assert chain.snapshot_state() == before
+        assert chain.blocked_ips['1.2.3.4'] is chain.tree.get_node_by_content(
+            str(test_obj.receiver_verify))
@@ -0,0 +1,78 @@
+""" Testing module for the signature cache of the blockchain client.
+"""
+
+import nacl.encoding
+import nacl.signing
+
+from chains import SignatureCache
+
+from . import test_pow_chain
+
+
+def test_lru_eviction():
+    """ Test the counters and the eviction of the cache.
+    """
+    cache = SignatureCache(max_size=2)
+    cache.put(b'a', True)
+    cache.put(b'b', False)
+
+    assert cache.get(b'a')
+    assert cache.get(b'b') is False
+    assert cache.get(b'c') is None
+    assert (cache.hits, cache.misses) == (2, 1)
+
+    cache.get(b'a')
+    cache.put(b'c', True)
+
+    assert len(cache) == 2
+    assert cache.get(b'b') is None
+    assert cache.get(b'a')
+
+
+def test_verify_key():
+    """ Test that verify keys are only created once per sender.
+    """
+    cache = SignatureCache(max_keys=1)
+    sender = nacl.signing.SigningKey(seed=b'a' * 32).verify_key.encode(
+        nacl.encoding.HexEncoder)
+
+    assert cache.verify_key(sender) is cache.verify_key(sender)
+
+
+class TestChainCache(object):
+    """ Testcase for the use of the cache in the chain.
+    """
+
+    def setup(self):
+        """ Setup of the blockchain for the tests.
+        """
+        self.test_obj = test_pow_chain.TestPOW()
+        self.test_obj.setup()
+        self.blockchain = self.test_obj.blockchain
+        self.test_obj.mine_block(self.blockchain)
+
+    def test_block_uses_pool_verification(self):
+        """ Test that transactions of the pool are not verified again.
+        """
+        transaction = self.test_obj.create_transaction()
+        self.blockchain.new_transaction(transaction)
+        cache = self.blockchain.signature_cache
+
+        assert transaction in self.blockchain.transaction_pool
+        assert cache.get(transaction.digest)
+
+        hits, misses = cache.hits, cache.misses
+
+        assert self.blockchain.validate_transaction(transaction, False,
+                                                    mining=True)
+        assert cache.hits == hits + 1
+        assert cache.misses == misses
+
+    def test_forged_transaction(self):
+        """ Test that changed transactions are verified again.
+        """
+        transaction = self.test_obj.create_transaction()
+
+        assert self.blockchain.verify_signature(transaction)
+        assert not self.blockchain.verify_signature(
+            transaction._replace(amount=transaction.amount + 1))
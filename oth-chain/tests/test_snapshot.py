@@ -0,0 +1,172 @@
+""" Testing module for the state snapshots of the blockchain client.
+"""
+
+import os
+import tempfile
+from queue import Queue
+
+import chains
+from chains import PoW_Blockchain
+from chains.snapshot import SnapshotStore, snapshot_file_name
+
+from . import test_ddos_chain
+from . import test_dns_chain
+from . import test_pow_chain
+from .test_block_store import create_block
+from .test_pow_chain import VERSION
+
+
+class TestSnapshotStore(object):
+    """ Testcase for the snapshot files.
+    """
+
+    def setup(self):
+        """ Setup of a temporary directory for the snapshots.
+        """
+        self.directory = tempfile.TemporaryDirectory()
+        self.snapshots = SnapshotStore(self.directory.name, keep=2)
+
+    def teardown(self):
+        """ Removal of the temporary directory.
+        """
+        self.directory.cleanup()
+
+    def test_latest(self):
+        """ Test that the latest valid snapshot is loaded.
+        """
+        headers = [create_block(i)[0] for i in range(4)]
+        for height in (1, 2, 3):
+            self.snapshots.write(height, headers[height], {'value': height})
+
+        # Only the last snapshots are kept
+        assert self.snapshots.heights() == [2, 3]
+        assert self.snapshots.latest(lambda h, header: True) == \
+            (3, headers[3], {'value': 3})
+        # Snapshot of a block that is not part of the chain
+        assert self.snapshots.latest(lambda h, header: h < 3) == \
+            (2, headers[2], {'value': 2})
+
+        # Corrupted snapshot
+        path = os.path.join(self.directory.name, snapshot_file_name(3))
+        with open(path, 'r+b') as f:
+            f.seek(-2, os.SEEK_END)
+            f.write(b'xx')
+
+        assert self.snapshots.latest(lambda h, header: True)[0] == 2
+
+
+class TestChainSnapshot(object):
+    """ Testcase for the snapshots of the chains.
+    """
+
+    def setup(self):
+        """ Setup of a temporary directory for the store.
+        """
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'blocks')
+
+    def teardown(self):
+        """ Removal of the temporary directory.
+        """
+        self.directory.cleanup()
+
+    def test_pow_restart(self):
+        """ Test that the balances are loaded from the snapshot
+        and the blocks after it are replayed.
+        """
+        test_obj = test_pow_chain.TestPOW()
+        test_obj.setup()
+        blockchain = PoW_Blockchain(VERSION, Queue(), Queue(),
+                                    store_directory=self.path)
+        test_obj.mine_block(blockchain)
+        # Marker that only exists in the snapshot
+        blockchain.ledger.balances['snapshot'] = 1
+        blockchain.write_snapshot()
+        test_obj.mine_block(blockchain)
+        blockchain.store.close()
+
+        loaded = PoW_Blockchain(VERSION, Queue(), Queue(),
+                                store_directory=self.path)
+
+        assert loaded.check_balance('snapshot', 0) == 1
+        assert loaded.check_balance(test_obj.sender_verify, 0) == 100
+        loaded.close()
+
+    def test_ddos_restart(self, capsys):
+        """ Test that the tree and the blocked IPs are restored.
+        """
+        test_obj = test_ddos_chain.TestDDos()
+        test_obj.setup()
+        test_obj.chain = chains.DDosChain(VERSION, Queue(), Queue(),
+                                          store_directory=self.path)
+        test_obj.process_transaction(
+            capsys, test_obj.receiver_verify, 'i',
+            test_obj.sender_sign, test_obj.sender_verify)
+        test_obj.fill_block(capsys, 4)
+        test_obj.process_transaction(
+            capsys, '1.2.3.4', 'b',
+            test_obj.receiver_sign, test_obj.receiver_verify)
+        test_obj.fill_block(capsys, 4)
+        blocked_ips = test_obj.chain.get_ips()
+        test_obj.chain.store.close()
+
+        # Without snapshot the operations are replayed
+        loaded = chains.DDosChain(VERSION, Queue(), Queue(),
+                                  store_directory=self.path)
+
+        assert str(test_obj.receiver_verify) in loaded.tree
+        assert loaded.get_ips() == blocked_ips
+        loaded.close()
+
+        # With snapshot
+        loaded = chains.DDosChain(VERSION, Queue(), Queue(),
+                                  store_directory=self.path)
+
+        assert loaded.snapshots.heights() == [2]
+        assert loaded.get_ips() == blocked_ips
+        assert loaded.blocked_ips['1.2.3.4'].content == \
+            str(test_obj.receiver_verify)
+        assert loaded.blocked_ips['1.2.3.4'].parent.content == \
+            str(test_obj.sender_verify)
+        loaded.close()
+
+    def test_dns_restart(self, capsys):
+        """ Test that the domains and the open auctions are restored.
+        """
+        test_obj = test_dns_chain.TestDNS()
+        test_obj.setup()
+        test_obj.chain = chains.DNSBlockChain(VERSION, Queue(), Queue(),
+                                              store_directory=self.path)
+        with capsys.disabled():
+            test_obj.basic_creation()
+            t = test_obj.create_transaction(
+                chains.DNS_Data('t', 'seclab.oth', ''), 0, 5, '0')
+            test_obj.chain.new_transaction(t)
+            test_obj.chain.process_message(
+                ('mine', test_obj.sender_verify, 'local'))
+        domains = dict(test_obj.chain.domains)
+        auctions = dict(test_obj.chain.auctions)
+        assert auctions
+        test_obj.chain.store.close()
+
+        # Without snapshot the operations are replayed
+        loaded = chains.DNSBlockChain(VERSION, Queue(), Queue(),
+                                      store_directory=self.path)
+
+        assert 'seclab.oth' in loaded.domains
+        # The initial bids of replayed auctions are recreated
+        assert {key: [auction[0] for auction in auction_list]
+                for key, auction_list in loaded.auctions.items()} == \
+            {key: [auction[0] for auction in auction_list]
+             for key, auction_list in auctions.items()}
+        auctions = dict(loaded.auctions)
+        loaded.close()
+
+        # With snapshot
+        loaded = chains.DNSBlockChain(VERSION, Queue(), Queue(),
+                                      store_directory=self.path)
+
+        assert loaded.snapshots.heights() == [3]
+        assert dict(loaded.domains) == domains
+        assert dict(loaded.auctions) == auctions
+        loaded.close()
@@ -0,0 +1,46 @@
+""" Testing module for the parallel validation of the blockchain client.
+"""
+
+import time
+from queue import Queue
+
+from chains import PoW_Blockchain, SignatureCache, Transaction
+from chains.validation import ValidationPipeline
+
+from . import test_pow_chain
+from .test_pow_chain import VERSION
+
+
+def test_parallel_signatures():
+    """ Test that the worker processes fill the signature cache.
+    """
+    test_obj = test_pow_chain.TestPOW()
+    test_obj.setup()
+    transactions = [test_obj.create_transaction() for _ in range(6)]
+    forged = transactions[0]._replace(amount=20)
+    mining = Transaction('0', test_obj.sender_verify, 50, 0, time.time(), '0')
+
+    cache = SignatureCache()
+    pipeline = ValidationPipeline(workers=2)
+    try:
+        pipeline.verify_signatures(transactions + [forged, mining],
+                                   PoW_Blockchain.legacy_hash, cache)
+    finally:
+        pipeline.shutdown()
+
+    assert all(cache.get(t.digest) for t in transactions)
+    assert cache.get(forged.digest) is False
+    assert mining.digest not in cache
+
+
+def test_sequential_default():
+    """ Test that chains do not start worker processes by default.
+    """
+    blockchain = PoW_Blockchain(VERSION, Queue(), Queue())
+    test_obj = test_pow_chain.TestPOW()
+    test_obj.setup()
+
+    blockchain.verify_signatures([test_obj.create_transaction()])
+
+    assert len(blockchain.signature_cache) == 0
+    assert blockchain.validation._executor is None
@@ -2,5 +2,5 @@
 call D:\Programme\Anaconda3\Scripts\activate.bat D:\Programme\Anaconda3
 d:
 cd projekte\oth-chain
-python core.py --port 6668 --key keyfile2 --store keystore
+python core.py --port 6668 --key keyfile2 --store keystore --blocks blocks2
 PAUSE
\ No newline at end of file